@@ -0,0 +1,87 @@
+"""
+Admission control: how many commands of its own a process lets under way
+
+Past saturation, every command let in makes every other one wait longer,
+and a log that takes all it is offered ends up answering nothing in time.
+A limit on commands under way keeps latency where it is at saturation:
+what is offered beyond it waits in a short queue or is turned away at
+once, see MultiPaxos.LIMIT. `sample(seconds, inflight)` is told how long
+each command took, from being let in to its result, and how many are
+under way; the limit it keeps follows from those.
+"""
+import math
+import asyncio
+
+
+class Limit:
+    """a fixed limit"""
+    def __init__(self, limit=64):
+        self.limit = limit
+
+    def sample(self, seconds, inflight):
+        pass
+
+
+class AIMD(Limit):
+    """
+    additive increase, multiplicative decrease: a command answered within
+    TARGET seconds adds 1/limit, if the limit is what holds commands back;
+    one answered later takes the limit down by BACKOFF, at most once per
+    TARGET seconds so that the commands of one backlog count once
+    """
+    TARGET = .05
+    BACKOFF = .9
+    MIN, MAX = 1, 4096
+
+    def __init__(self, limit=16):
+        super().__init__(limit)
+        self.cut = -math.inf
+
+    def sample(self, seconds, inflight):
+        if seconds > self.TARGET:
+            now = asyncio.get_event_loop().time()
+            if now - self.cut >= self.TARGET:
+                self.cut = now
+                self.limit = max(self.MIN, self.limit * self.BACKOFF)
+        elif 2 * inflight >= self.limit:
+            self.limit = min(self.MAX, self.limit + 1 / self.limit)
+
+
+class Gradient(Limit):
+    """
+    the gradient of latency, as the Gradient limit of Netflix's
+    concurrency-limits: once per `limit` commands answered, the limit
+    becomes limit * gradient + sqrt(limit), where gradient is the lowest
+    latency seen against the average of those commands, TOLERANCE times,
+    between one half and one. Without a backlog, the limit grows by about
+    its square root a round; with one, it shrinks as fast as latency grows.
+    The lowest latency is measured afresh every RESET rounds, so that it
+    follows what the log can do.
+    """
+    TOLERANCE = 2.
+    SMOOTH = .2
+    RESET = 100
+    MIN, MAX = 1, 4096
+
+    def __init__(self, limit=16):
+        super().__init__(limit)
+        self.least = math.inf
+        self.sum, self.count, self.rounds = 0., 0, 0
+
+    def sample(self, seconds, inflight):
+        self.least = min(self.least, seconds)
+        self.sum += seconds
+        self.count += 1
+        if self.count < self.limit:
+            return
+        gradient = max(.5, min(1., self.TOLERANCE * self.least *
+                               self.count / self.sum))
+        self.sum, self.count = 0., 0
+        self.rounds += 1
+        if self.rounds % self.RESET == 0:
+            self.least = math.inf
+        if gradient == 1. and 2 * inflight < self.limit:
+            return  # too few commands to tell
+        limit = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + self.SMOOTH * (limit - self.limit)
+        self.limit = max(self.MIN, min(self.MAX, limit))
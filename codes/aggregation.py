@@ -0,0 +1,153 @@
+"""
+Gossip-based aggregation
+
+Computes cluster-wide aggregates (average, sum, count, max, ...) without an
+all-to-all exchange: every round each process talks to one random peer, and
+the estimate at every process converges in O(log N) rounds.
+
+Module:
+  Name: GossipAggregation, instance ga.
+
+Events:
+  Request: <ga, Register | name, fn, value>: starts aggregating `value` under
+    `name`. fn is 'avg', 'sum', 'count', or a merge function such as max that
+    is commutative, associative and idempotent.
+  Request: <ga, Update | name, value>: the local input of `name` changed.
+
+The current estimate of an aggregate is read with ga.estimate(name).
+"""
+import random
+import logging
+from collections import defaultdict
+
+from .basic import implements, uses, trigger, start_timer, ABC
+
+log = logging.getLogger(__name__)
+
+
+@implements('GossipAggregation')
+@uses('FairLossPointToPointLinks', 'fll')
+class PushSumAggregation(ABC):
+    """
+    push-pull gossip, every PERIOD seconds with one random peer
+
+    'avg', 'sum' and 'count' run push-sum: each process holds a pair (s, w)
+    and s/w is its estimate; a push-pull exchange leaves both sides with the
+    average of their pairs, which keeps the total mass. The average starts
+    from (value, 1) everywhere, the sum from (value, 1) at the lowest ranked
+    member and (value, 0) elsewhere, the count likewise from (1, w).
+
+    Over fair-loss links a lost message must not lose mass, so instead of
+    shipping halves of (s, w) around, a process remembers the net flow it
+    has sent to each peer: its pair is its input minus all its flows, and a
+    received flow f from q always sets the flow to q to -f. Push carries the
+    sender's flow, so a pull that got lost is repaired when the push is
+    retried next round. Inputs may change at any time through Update.
+
+    Merge functions run push-pull anti-entropy: both sides end up with the
+    merged value, so a lost message only costs time. A process keeps its own
+    input apart from the merged value, which comes with an epoch: an Update
+    the new input covers, fn(old, new) == new, is merged in, while any
+    other starts the next epoch from the new input alone. A process that
+    hears of a later epoch takes it up with its own input merged in, so the
+    value can go back too, as with a max whose largest input drops.
+    """
+    PERIOD = 1
+    PUSH_SUM = ('avg', 'sum', 'count')
+
+    def upon_Init(self):
+        self.inputs = {}  # name -> (s, w) of push-sum aggregates
+        self.merges = {}  # name -> merge function
+        self.own = {}  # name -> our input of merge aggregates
+        self.merged = {}  # name -> (epoch, merged value)
+        self.flows = defaultdict(dict)  # name -> peer -> [s, w]
+        self.unanswered = set()
+        self.rounds = 0
+        start_timer(self.PERIOD, self.upon_Timeout)
+
+    def upon_Register(self, name, fn, value=None):
+        if fn in self.PUSH_SUM:
+            w = 1. if fn == 'avg' or self.addr == min(self.members) else 0.
+            self.inputs[name] = (1. if fn == 'count' else value, w)
+        else:
+            self.merges[name] = fn
+            self.own[name] = value
+            self.merged[name] = (0, value)
+
+    def upon_Update(self, name, value):
+        if name in self.inputs:
+            self.inputs[name] = (value, self.inputs[name][1])
+            return
+        fn, old = self.merges[name], self.own[name]
+        self.own[name] = value
+        epoch, merged = self.merged[name]
+        if fn(old, value) == value:
+            self.merged[name] = (epoch, fn(merged, value))
+        else:
+            self.merged[name] = (epoch + 1, value)
+
+    def mass(self, name):
+        s, w = self.inputs[name]
+        for fs, fw in self.flows[name].values():
+            s -= fs
+            w -= fw
+        return s, w
+
+    def estimate(self, name):
+        if name in self.merged:
+            return self.merged[name][1]
+        s, w = self.mass(name)
+        return s / w if w > 0 else None
+
+    def upon_Timeout(self):
+        self.rounds += 1
+        peers = self.unanswered
+        if self.peers:
+            peers |= {random.choice(list(self.peers))}
+        self.unanswered = set()
+        for p in peers:
+            self.push(p)
+        start_timer(self.PERIOD, self.upon_Timeout)
+
+    def push(self, p):
+        self.unanswered.add(p)
+        trigger(self.fll, 'Send', p, {
+            'typ': 'push',
+            'sums': {name: (self.flows[name].get(p, (0., 0.)),
+                            self.mass(name))
+                     for name in self.inputs},
+            'merged': self.merged,
+            })
+
+    def upon_Deliver(self, q, m):
+        self.merge(m['merged'])
+        if m['typ'] == 'push':
+            flows = {}
+            for name, ((fs, fw), (s, w)) in m['sums'].items():
+                if name not in self.inputs:
+                    continue
+                # take the sender's view of our flow, then meet half way
+                flow = self.flows[name][q] = [-fs, -fw]
+                ms, mw = self.mass(name)
+                flow[0] += (ms - s) / 2
+                flow[1] += (mw - w) / 2
+                flows[name] = tuple(flow)
+            trigger(self.fll, 'Send', q, {
+                'typ': 'pull',
+                'flows': flows,
+                'merged': self.merged,
+                })
+        elif m['typ'] == 'pull':
+            self.unanswered.discard(q)
+            for name, (fs, fw) in m['flows'].items():
+                self.flows[name][q] = [-fs, -fw]
+
+    def merge(self, merged):
+        for name, (epoch, value) in merged.items():
+            if name not in self.merges:
+                continue
+            fn, (mine, ours) = self.merges[name], self.merged[name]
+            if epoch > mine:
+                self.merged[name] = (epoch, fn(value, self.own[name]))
+            elif epoch == mine:
+                self.merged[name] = (epoch, fn(ours, value))
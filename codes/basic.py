@@ -1,10 +1,14 @@
 import os
+import socket
+import struct
 import logging
 import asyncio
 import pickle
 import hashlib
 import random
-from collections import defaultdict
+import functools
+import itertools
+from collections import defaultdict, deque, Counter, OrderedDict
 
 log = logging.getLogger(__name__)
 
@@ -20,10 +24,25 @@ def implements(ifname):
 
 def uses(ifname, attr):
     def decorator(cls):
-        if hasattr(cls, '_uses'):
+        # a subclass gets its own copy instead of extending its parent's
+        if '_uses' not in cls.__dict__:
+            cls._uses = list(getattr(cls, '_uses', []))
+        if (ifname, attr) not in cls._uses:
             cls._uses.append((ifname, attr))
-        else:
-            cls._uses = [(ifname, attr)]
+        return cls
+    return decorator
+
+
+def nests(ifname, attr):
+    """
+    the module nests instances of ifname (see `nested`): attr is the class
+    implementing it, chosen when the module is built like those it uses
+    """
+    def decorator(cls):
+        if '_nests' not in cls.__dict__:
+            cls._nests = list(getattr(cls, '_nests', []))
+        if (ifname, attr) not in cls._nests:
+            cls._nests.append((ifname, attr))
         return cls
     return decorator
 
@@ -44,6 +63,66 @@ class ABC:
             concrete = get_implementation(ifname)
             that = concrete('%s.%s' % (name, attr), self, udp, addr, peers)
             setattr(self, attr, that)
+        for ifname, attr in getattr(self, '_nests', []):
+            setattr(self, attr, get_implementation(ifname))
+
+
+class Slot:
+    """
+    links of one of many instances of a module nested in `owner`: whatever
+    the instance sends goes through the links of the owner, tagged with its
+    key, and the owner of the receiver hands it to its own instance there.
+    An instance with members of its own broadcasts to them alone.
+    """
+    def __init__(self, owner, key, members=None):
+        self.owner, self.key = owner, key
+        self.members = members
+
+    def wrap(self, m):
+        return {'typ': 'slot', 'pos': self.key, 'm': m}
+
+    def upon_Broadcast(self, m):
+        if self.members is None:
+            trigger(self.owner.beb, 'Broadcast', self.wrap(m))
+            return
+        for p in self.members:
+            trigger(self.owner.pl, 'Send', p, self.wrap(m))
+
+    def upon_Send(self, p, m):
+        trigger(self.owner.pl, 'Send', p, self.wrap(m))
+
+
+class Tagged:
+    """
+    upper layer of a nested instance: its indications reach the owner with
+    the key of the instance first
+    """
+    def __init__(self, owner, key):
+        self.owner, self.key = owner, key
+
+    def __getattr__(self, attr):
+        return functools.partial(getattr(self.owner, attr), self.key)
+
+
+_bare = {}
+
+
+def nested(cls, owner, key, upper=None, initargs=(), peers=None):
+    """
+    instance `key` of module cls inside owner: it builds no modules of its
+    own, every module it uses is a Slot of owner. With peers, it runs among
+    those and owner instead of all the peers of owner.
+    """
+    if cls not in _bare:
+        _bare[cls] = type(cls.__name__, (cls,), {'_uses': []})
+    obj = _bare[cls]('%s.%s' % (owner.name, key), upper or owner,
+                     owner._udp, owner.addr,
+                     owner.peers if peers is None else peers,
+                     initargs=initargs)
+    slot = Slot(owner, key, None if peers is None else obj.members)
+    for ifname, attr in cls._uses:
+        setattr(obj, attr, slot)
+    return obj
 
 
 def trigger(obj, event, *attrs):
@@ -59,6 +138,15 @@ def trigger(obj, event, *attrs):
     loop.call_soon(m, *attrs)
 
 
+def notify(obj, event, *attrs):
+    """
+    trigger event on obj only if obj handles it: Pause and Resume are for
+    whoever cares to slow down, see RetransmitWithACK
+    """
+    if getattr(obj, 'upon_' + event, None):
+        trigger(obj, event, *attrs)
+
+
 def start_timer(delay, callback, *args):
     loop = asyncio.get_event_loop()
     loop.call_later(delay, callback, *args)
@@ -68,17 +156,133 @@ def mhash(m):
     return hashlib.md5(pickle.dumps(m)).hexdigest()
 
 
+class BufferPool:
+    """
+    bytearrays to reassemble messages in, each kept once its message is
+    done for the next one of its size, a power of two: `limit` bytes of
+    them at most, in use or not
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.free = defaultdict(list)  # size -> bytearrays not in use
+        self.held = 0  # bytes of all of them
+        self.peak = 0
+
+    def get(self, size):
+        """a bytearray of size bytes at least, None past the limit"""
+        size = 1 << max(size - 1, 0).bit_length()
+        if self.free[size]:
+            return self.free[size].pop()
+        for free in self.free.values():
+            while free and self.held + size > self.limit:
+                self.held -= len(free.pop())
+        if self.held + size > self.limit:
+            return None
+        self.held += size
+        self.peak = max(self.peak, self.held)
+        return bytearray(size)
+
+    def put(self, buf):
+        self.free[len(buf)].append(buf)
+
+
+class Reassembly:
+    """a message coming in fragments"""
+    def __init__(self, buf, count, asked, now):
+        self.buf, self.view = buf, memoryview(buf)
+        self.got = bytearray(count)  # 1 for each fragment in
+        self.missing = count
+        self.asked = asked  # fragments below were sent or asked for
+        self.lowest = 0  # no fragment below is missing
+        self.again = {}  # fragment asked for again -> asked then
+        self.started = self.heard = now
+
+
+FRAGMENT = struct.Struct('>cQIIQ')  # b'F', id, index, fragment size, total
+NACK = struct.Struct('>cQ')  # b'N', id, the indexes asked for, none if done
+
+
 class UDPProtocol:
+    """
+    Datagrams to a peer queue up while the socket cannot take any more
+    (pause_writing), and go out a peer at a time in turn once it can. Once
+    HIGH bytes wait for a peer, every link is told Pause | peer, and Resume
+    | peer once no more than LOW do; past MAX, datagrams to it are dropped,
+    as fair-loss links may.
+
+    A message that does not fit in a datagram, MAX_DATAGRAM bytes, goes in
+    fragments of FRAGMENT bytes, numbered. The sender sends the first BURST
+    of them, and the receiver asks for the next ones as they come in, so
+    that no more than BURST are on their way at once: a large message does
+    not flood the socket buffer, RCVBUF bytes if the system allows. The
+    receiver writes each fragment in place into a buffer from a BufferPool
+    of POOL bytes, and delivers the message once it has them all. It asks
+    again for a fragment missing once one REORDER places after it, or after
+    the last it had asked for when it asked again, came in; and for those
+    it misses RETRY seconds without a fragment of the message, and so on
+    until TTL seconds after the first came in: then it gives up. The sender
+    keeps the fragments of a message until the receiver says it has them
+    all, or for as long, KEEP bytes of them at most. A message is dropped
+    if there is no room for it in the pool, and any over POOL bytes with a
+    warning: see StreamTransport for messages of any size.
+    """
     DELAY = 2
+    MAX_DATAGRAM = 65507
+    HIGH = 256 * 1024
+    LOW = 64 * 1024
+    MAX = 1024 * 1024
+    FRAGMENT = 60 * 1024
+    BURST = 16
+    REORDER = 3
+    RCVBUF = 4 * 1024 * 1024
+    POOL = 64 * 1024 * 1024
+    KEEP = 64 * 1024 * 1024
+    RETRY = .05
+    TTL = 5
+    DONE = 4096  # messages reassembled last, whose fragments are ignored
 
     def connection_made(self, transport):
         self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RCVBUF)
         self.handlers = {}
+        self.queues = {}  # peer -> datagrams waiting for the socket
+        self.queued = Counter()  # peer -> bytes waiting
+        self.held = set()  # peers the links were told to pause for
+        self.writable = True
+        self.mids = itertools.count()
+        self.kept = OrderedDict()  # id -> (when, bytes, fragments) of ours
+        self.kept_bytes = 0
+        self.pool = BufferPool(self.POOL)
+        self.partial = {}  # (peer, id) -> Reassembly
+        self.done = OrderedDict()  # (peer, id) reassembled last
+        self.ticking = False
+        self.stats = Counter()
 
     def connection_lost(self, exc):
         log.warn('connection %s lost: %s', self, exc)
 
+    def error_received(self, exc):
+        log.warn('%s: %s', self.addr, exc)
+
+    def pause_writing(self):
+        self.writable = False
+
+    def resume_writing(self):
+        self.writable = True
+        self.flush()
+
     def datagram_received(self, data, peer):
+        kind = data[:1]
+        if kind == b'F':
+            self.reassemble(data, peer)
+        elif kind == b'N':
+            self.resend(data, peer)
+        else:
+            self.deliver(data, peer)
+
+    def deliver(self, data, peer):
         try:
             name, msg = pickle.loads(data)
             handler = self.handlers[name]
@@ -97,14 +301,172 @@ class UDPProtocol:
 
         def sendto(msg, peer):
             data = pickle.dumps((name, msg))
+            if len(data) > self.POOL:
+                log.warn('%s --> %s: %d bytes exceeds a message, dropped',
+                         self.addr, peer, len(data))
+                return
+            if len(data) > self.MAX_DATAGRAM:
+                datagrams = self.fragment(data)
+            else:
+                datagrams = [data]
             loop = asyncio.get_event_loop()
 
             def _send():
                 log.debug('%s --> %s: %s', self.addr, peer, msg)
-                self.transport.sendto(data, peer)
+                for data in datagrams:
+                    self.enqueue(data, peer)
             return loop.call_later(random.random() * self.DELAY, _send)
         return sendto
 
+    def fragment(self, data):
+        """the first fragments of data, all of them kept to send"""
+        mid, size, view = next(self.mids), self.FRAGMENT, memoryview(data)
+        fragments = [
+            FRAGMENT.pack(b'F', mid, i, size, len(data)) +
+            view[start:start + size]
+            for i, start in enumerate(range(0, len(data), size))]
+        self.kept[mid] = (asyncio.get_event_loop().time(), len(data),
+                          fragments)
+        self.kept_bytes += len(data)
+        while self.kept_bytes > self.KEEP:
+            self.forget(next(iter(self.kept)))
+        self.stats['fragmented'] += 1
+        self.tick_later()
+        return fragments[:self.BURST]
+
+    def reassemble(self, data, peer):
+        _, mid, index, size, total = FRAGMENT.unpack_from(data)
+        key, now = (peer, mid), asyncio.get_event_loop().time()
+        r = self.partial.get(key)
+        if r is None:
+            if key in self.done:
+                return
+            buf = self.pool.get(total)
+            if buf is None:
+                self.stats['no room'] += 1
+                return
+            count = -(-total // size)
+            r = self.partial[key] = Reassembly(
+                buf, count, min(count, self.BURST), now)
+            self.tick_later()
+        if r.got[index]:
+            return
+        r.got[index], r.heard = 1, now
+        r.missing -= 1
+        start = index * size
+        r.view[start:start + len(data) - FRAGMENT.size] = \
+            memoryview(data)[FRAGMENT.size:]
+        if r.missing:
+            count = len(r.got)
+            while r.got[r.lowest]:
+                r.lowest += 1
+            lost = [i for i in range(r.lowest, index - self.REORDER + 1)
+                    if not r.got[i] and
+                    index >= r.again.get(i, i) + self.REORDER]
+            if lost:
+                r.again.update(dict.fromkeys(lost, r.asked))
+                self.stats['asked again'] += len(lost)
+                self.ask(peer, mid, lost)
+            under_way = r.asked - (count - r.missing)
+            if r.asked < count and 2 * under_way <= self.BURST:
+                ask = range(r.asked,
+                            min(count, r.asked + self.BURST - under_way))
+                r.asked = ask.stop
+                self.ask(peer, mid, ask)
+            return
+        del self.partial[key]
+        self.ask(peer, mid, ())
+        self.done[key] = None
+        if len(self.done) > self.DONE:
+            self.done.popitem(last=False)
+        self.stats['reassembled'] += 1
+        self.deliver(r.view[:total], peer)
+        self.free(r)
+
+    def free(self, r):
+        r.view.release()
+        self.pool.put(r.buf)
+
+    def resend(self, data, peer):
+        _, mid = NACK.unpack_from(data)
+        kept = self.kept.get(mid)
+        if kept is None:
+            return
+        fragments = kept[2]
+        n = (len(data) - NACK.size) // 4
+        if not n:
+            self.forget(mid)
+            return
+        for i in struct.unpack_from('>%dI' % n, data, NACK.size):
+            if i < len(fragments):
+                self.stats['requested'] += 1
+                self.enqueue(fragments[i], peer)
+
+    def forget(self, mid):
+        self.kept_bytes -= self.kept.pop(mid)[1]
+
+    def ask(self, peer, mid, indexes):
+        """ask peer for these fragments of its message mid"""
+        self.enqueue(NACK.pack(b'N', mid) +
+                     struct.pack('>%dI' % len(indexes), *indexes), peer)
+
+    def tick_later(self):
+        if not self.ticking:
+            self.ticking = True
+            start_timer(self.RETRY, self.tick)
+
+    def tick(self):
+        """ask for missing fragments, forget what is too old"""
+        now = asyncio.get_event_loop().time()
+        for (peer, mid), r in list(self.partial.items()):
+            if now - r.started > self.TTL:
+                del self.partial[(peer, mid)]
+                self.stats['expired'] += 1
+                self.free(r)
+            elif now - r.heard >= self.RETRY:
+                r.heard = now
+                missing = [i for i in range(r.asked)
+                           if not r.got[i]][:self.BURST]
+                r.again.update(dict.fromkeys(missing, r.asked))
+                self.stats['asked again'] += len(missing)
+                self.ask(peer, mid, missing)
+        while self.kept:
+            mid, (when, _, _) = next(iter(self.kept.items()))
+            if now - when <= self.TTL:
+                break
+            self.forget(mid)
+        self.ticking = False
+        if self.partial or self.kept:
+            self.tick_later()
+
+    def enqueue(self, data, peer):
+        if self.queued[peer] + len(data) > self.MAX:
+            log.debug('%s --> %s: queue full, dropped', self.addr, peer)
+            return
+        self.queues.setdefault(peer, deque()).append(data)
+        self.queued[peer] += len(data)
+        if self.queued[peer] >= self.HIGH and peer not in self.held:
+            self.held.add(peer)
+            for handler in self.handlers.values():
+                notify(handler, 'Pause', peer)
+        self.flush()
+
+    def flush(self):
+        while self.writable and self.queues:
+            for peer in list(self.queues):
+                if not self.writable:
+                    break
+                queue = self.queues[peer]
+                data = queue.popleft()
+                if not queue:
+                    del self.queues[peer]
+                self.queued[peer] -= len(data)
+                self.transport.sendto(data, peer)
+                if self.queued[peer] <= self.LOW and peer in self.held:
+                    self.held.discard(peer)
+                    for handler in self.handlers.values():
+                        notify(handler, 'Resume', peer)
+
 
 class Store:
     def __init__(self, storeid):
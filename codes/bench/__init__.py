@@ -0,0 +1,7 @@
+"""
+Benchmarks on the simulated network of `codes.sim`
+
+Each module is runnable on its own, e.g.
+
+    $ python -m codes.bench.lazy_gossip
+"""
@@ -0,0 +1,55 @@
+"""
+Convergence of push-pull gossip aggregation: worst estimate over all
+processes after each round, and the messages it took.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..aggregation import PushSumAggregation
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=1000)
+    p.add_argument('-r', '--rounds', type=int, default=30)
+    p.add_argument('--loss', type=float, default=.05)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    random.seed(args.seed)
+
+    loop = new_loop()
+    net = SimNetwork(loss=args.loss, seed=args.seed)
+    nodes = cluster(PushSumAggregation, args.n, net, name='ga')
+    depth = [random.randint(0, 100) for _ in nodes]
+    index = [random.randint(0, 10 ** 6) for _ in nodes]
+    for node, d, i in zip(nodes, depth, index):
+        trigger(node.module, 'Register', 'queue depth', 'avg', d)
+        trigger(node.module, 'Register', 'members', 'count')
+        trigger(node.module, 'Register', 'log index', max, i)
+    avg = sum(depth) / len(depth)
+
+    def error(name, truth):
+        worst = 0.
+        for node in nodes:
+            e = node.module.estimate(name)
+            worst = max(worst, 1. if e is None else abs(e - truth) / truth)
+        return worst
+
+    print('N=%d, loss %.0f%%' % (args.n, args.loss * 100))
+    print('%5s %12s %12s %12s %10s' % (
+        'round', 'avg err', 'count err', 'max agreed', 'msgs/proc'))
+    for r in range(1, args.rounds + 1):
+        run(loop, PushSumAggregation.PERIOD)
+        agreed = sum(1 for node in nodes
+                     if node.module.estimate('log index') == max(index))
+        print('%5d %12.2e %12.2e %11.1f%% %10.1f' % (
+            r, error('queue depth', avg), error('members', args.n),
+            100. * agreed / args.n, net.total() / args.n))
+
+
+if __name__ == '__main__':
+    main()
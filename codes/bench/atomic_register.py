@@ -0,0 +1,107 @@
+"""
+(N, N) atomic register with every process reading and writing in a closed
+loop: how many reads take the one round trip fast path, and the latency
+with and without it as the share of writes grows. With --one-writer only
+the first process writes, and the fast run makes it the WRITER, whose
+writes take one round trip too.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..register import ReadImposeWriteConsultMajority
+from ..sim import new_loop, run, cluster, members, Node, SimNetwork
+
+
+class Client(Node):
+    write_ratio = 0.
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.latency = {'read': [], 'write': []}
+
+    def next(self):
+        self.started = self.loop.time()
+        if random.random() < self.write_ratio:
+            self.op = 'write'
+            trigger(self.module, 'Write', (self.addr, self.started))
+        else:
+            self.op = 'read'
+            trigger(self.module, 'Read')
+
+    def done(self):
+        self.latency[self.op].append(self.loop.time() - self.started)
+        self.next()
+
+    def upon_ReadReturn(self, v):
+        self.done()
+
+    def upon_WriteReturn(self):
+        self.done()
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def simulate(args, write_ratio, fast):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    writer = members(args.n)[0] if args.one_writer else None
+    fixed = type('Register', (ReadImposeWriteConsultMajority,), {
+        'FAST_READS': fast, 'WRITER': writer if fast else None})
+    Client.write_ratio = write_ratio
+    nodes = cluster(fixed, args.n, net, name='nnar', upper=Client)
+    for node in nodes:
+        if writer not in (None, node.addr):
+            node.write_ratio = 0.
+        node.loop = loop
+        node.next()
+    run(loop, args.time)
+    loop.close()
+    stats = {k: sum(n.module.stats[k] for n in nodes)
+             for k in nodes[0].module.stats}
+    reads = [t for n in nodes for t in n.latency['read']]
+    writes = [t for n in nodes for t in n.latency['write']]
+    return {
+        'fast reads %': 100. * stats['fastreads'] / max(stats['reads'], 1),
+        'fast writes %': 100. * stats['fastwrites'] / max(stats['writes'], 1),
+        'read ms': 1000 * sum(reads) / max(len(reads), 1),
+        'read p99 ms': 1000 * percentile(reads, .99),
+        'write ms': 1000 * sum(writes) / max(len(writes), 1),
+        'ops/s': (len(reads) + len(writes)) / args.time,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=5)
+    p.add_argument('-w', '--writes', type=float, nargs='+',
+                   default=[0, .05, .2, .5, 1])
+    p.add_argument('-t', '--time', type=float, default=20)
+    p.add_argument('--one-writer', action='store_true',
+                   help='only the first process writes')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    columns = None
+    for fast in (False, True):
+        print('N=%d, %s' % (args.n, 'fast paths' if fast else 'classic'))
+        for ratio in args.writes:
+            result = simulate(args, ratio, fast)
+            if columns is None:
+                columns = list(result)
+                print('%8s' % 'writes' +
+                      ''.join('%14s' % c for c in columns))
+            print('%7.0f%%' % (ratio * 100) +
+                  ''.join('%14.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
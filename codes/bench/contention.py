@@ -0,0 +1,80 @@
+"""
+Dueling Synod proposers: k of N processes propose to the same instance,
+each at a random moment within `spread` seconds, over a lossy network.
+Seconds until a value is chosen (the first process decides) and messages
+sent by then, over a number of trials, for proposers that give up once
+they lose a round, for randomized backoff, and for a designated proposer.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..paxos import Synod
+from ..sim import new_loop, run, cluster, SimNetwork
+from .atomic_register import percentile
+
+
+class GiveUp(Synod):
+    """a proposer that loses a round never tries again"""
+    def backoff(self, n):
+        pass
+
+
+def simulate(args, cls, k, seed):
+    random.seed(seed)
+    loop = new_loop()
+    net = SimNetwork(loss=args.loss, seed=seed)
+    nodes = cluster(cls, args.n, net, name='synod')
+    for node in random.sample(nodes, k):
+        loop.call_later(random.uniform(0, args.spread),
+                        trigger, node.module, 'Propose', node.addr)
+    elapsed = 0
+    while not any(node.events['Decide'] for node in nodes):
+        if elapsed >= args.limit:
+            break
+        run(loop, .01)
+        elapsed += .01
+    loop.close()
+    decided = [t for node in nodes for t, _ in node.events['Decide']]
+    return min(decided, default=None), net.total()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=5)
+    p.add_argument('--trials', type=int, default=50)
+    p.add_argument('--loss', type=float, default=.05)
+    p.add_argument('--spread', type=float, default=.02,
+                   help='seconds within which the proposers start')
+    p.add_argument('--limit', type=float, default=10,
+                   help='seconds of virtual time to wait for decisions')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('give up', GiveUp),
+        ('backoff', Synod),
+        ('designated', type('Designated', (Synod,), {'DESIGNATED': True})),
+        ]
+    print('N=%d, %d trials, %g%% loss' % (
+        args.n, args.trials, 100 * args.loss))
+    print('%3s %-12s %9s %9s %9s %9s' % (
+        'k', 'proposers', 'stuck %', 'ms', 'p99 ms', 'msgs'))
+    for k in range(1, args.n + 1):
+        for name, cls in runs:
+            latency, msgs = [], []
+            for trial in range(args.trials):
+                t, sent = simulate(args, cls, k, args.seed + trial)
+                msgs.append(sent)
+                if t is not None:
+                    latency.append(t)
+            print('%3d %-12s %9.1f %9.1f %9.1f %9.1f' % (
+                k, name, 100. * (args.trials - len(latency)) / args.trials,
+                1000 * sum(latency) / max(len(latency), 1),
+                1000 * percentile(latency, .99), sum(msgs) / len(msgs)))
+
+
+if __name__ == '__main__':
+    main()
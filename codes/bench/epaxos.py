@@ -0,0 +1,108 @@
+"""
+EPaxos against the leader-driven log, MultiPaxos with a stable leader, as
+commands conflict more often: every process keeps `window` commands under
+way, each on a key shared by all processes with probability `conflict` and
+on a key of its own otherwise. Commands run per second, latency, messages
+per command, and messages sent or received per command by the busiest
+process: the leader, for the leader-driven log.
+"""
+import random
+import argparse
+import logging
+from collections import Counter
+
+from ..basic import trigger
+from ..epaxos import EPaxos
+from ..consensus import LeaderDrivenLog
+from ..sim import new_loop, run, cluster, SimNetwork
+from .atomic_register import percentile
+from .log_engine import Client
+
+
+class KeyedClient(Client):
+    conflict = 0.
+
+    def next(self):
+        now = self.loop.time()
+        self.started.append(now)
+        if random.random() < self.conflict:
+            key = 'hot'
+        else:
+            key = (self.addr, len(self.started) + len(self.latency))
+        trigger(self.module, 'Execute', ('set', key, now))
+
+
+class LoadNetwork(SimNetwork):
+    """counts messages sent and received per process"""
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.load = Counter()
+
+    def send(self, name, msg, src, dst):
+        if src not in self.crashed:
+            self.load[src] += 1
+            self.load[dst] += 1
+        super().send(name, msg, src, dst)
+
+
+def simulate(args, cls, n, conflict):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = LoadNetwork(seed=args.seed)
+    KeyedClient.window = args.window
+    KeyedClient.conflict = conflict
+    nodes = cluster(cls, n, net, name='rsm', upper=KeyedClient)
+    for node in nodes:
+        node.loop = loop
+        node.start()
+    run(loop, args.warmup)
+    sent, load = net.total(), Counter(net.load)
+    run(loop, args.time)
+    loop.close()
+    done = [t for node in nodes for t in node.latency if t[0] > args.warmup]
+    seconds = [s for _, s in done]
+    cmds = max(len(done), 1)
+    return {
+        'cmds/s': len(done) / args.time,
+        'ms': 1000 * sum(seconds) / max(len(seconds), 1),
+        'p99 ms': 1000 * percentile(seconds, .99),
+        'msgs/cmd': (net.total() - sent) / cmds,
+        'busiest': max((net.load - load).values(), default=0) / cmds,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[3, 5])
+    p.add_argument('-c', '--conflict', type=float, nargs='+',
+                   default=[0, .02, .1, .25, .5, 1])
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per process')
+    p.add_argument('-t', '--time', type=float, default=10)
+    p.add_argument('--warmup', type=float, default=10,
+                   help='seconds to elect a leader and start its epoch')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('stable leader', LeaderDrivenLog),
+        ('EPaxos', EPaxos),
+        ]
+    columns = None
+    for n in args.n:
+        for name, cls in runs:
+            for conflict in args.conflict:
+                if cls is LeaderDrivenLog and conflict != args.conflict[0]:
+                    continue  # conflicts make no difference to a log
+                result = simulate(args, cls, n, conflict)
+                if columns is None:
+                    columns = list(result)
+                    print('%-14s %3s %9s' % ('rsm', 'N', 'conflict') +
+                          ''.join('%10s' % c for c in columns))
+                print('%-14s %3d %8g%%' % (name, n, 100 * conflict) +
+                      ''.join('%10.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Leader-based epoch change (algo 5.5) with a new attempt per nack, N above
+the last one, against nacks reporting the highest timestamp started and
+coalesced into one attempt with backoff. The leader is crashed and
+restored a few times; for each leader change: epoch change messages, epochs
+started per process, and seconds from the first epoch started to the last.
+"""
+import uuid
+import argparse
+import logging
+
+from ..basic import trigger
+from ..consensus import LeaderBasedEpochChange
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+class PerNack(LeaderBasedEpochChange):
+    """algo 5.5 as it was: every nack makes a new attempt, N above the last"""
+    def upon_Trust(self, p):
+        self.trusted = p
+        if p == self.addr:
+            self.new_epoch()
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'newepoch':
+            if q == self.trusted and m['ts'] > self.lastts:
+                self.start_epoch(m['ts'], q)
+            else:
+                trigger(self.pl, 'Send', q, {
+                    'typ': 'nack',
+                    'mid': uuid.uuid4(),
+                    })
+        elif m['typ'] == 'nack' and self.trusted == self.addr:
+            self.new_epoch()
+
+
+class CappedNetwork(SimNetwork):
+    """drops epoch change messages past `cap`, to put out a storm"""
+    cap = float('inf')
+
+    def sent(self):
+        return self.msgs['beb'] + self.msgs['pl']
+
+    def send(self, name, msg, src, dst):
+        if self.sent() >= self.cap:
+            self.dropped['cap'] += 1
+            return
+        super().send(name, msg, src, dst)
+
+
+def simulate(args, cls, n):
+    """
+    averages per leader change, or the number of the first change that
+    takes args.storm * N^2 messages
+    """
+    loop = new_loop()
+    net = CappedNetwork(seed=args.seed,
+                        classify=lambda name, msg: name.split('.')[1])
+    nodes = cluster(cls, n, net, name='ec')
+    run(loop, args.warmup)
+    leader = max(node.addr for node in nodes)
+    changes = []
+    for i in range(2 * args.changes):
+        start, sent = loop.time(), net.sent()
+        net.cap = sent + args.storm * n * n
+        if i % 2 == 0:
+            net.crash(leader)
+        else:
+            net.recover(leader)
+        run(loop, args.interval)
+        if net.sent() >= net.cap:
+            loop.close()
+            return i + 1
+        started = [t for node in nodes if node.addr not in net.crashed
+                   for t, _ in node.events['StartEpoch'] if t > start]
+        changes.append((
+            net.sent() - sent,
+            len(started) / (n - len(net.crashed)),
+            max(started) - min(started) if started else float('nan'),
+            ))
+    loop.close()
+    return [sum(c) / len(changes) for c in zip(*changes)]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[5, 10, 20, 50])
+    p.add_argument('-c', '--changes', type=int, default=3,
+                   help='times the leader is crashed and restored')
+    p.add_argument('--interval', type=float, default=30,
+                   help='seconds between leader changes')
+    p.add_argument('--warmup', type=float, default=10)
+    p.add_argument('--storm', type=float, default=50,
+                   help='messages per change, times N^2, to give up at')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('%4s %-24s %10s %10s %10s' % (
+        'N', 'epoch change', 'msgs', 'epochs', 'settle s'))
+    for n in args.n:
+        for name, cls in (('new attempt per nack', PerNack),
+                          ('coalesced nacks', LeaderBasedEpochChange)):
+            result = simulate(args, cls, n)
+            if isinstance(result, int):
+                print('%4d %-24s   storm at change %d' % (n, name, result))
+            else:
+                msgs, epochs, settle = result
+                print('%4d %-24s %10.1f %10.1f %10.2f' % (
+                    n, name, msgs, epochs, settle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Synod with the proposer telling learners the decision against acceptors
+telling every learner they accepted: seconds from the proposal until the
+proposer and until every process decides, and messages per decision, as N
+grows. One proposer, so that no round is lost to another.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..paxos import Synod
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+def simulate(args, cls, n, seed):
+    random.seed(seed)
+    loop = new_loop()
+    net = SimNetwork(seed=seed)
+    nodes = cluster(cls, n, net, name='synod')
+    proposer = random.choice(nodes)
+    trigger(proposer.module, 'Propose', 'v')
+    while not all(node.events['Decide'] for node in nodes):
+        run(loop, .001)
+    loop.close()
+    return (proposer.events['Decide'][0][0],
+            max(node.events['Decide'][0][0] for node in nodes),
+            net.total())
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[3, 5, 9, 17, 33])
+    p.add_argument('--trials', type=int, default=50)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('decided', Synod),
+        ('fan-out', type('Fanout', (Synod,), {'FANOUT': True})),
+        ]
+    print('%4s %-10s %12s %12s %10s' % (
+        'N', 'learners', 'proposer ms', 'all ms', 'msgs'))
+    for n in args.n:
+        for name, cls in runs:
+            results = [simulate(args, cls, n, args.seed + trial)
+                       for trial in range(args.trials)]
+            proposer, everyone, msgs = [sum(r) / len(r)
+                                        for r in zip(*results)]
+            print('%4d %-10s %12.1f %12.1f %10.1f' % (
+                n, name, 1000 * proposer, 1000 * everyone, msgs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Flooding consensus with full proposal sets (algo 5.1) against delta
+flooding: bytes sent and rounds until every correct process has decided, as
+N and the size of the proposals vary, with and without processes crashing
+halfway through their first broadcast. The failure detector takes about
+20 seconds to report a crash, which sets the pace of every extra round.
+A message over 64KB does not fit a datagram and never arrives: the run is
+stuck.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..consensus import FloodingConsensus, DeltaFloodingConsensus
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+class PartialNetwork(SimNetwork):
+    """
+    the messages of a doomed process reach only the processes it is given,
+    as if it crashed halfway through sending them
+    """
+    def __init__(self, reached, **kw):
+        super().__init__(**kw)
+        self.reached = reached  # doomed process -> processes it reaches
+
+    def send(self, name, msg, src, dst):
+        if src in self.reached and dst not in self.reached[src]:
+            self.dropped['crashed'] += 1
+            return
+        super().send(name, msg, src, dst)
+
+
+def simulate(args, cls, n, size, crashes):
+    random.seed(args.seed)
+    loop = new_loop()
+    addrs = sorted(('127.0.0.1', 5000 + i) for i in range(n))
+    doomed = random.sample(addrs, crashes)
+    alive = [a for a in addrs if a not in doomed]
+    # each reaches its own share of the others: none hears from all of them
+    reached = {c: set(alive[i::crashes]) for i, c in enumerate(doomed)}
+    net = PartialNetwork(reached, seed=args.seed,
+                         classify=lambda name, msg: name.split('.')[1])
+    nodes = cluster(cls, n, net, name='c')
+    for node in nodes:
+        payload = bytes(random.getrandbits(8) for _ in range(size))
+        trigger(node.module, 'Propose', (random.random(), payload))
+    run(loop, .1)
+    for addr in doomed:
+        net.crash(addr)
+    nodes = [node for node in nodes if node.addr not in doomed]
+    elapsed = .1
+    while not all(node.events['Decide'] for node in nodes):
+        run(loop, 1)
+        elapsed += 1
+        if elapsed > args.limit:
+            break
+    loop.close()
+    decisions = {v for node in nodes for _, v in node.events['Decide']}
+    return {
+        'KB': sum(v for k, v in net.bytes.items() if k != 'p') / 1024,
+        'rounds': max(node.module.round for node in nodes),
+        'seconds': elapsed,
+        'decided': all(node.events['Decide'] for node in nodes),
+        'agree': len(decisions) <= 1,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[5, 10, 20])
+    p.add_argument('-s', '--size', type=int, nargs='+',
+                   default=[10, 1000, 10000],
+                   help='bytes per proposal')
+    p.add_argument('-f', '--crashes', type=int, nargs='+', default=[0, 1, 2])
+    p.add_argument('--limit', type=float, default=120,
+                   help='seconds of virtual time to wait for decisions')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('%4s %6s %3s' % ('N', 'size', 'f') +
+          ' %12s %8s' % ('full sets', 'rounds') +
+          ' %12s %8s' % ('deltas', 'rounds'))
+    for n in args.n:
+        for size in args.size:
+            for crashes in args.crashes:
+                line = '%4d %6d %3d' % (n, size, crashes)
+                for cls in (FloodingConsensus, DeltaFloodingConsensus):
+                    r = simulate(args, cls, n, size, crashes)
+                    if not r['agree']:
+                        rounds = 'DISAGREE'
+                    elif not r['decided']:
+                        rounds = 'stuck'
+                    else:
+                        rounds = r['rounds']
+                    line += ' %10.1fKB %8s' % (r['KB'], rounds)
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Messages larger than a datagram between two UDPProtocols on this host, on
+a real event loop: each goes in fragments, and every datagram is lost on
+its way in with probability `loss`. The sender keeps `window` messages
+under way, `total` bytes in all, and counts one lost once TTL seconds go
+by without it. Messages reassembled, megabytes and messages per second,
+fragments asked for again and fragments sent on request per message, and
+the most the receiver held in reassembly buffers and the sender in
+fragments kept to send, in megabytes.
+"""
+import time
+import random
+import asyncio
+import argparse
+import logging
+
+from ..basic import UDPProtocol
+
+MB = 1 << 20
+
+
+class Lossy(UDPProtocol):
+    loss = 0.
+
+    def datagram_received(self, data, peer):
+        if random.random() >= self.loss:
+            super().datagram_received(data, peer)
+
+
+class Receiver:
+    def __init__(self):
+        self.got = []
+
+    def upon_Deliver(self, q, m):
+        self.got.append(m[0])
+
+
+async def measure(args, size, loss, port):
+    loop = asyncio.get_event_loop()
+    a, b = (args.host, port), (args.host, port + 1)
+    Lossy.loss = loss
+    closers, protocols = [], []
+    for addr in (a, b):
+        transport, protocol = await loop.create_datagram_endpoint(
+            Lossy, local_addr=addr)
+        protocol.addr = addr
+        closers.append(transport.close)
+        protocols.append(protocol)
+    sender, receiver = protocols
+    sendto = sender.register('bench', Receiver())
+    got = Receiver()
+    receiver.register('bench', got)
+    n = max(1, args.total // size)
+    payload = b'x' * size
+    under_way, lost, seq = {}, 0, 0  # seq -> when it was sent
+    kept = 0
+    start = time.monotonic()
+    while seq < n or under_way:
+        for i in got.got:
+            under_way.pop(i, None)
+        got.got.clear()
+        now = time.monotonic()
+        for i, sent in list(under_way.items()):
+            if now - sent > UDPProtocol.TTL:
+                del under_way[i]
+                lost += 1
+        while seq < n and len(under_way) < args.window:
+            under_way[seq] = now
+            sendto((seq, payload), b)
+            seq += 1
+        kept = max(kept, sender.kept_bytes)
+        await asyncio.sleep(.001)
+    seconds = time.monotonic() - start
+    for close in closers:
+        close()
+    done = n - lost
+    return {
+        'reassembled': done,
+        'MB/s': done * size / MB / seconds,
+        'msgs/s': done / seconds,
+        'asked/msg': receiver.stats['asked again'] / n,
+        'pulled/msg': sender.stats['requested'] / n,
+        'pool MB': receiver.pool.peak / MB,
+        'kept MB': kept / MB,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-s', '--size', type=int, nargs='+',
+                   default=[256 << 10, 1 << 20, 10 << 20],
+                   help='bytes per message')
+    p.add_argument('-l', '--loss', type=float, nargs='+',
+                   default=[0, .01, .05, .2])
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='messages under way')
+    p.add_argument('--total', type=int, default=128 << 20,
+                   help='bytes sent per run')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=7100)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    UDPProtocol.DELAY = 0
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    random.seed(args.seed)
+    print('window %d, %d KB fragments' % (
+        args.window, UDPProtocol.FRAGMENT >> 10))
+    columns = None
+    port = args.port
+    for size in args.size:
+        for loss in args.loss:
+            result = loop.run_until_complete(
+                measure(args, size, loss, port))
+            port += 2
+            if columns is None:
+                columns = list(result)
+                print('%9s %5s' % ('bytes', 'loss') +
+                      ''.join('%12s' % c for c in columns))
+            print('%9d %5g' % (size, loss) +
+                  ''.join('%12.1f' % result[c] for c in columns))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Eager gossip with (R, K) picked for a delivery target: what the analytic
+bound and the NumPy infection model predict against simulated broadcasts.
+"""
+import argparse
+import logging
+from collections import Counter
+
+from ..basic import trigger
+from ..gossip import (
+    EagerProbabilisticBroadcast, gossip_params, miss_probability,
+    expected_messages)
+from ..gossip_model import choose, infection_curve
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+def simulate(n, r, k, loss, broadcasts, seed):
+    loop = new_loop()
+    net = SimNetwork(loss=loss, seed=seed)
+    fixed = type('Fixed', (EagerProbabilisticBroadcast,), {'R': r, 'K': k})
+    nodes = cluster(fixed, n, net, name='upb')
+    for i in range(broadcasts):
+        trigger(nodes[i % n].module, 'Broadcast', i)
+        run(loop, 1)
+    reached = Counter(args[1] for node in nodes
+                      for _, args in node.events['Deliver'])
+    loop.close()
+    every = sum(1 for i in range(broadcasts) if reached[i] == n)
+    return every / broadcasts, net.total() / broadcasts
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[10, 50, 200])
+    p.add_argument('--loss', type=float, nargs='+', default=[.05, .2])
+    p.add_argument('-e', '--epsilon', type=float, default=.01)
+    p.add_argument('-b', '--broadcasts', type=int, default=200)
+    p.add_argument('--trials', type=int, default=2000)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('target: every process delivers with probability %s'
+          % (1 - args.epsilon))
+    print('%5s %5s %3s %4s | %9s %9s %9s | %9s %9s %9s' % (
+        'N', 'loss', 'R', 'K', 'bound', 'model', 'sim',
+        'msgs', 'model', 'sim'))
+    for n in args.n:
+        for loss in args.loss:
+            r, k = gossip_params(n, loss, args.epsilon)
+            assert choose(n, loss, args.epsilon)[:2] == (r, k)
+            bound = 1 - (n - 1) * miss_probability(n, k, r, loss)
+            _, model, model_msgs = infection_curve(
+                n, k, r, loss, args.trials, args.seed)
+            sim, sim_msgs = simulate(
+                n, r, k, loss, args.broadcasts, args.seed)
+            print('%5d %5.2f %3d %4d | %9.4f %9.4f %9.4f | %9.1f %9.1f %9.1f'
+                  % (n, loss, r, k, max(bound, 0), model, sim,
+                     expected_messages(k, r, loss), model_msgs, sim_msgs))
+
+
+if __name__ == '__main__':
+    main()
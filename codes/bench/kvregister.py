@@ -0,0 +1,84 @@
+"""
+YCSB-style load on ShardedRegisterStore: ops/sec of the whole simulated
+cluster (wall clock, all replicas in this one process) and messages per
+operation as the batch size and the number of keys vary.
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+
+from ..register import ShardedRegisterStore
+from ..sim import new_loop, cluster, SimNetwork
+
+WORKLOADS = {'a': .5, 'b': .95, 'c': 1.}  # share of reads
+
+
+def table_bytes(table):
+    return (sys.getsizeof(table.slots) + sys.getsizeof(table.vals) +
+            table.ts.buffer_info()[1] * table.ts.itemsize)
+
+
+def simulate(args, keys, batch):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    ShardedRegisterStore.BATCH = batch
+    nodes = cluster(ShardedRegisterStore, args.n, net, name='kv')
+    loop.run_until_complete(asyncio.sleep(0))
+    for node in nodes:
+        for k in range(keys):
+            node.module.table.put(k, 1, 0)
+
+    reads = WORKLOADS[args.workload]
+    clients = [node.module for node in nodes]
+    done, latency = 0, 0.
+    started = time.perf_counter()
+    while done < args.ops:
+        futures = []
+        for i in range(batch):
+            store = clients[i % len(clients)]
+            key = random.randrange(keys)
+            if random.random() < reads:
+                futures.append(store.read(key))
+            else:
+                futures.append(store.write(key, i))
+        t = loop.time()
+        loop.run_until_complete(asyncio.gather(*futures))
+        latency += (loop.time() - t) * len(futures)
+        done += len(futures)
+    elapsed = time.perf_counter() - started
+    size = table_bytes(clients[0].table) / keys
+    loop.close()
+    return done / elapsed, net.total() / done, latency / done * 1000, size
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-w', '--workload', choices=sorted(WORKLOADS),
+                   default='a')
+    p.add_argument('-k', '--keys', type=int, nargs='+',
+                   default=[1000, 100000, 1000000])
+    p.add_argument('-b', '--batch', type=int, nargs='+',
+                   default=[1, 10, 100, 1000])
+    p.add_argument('--ops', type=int, default=10000)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, workload %s (%d%% reads)' % (
+        args.n, args.workload, WORKLOADS[args.workload] * 100))
+    print('%8s %6s %10s %8s %12s %10s' % (
+        'keys', 'batch', 'ops/sec', 'msgs/op', 'latency ms', 'bytes/key'))
+    for keys in args.keys:
+        for batch in args.batch:
+            ops, msgs, latency, size = simulate(args, keys, batch)
+            print('%8d %6d %10.0f %8.2f %12.2f %10.1f' % (
+                keys, batch, ops, msgs, latency, size))
+
+
+if __name__ == '__main__':
+    main()
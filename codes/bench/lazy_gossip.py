@@ -0,0 +1,71 @@
+"""
+Recovery traffic and memory of lazy probabilistic broadcast on a lossy
+network: algo 3.10 as written against the bounded, range-recovering version.
+"""
+import pickle
+import random
+import argparse
+import logging
+
+from ..basic import trigger
+from ..gossip import (
+    LazyProbabilisticBroadcast, BoundedLazyProbabilisticBroadcast)
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+def classify(name, msg):
+    if name.endswith('.upb.fll'):
+        return 'gossip'
+    return msg.get('typ', 'message')
+
+
+def simulate(cls, args):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(loss=args.loss, seed=args.seed, classify=classify)
+    nodes = cluster(cls, args.n, net, name='pb')
+    peak = 0
+    for i in range(args.messages):
+        sender = random.choice(nodes)
+        trigger(sender.module, 'Broadcast', i)
+        run(loop, args.interval)
+        peak = max(peak, max(len(n.module.stored) for n in nodes))
+    run(loop, 2 * cls.DELTA)
+    delivered = sum(len(n.events['Deliver']) for n in nodes)
+    stored = [len(pickle.dumps(n.module.stored)) for n in nodes]
+    loop.close()
+    return {
+        'requests': net.msgs['request'],
+        'request KB': net.bytes['request'] / 1024,
+        'digests': net.msgs['digest'],
+        'delivered %': 100. * delivered / (args.n * args.messages),
+        'peak stored': peak,
+        'stored KB/proc': sum(stored) / len(stored) / 1024,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=20)
+    p.add_argument('-m', '--messages', type=int, default=1500)
+    p.add_argument('--interval', type=float, default=.2)
+    p.add_argument('--loss', type=float, default=.2)
+    p.add_argument('--ttl', type=float,
+                   default=BoundedLazyProbabilisticBroadcast.STORE_TTL)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    BoundedLazyProbabilisticBroadcast.STORE_TTL = args.ttl
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, %d messages, loss %.0f%%' % (
+        args.n, args.messages, args.loss * 100))
+    for cls in (LazyProbabilisticBroadcast,
+                BoundedLazyProbabilisticBroadcast):
+        result = simulate(cls, args)
+        print(cls.__name__)
+        for k, v in result.items():
+            print('  %-16s %10.1f' % (k, v))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Leader detectors under fault injection, below the leader-driven log: the
+links of the highest ranked process flap, down for 1-4 seconds and up for
+5-15, or they stay up but are slow. Leader changes and epochs started per
+process, seconds during which no command completed for longer than STALL,
+and commands run per second, for the monarchical detector (algo 2.8) and
+the sticky one, ranking processes or preferring the lowest round trip time.
+"""
+import random
+import asyncio
+import argparse
+import logging
+
+from ..consensus import LeaderBasedEpochChange, LeaderDrivenLog
+from ..leader_election import (
+    MonarchicalEventualLeaderElection, StickyEventualLeaderElection)
+from ..sim import new_loop, run, cluster, SimNetwork
+from .log_engine import Client
+
+STALL = .5
+
+
+class CountingEpochChange(LeaderBasedEpochChange):
+    def upon_Init(self):
+        super().upon_Init()
+        self.trusts = 0
+        self.epochs = 0
+
+    def upon_Trust(self, p):
+        self.trusts += 1
+        super().upon_Trust(p)
+
+    def start_epoch(self, ts, leader):
+        self.epochs += 1
+        super().start_epoch(ts, leader)
+
+
+def flap(net, addr, rand):
+    loop = asyncio.get_event_loop()
+    if addr in net.crashed:
+        net.recover(addr)
+        loop.call_later(rand.uniform(5, 15), flap, net, addr, rand)
+    else:
+        net.crash(addr)
+        loop.call_later(rand.uniform(1, 4), flap, net, addr, rand)
+
+
+def simulate(args, detector, scenario):
+    random.seed(args.seed)
+    rand = random.Random(args.seed)
+    loop = new_loop()
+    top = ('127.0.0.1', 5000 + args.n - 1)
+
+    def delay(src, dst):
+        if scenario == 'slow' and top in (src, dst):
+            return rand.uniform(.02, .03)
+        return rand.uniform(.001, .01)
+    net = SimNetwork(delay=delay, seed=args.seed)
+    Client.window = args.window
+    nodes = cluster(LeaderDrivenLog, args.n, net, name='log', upper=Client,
+                    mapping={'EpochChange': CountingEpochChange,
+                             'EventualLeaderDetector': detector})
+    for node in nodes:
+        node.loop = loop
+        node.start()
+    run(loop, args.warmup)
+    if scenario == 'flapping':
+        flap(net, top, rand)
+    run(loop, args.time)
+    loop.close()
+    times = sorted(t for node in nodes for t, _ in node.latency
+                   if t > args.warmup)
+    times = [args.warmup] + times + [args.warmup + args.time]
+    others = [node for node in nodes if node.addr != top]
+    return {
+        'changes': sum(n.module.ec.trusts - 1 for n in others) / len(others),
+        'epochs': sum(n.module.ec.epochs for n in others) / len(others),
+        'stall s': sum(b - a for a, b in zip(times, times[1:])
+                       if b - a > STALL),
+        'cmds/s': (len(times) - 2) / args.time,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=5)
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per process')
+    p.add_argument('-t', '--time', type=float, default=60)
+    p.add_argument('--warmup', type=float, default=10)
+    p.add_argument('--hold', type=float, default=30,
+                   help='seconds of evidence the sticky detector waits for')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    sticky = type('Sticky', (StickyEventualLeaderElection,),
+                  {'HOLD': args.hold})
+    detectors = [
+        ('monarchical', MonarchicalEventualLeaderElection),
+        ('sticky', sticky),
+        ('sticky, rtt', type('StickyRTT', (sticky,), {'PREFER_RTT': True})),
+        ]
+    columns = None
+    for scenario in ('flapping', 'slow'):
+        for name, detector in detectors:
+            result = simulate(args, detector, scenario)
+            if columns is None:
+                columns = list(result)
+                print('%-10s %-12s' % ('links', 'detector') +
+                      ''.join('%10s' % c for c in columns))
+            print('%-10s %-12s' % (scenario, name) +
+                  ''.join('%10.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
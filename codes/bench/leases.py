@@ -0,0 +1,135 @@
+"""
+Reads with and without leases, for the (1, N) regular register and the
+replicated log: latency, throughput and messages with every process running
+a closed loop that is mostly reads, then how long reads and writes stall
+when the lease holder crashes.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger, start_timer
+from ..register import MajorityVotingRegularRegister, LeasedRegularRegister
+from ..paxos import LeasedMultiPaxos
+from ..sim import new_loop, run, cluster, Node, SimNetwork
+from .atomic_register import percentile
+
+
+class Client(Node):
+    reads = .9
+    writer = None  # the only process writing, None if all do
+    think = .001  # between two operations, local reads take no time
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.latency = {'read': [], 'write': []}  # (finished, seconds)
+
+    def next(self):
+        self.started = self.loop.time()
+        writes = self.writer in (None, self.addr)
+        if writes and random.random() >= self.reads:
+            self.op = 'write'
+            if self.writer is None:
+                trigger(self.module, 'Execute', ('set', self.started))
+            else:
+                trigger(self.module, 'Write', self.started)
+        else:
+            self.op = 'read'
+            trigger(self.module, 'Read')
+
+    def done(self, *args):
+        now = self.loop.time()
+        self.latency[self.op].append((now, now - self.started))
+        start_timer(self.think, self.next)
+
+    upon_ReadReturn = upon_WriteReturn = upon_ExecuteReturn = done
+
+
+def gap(times, start, end):
+    """longest stretch in [start, end] without a completion"""
+    times = [start] + sorted(t for t in times if start <= t <= end) + [end]
+    return max(b - a for a, b in zip(times, times[1:]))
+
+
+def simulate(args, cls, writer, crash=None):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    Client.reads = args.reads
+    Client.think = args.think
+    nodes = cluster(cls, args.n, net, name='rw', upper=Client)
+    Client.writer = nodes[0].addr if writer else None
+    for node in nodes:
+        node.loop = loop
+        node.next()
+    warmup = args.warmup
+    run(loop, warmup)
+    sent = net.total()
+    holder = max(node.addr for node in nodes)
+    if crash is not None:
+        run(loop, crash)
+        net.crash(holder)
+        nodes = [node for node in nodes if node.addr != holder]
+    run(loop, args.time - (crash or 0))
+    loop.close()
+    end = warmup + args.time
+    reads = [t for n in nodes for t in n.latency['read'] if t[0] > warmup]
+    writes = [t for n in nodes for t in n.latency['write'] if t[0] > warmup]
+    if crash is not None:
+        crashed = warmup + crash
+        return {
+            'read gap s': gap([t for t, _ in reads], crashed, end),
+            'write gap s': gap([t for t, _ in writes], crashed, end),
+            }
+    reads = [s for _, s in reads]
+    writes = [s for _, s in writes]
+    return {
+        'local %': 100. * reads.count(0) / max(len(reads), 1),
+        'read ms': 1000 * sum(reads) / max(len(reads), 1),
+        'read p99 ms': 1000 * percentile(reads, .99),
+        'write ms': 1000 * sum(writes) / max(len(writes), 1),
+        'reads/s': len(reads) / args.time,
+        'writes/s': len(writes) / args.time,
+        'msgs/op': (net.total() - sent) / max(len(reads) + len(writes), 1),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=5)
+    p.add_argument('-r', '--reads', type=float, default=.9)
+    p.add_argument('-t', '--time', type=float, default=20)
+    p.add_argument('--think', type=float, default=.001)
+    p.add_argument('--warmup', type=float, default=10,
+                   help='seconds to elect a leader and get a lease')
+    p.add_argument('--crash', type=float, default=5,
+                   help='seconds into the run to crash the lease holder')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('register', MajorityVotingRegularRegister, True),
+        ('leased register', LeasedRegularRegister, True),
+        ('log', type('Log', (LeasedMultiPaxos,), {'LOCAL_READS': False}),
+         False),
+        ('leased log', LeasedMultiPaxos, False),
+        ]
+    print('N=%d, %d%% reads, %gs' % (args.n, args.reads * 100, args.time))
+    for crash in (None, args.crash):
+        if crash is not None:
+            print('\nlease holder crashed after %gs' % crash)
+        columns = None
+        for name, cls, writer in runs:
+            if crash is not None and cls is MajorityVotingRegularRegister:
+                continue
+            result = simulate(args, cls, writer, crash)
+            if columns is None:
+                columns = list(result)
+                print('%16s' % '' + ''.join('%13s' % c for c in columns))
+            print('%16s' % name +
+                  ''.join('%13.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
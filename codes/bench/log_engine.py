@@ -0,0 +1,112 @@
+"""
+Replicated logs with one proposer: MultiPaxos, where the leader runs both
+phases of Synod for every position, against the leader-driven log, where
+it reads once per epoch and then only writes. Every process keeps `window`
+commands under way; commands run per second, messages per command and
+latency at N = 3 and 5, then the longest stretch without a command run
+when the leader crashes.
+"""
+import random
+import argparse
+import logging
+from collections import deque
+
+from ..basic import trigger
+from ..paxos import LeasedMultiPaxos
+from ..consensus import LeaderDrivenLog
+from ..sim import new_loop, run, cluster, Node, SimNetwork
+from .atomic_register import percentile
+from .leases import gap
+
+
+class Client(Node):
+    window = 1
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.started = deque()
+        self.latency = []  # (finished, seconds)
+
+    def start(self):
+        for _ in range(self.window):
+            self.next()
+
+    def next(self):
+        now = self.loop.time()
+        self.started.append(now)
+        trigger(self.module, 'Execute', ('set', self.addr, now))
+
+    def upon_ExecuteReturn(self, pos, result, cid):
+        now = self.loop.time()
+        self.latency.append((now, now - self.started.popleft()))
+        self.next()
+
+
+def simulate(args, cls, n, window, crash=None):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    Client.window = window
+    nodes = cluster(cls, n, net, name='log', upper=Client)
+    for node in nodes:
+        node.loop = loop
+        node.start()
+    run(loop, args.warmup)
+    sent = net.total()
+    if crash is not None:
+        run(loop, crash)
+        leader = max(node.addr for node in nodes)
+        net.crash(leader)
+        nodes = [node for node in nodes if node.addr != leader]
+    run(loop, args.time - (crash or 0))
+    loop.close()
+    done = [t for node in nodes for t in node.latency if t[0] > args.warmup]
+    if crash is not None:
+        crashed = args.warmup + crash
+        return gap([t for t, _ in done], crashed, args.warmup + args.time)
+    seconds = [s for _, s in done]
+    return {
+        'cmds/s': len(done) / args.time,
+        'msgs/cmd': (net.total() - sent) / max(len(done), 1),
+        'ms': 1000 * sum(seconds) / max(len(seconds), 1),
+        'p99 ms': 1000 * percentile(seconds, .99),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[3, 5])
+    p.add_argument('-w', '--window', type=int, nargs='+',
+                   default=[1, 4, 16], help='commands under way per process')
+    p.add_argument('-t', '--time', type=float, default=10)
+    p.add_argument('--warmup', type=float, default=10,
+                   help='seconds to elect a leader and start its epoch')
+    p.add_argument('--crash', type=float, default=3,
+                   help='seconds into the run to crash the leader')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('MultiPaxos', LeasedMultiPaxos),
+        ('LeaderDrivenLog', LeaderDrivenLog),
+        ]
+    columns = None
+    for n in args.n:
+        for window in args.window:
+            for name, cls in runs:
+                result = simulate(args, cls, n, window)
+                if columns is None:
+                    columns = list(result)
+                    print('%-16s %3s %6s' % ('log', 'N', 'window') +
+                          ''.join('%10s' % c for c in columns))
+                print('%-16s %3d %6d' % (name, n, window) +
+                      ''.join('%10.1f' % result[c] for c in columns))
+    print('\nleader crashed after %gs, longest stall in seconds' % args.crash)
+    for name, cls in runs:
+        stall = simulate(args, cls, args.n[-1], args.window[0], args.crash)
+        print('%-16s %6.1f' % (name, stall))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+A state machine busy with the CPU, under Mencius: every command hashes a
+key `rounds` times over (Digest). Unlike the other benchmarks this one
+runs on a real event loop, time being what is measured: the machine of
+each process applies on the loop, on a thread or in a process of its own.
+Every process keeps `window` commands under way; commands run per second,
+latency, the time from a command being run in the log to its result being
+known, and how late a timer due every millisecond fires: the time the
+loop spends stalled, handling no message.
+"""
+import time
+import random
+import asyncio
+import argparse
+import logging
+
+from ..basic import trigger
+from ..paxos import Mencius
+from ..machine import Digest
+from ..sim import cluster, SimNetwork
+from .atomic_register import percentile
+from .log_engine import Client
+
+TICK = .001
+
+
+class Log(Mencius):
+    """records how long each command waits for its result"""
+    MACHINE = Digest
+
+    def upon_Init(self):
+        super().upon_Init()
+        self.run_at = {}  # pos -> when it was run in the log
+        self.apply_latency = []  # (applied, seconds)
+
+    def run(self, pos, cid, cmd):
+        self.run_at[pos] = time.monotonic()
+        super().run(pos, cid, cmd)
+
+    def applied(self, batch, results):
+        now = time.monotonic()
+        for pos, _, cmd in batch:
+            if cmd is not self.NOOP:
+                self.apply_latency.append((now, now - self.run_at[pos]))
+            self.run_at.pop(pos)
+        super().applied(batch, results)
+
+
+class HashClient(Client):
+    rounds = 1
+
+    def next(self):
+        now = self.loop.time()
+        self.started.append(now)
+        trigger(self.module, 'Execute', ('hash', self.addr, self.rounds))
+
+
+async def watch(stalls):
+    """how late each timer due every TICK seconds fires"""
+    loop = asyncio.get_event_loop()
+    while True:
+        due = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        stalls.append((loop.time(), loop.time() - due))
+
+
+def simulate(args, executor, rounds):
+    random.seed(args.seed)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    net = SimNetwork(seed=args.seed)
+    HashClient.window, HashClient.rounds = args.window, rounds
+    cls = type('Log', (Log,), {'EXECUTOR': executor})
+    nodes = cluster(cls, args.n, net, name='log', upper=HashClient)
+    stalls = []
+    start = time.monotonic()
+    for node in nodes:
+        node.loop = loop
+        node.start()
+    watcher = loop.create_task(watch(stalls))
+    loop.run_until_complete(asyncio.sleep(args.warmup + args.time))
+    watcher.cancel()
+    loop.run_until_complete(asyncio.gather(watcher, return_exceptions=True))
+    for node in nodes:
+        node.module.runner.close()
+    loop.close()
+    begin = loop.time() - args.time
+    done = [s for node in nodes for t, s in node.latency if t > begin]
+    applying = [s for node in nodes for t, s in node.module.apply_latency
+                if t > start + args.warmup]
+    stalled = [s for t, s in stalls if t > begin]
+    return {
+        'cmds/s': len(done) / args.time,
+        'ms': 1000 * sum(done) / max(len(done), 1),
+        'apply ms': 1000 * sum(applying) / max(len(applying), 1),
+        'p99 apply': 1000 * percentile(applying, .99),
+        'stall %': 100 * sum(stalled) / args.time,
+        'p99 stall': 1000 * percentile(stalled, .99),
+        'max stall': 1000 * max(stalled, default=0),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-r', '--rounds', type=int, nargs='+',
+                   default=[100, 1000, 10000],
+                   help='hashes per command')
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per process')
+    p.add_argument('-t', '--time', type=float, default=3)
+    p.add_argument('--warmup', type=float, default=1)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, window %d' % (args.n, args.window))
+    columns = None
+    for rounds in args.rounds:
+        for name, executor in (('loop', None), ('thread', 'thread'),
+                               ('process', 'process')):
+            result = simulate(args, executor, rounds)
+            if columns is None:
+                columns = list(result)
+                print('%-8s %6s' % ('machine', 'rounds') +
+                      ''.join('%10s' % c for c in columns))
+            print('%-8s %6d' % (name, rounds) +
+                  ''.join('%10.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
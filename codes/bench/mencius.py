@@ -0,0 +1,94 @@
+"""
+Replicated logs with many proposers: MultiPaxos, where each process
+proposes at the first position it believes free and colliding proposers
+fight over it, the leader-driven log, where every command goes through one
+leader, and Mencius, where positions are owned in turn and idle owners
+skip theirs. k of N processes keep `window` commands under way each;
+commands run per second, messages per command and latency, then the
+longest stretch without a command run when one proposer crashes.
+"""
+import random
+import argparse
+import logging
+
+from ..paxos import MultiPaxos, Mencius
+from ..consensus import LeaderDrivenLog
+from ..sim import new_loop, run, cluster, SimNetwork
+from .atomic_register import percentile
+from .leases import gap
+from .log_engine import Client
+
+
+def simulate(args, cls, n, k, crash=None):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    Client.window = args.window
+    nodes = cluster(cls, n, net, name='log', upper=Client)
+    clients = nodes[:k]
+    for node in nodes:
+        node.loop = loop
+    for node in clients:
+        node.start()
+    run(loop, args.warmup)
+    sent = net.total()
+    if crash is not None:
+        run(loop, crash)
+        net.crash(clients[-1].addr)
+        clients = clients[:-1]
+        run(loop, args.time - crash)
+        loop.close()
+        done = [t for node in clients for t, _ in node.latency]
+        return gap(done, args.warmup + crash, args.warmup + args.time)
+    run(loop, args.time)
+    loop.close()
+    done = [t for node in clients for t in node.latency if t[0] > args.warmup]
+    seconds = [s for _, s in done]
+    return {
+        'cmds/s': len(done) / args.time,
+        'msgs/cmd': (net.total() - sent) / max(len(done), 1),
+        'ms': 1000 * sum(seconds) / max(len(seconds), 1),
+        'p99 ms': 1000 * percentile(seconds, .99),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[3, 5, 7])
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per proposer')
+    p.add_argument('-t', '--time', type=float, default=10)
+    p.add_argument('--warmup', type=float, default=10,
+                   help='seconds to elect a leader and start its epoch')
+    p.add_argument('--crash', type=float, default=3,
+                   help='seconds into the run to crash a proposer')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('MultiPaxos', MultiPaxos),
+        ('single leader', LeaderDrivenLog),
+        ('Mencius', Mencius),
+        ]
+    columns = None
+    for n in args.n:
+        for k in sorted({1, (n + 1) // 2, n}):
+            for name, cls in runs:
+                result = simulate(args, cls, n, k)
+                if columns is None:
+                    columns = list(result)
+                    print('%-14s %3s %3s' % ('log', 'N', 'k') +
+                          ''.join('%10s' % c for c in columns))
+                print('%-14s %3d %3d' % (name, n, k) +
+                      ''.join('%10.1f' % result[c] for c in columns))
+    n = args.n[-1]
+    print('\nN=%d, a proposer crashed after %gs, longest stall in seconds'
+          % (n, args.crash))
+    for name, cls in runs[1:]:
+        stall = simulate(args, cls, n, n, args.crash)
+        print('%-14s %6.1f' % (name, stall))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Offered load past saturation, through Mencius with each process taking
+`cost` seconds per datagram received (see shards): clients submit commands
+at random, at a total rate `load` times what the log runs when saturated,
+whatever happens to the commands before. Without a limit everything is
+let in; otherwise MultiPaxos.LIMIT decides, and what it turns away is
+rejected at once. Commands answered within `deadline` seconds per second
+(goodput), rejected per second, latency of those answered, and commands
+under way at the end.
+"""
+import uuid
+import random
+import argparse
+import logging
+
+from ..basic import trigger, start_timer
+from ..paxos import Mencius
+from ..admission import Limit, AIMD, Gradient
+from ..sim import new_loop, run, cluster, Node
+from .atomic_register import percentile
+from .shards import BusyNetwork
+
+
+class OpenClient(Node):
+    rate = 1.  # commands per second
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.started = {}  # cid -> when it was submitted
+        self.latency = []  # (finished, seconds)
+        self.rejected = []  # when
+
+    def next(self):
+        cid = uuid.uuid4().hex
+        self.started[cid] = self.loop.time()
+        trigger(self.module, 'Execute', ('set', self.addr, cid), cid)
+        start_timer(random.expovariate(self.rate), self.next)
+
+    def upon_ExecuteReturn(self, pos, result, cid):
+        now = self.loop.time()
+        self.latency.append((now, now - self.started.pop(cid)))
+
+    def upon_Rejected(self, cid):
+        self.started.pop(cid)
+        self.rejected.append(self.loop.time())
+
+
+def simulate(args, limit, rate):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = BusyNetwork(seed=args.seed)
+    net.cost = args.cost
+    OpenClient.rate = rate / args.n
+    cls = type('Log', (Mencius,), {'LIMIT': limit, 'QUEUE': args.queue})
+    nodes = cluster(cls, args.n, net, name='log', upper=OpenClient)
+    for node in nodes:
+        node.loop = loop
+        node.next()
+    run(loop, args.warmup)
+    run(loop, args.time)
+    loop.close()
+    done = [s for node in nodes for t, s in node.latency
+            if t > args.warmup]
+    rejected = [t for node in nodes for t in node.rejected
+                if t > args.warmup]
+    return {
+        'goodput': sum(s <= args.deadline for s in done) / args.time,
+        'rejected/s': len(rejected) / args.time,
+        'ms': 1000 * sum(done) / max(len(done), 1),
+        'p99 ms': 1000 * percentile(done, .99),
+        'under way': sum(len(node.started) for node in nodes),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-l', '--load', type=float, nargs='+',
+                   default=[.5, .9, 1.2, 2, 4])
+    p.add_argument('--capacity', type=float, default=0,
+                   help='commands per second at saturation, 0 to measure')
+    p.add_argument('--cost', type=float, default=.0002,
+                   help='seconds a process takes per datagram received')
+    p.add_argument('-q', '--queue', type=int, default=0,
+                   help='commands waiting to be let in, past the limit')
+    p.add_argument('-d', '--deadline', type=float, default=.5)
+    p.add_argument('-t', '--time', type=float, default=10)
+    p.add_argument('--warmup', type=float, default=2)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    capacity = args.capacity
+    if not capacity:
+        capacity = max(simulate(args, Limit, rate)['goodput']
+                       for rate in (1e3, 3e3, 1e4))
+    print('N=%d, %gus per datagram received, saturated at %d cmds/s' % (
+        args.n, 1e6 * args.cost, capacity))
+    limits = [
+        ('none', None),
+        ('fixed', Limit),
+        ('AIMD', AIMD),
+        ('gradient', Gradient),
+        ]
+    columns = None
+    for load in args.load:
+        for name, limit in limits:
+            result = simulate(args, limit, load * capacity)
+            if columns is None:
+                columns = list(result)
+                print('%-9s %5s' % ('limit', 'load') +
+                      ''.join('%11s' % c for c in columns))
+            print('%-9s %5g' % (name, load) +
+                  ''.join('%11.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Commit latency of the leader-driven log and of MultiPaxos at N=7 with one
+fast leader and replicas from slow to fast, for majorities, flexible
+quorums (any q2 processes for a write, N - q2 + 1 for the read starting an
+epoch, or the prepare of a position) and grid quorums (a whole row to
+write, one process of each row to read). The leader runs `window` commands
+at a time; then the leader crashes and the longest stretch without a
+command run is reported. MultiPaxos runs both phases for every command, so
+it pays for the larger phase 1 quorums each time.
+"""
+import random
+import argparse
+import logging
+import functools
+
+from ..consensus import LeaderDrivenLog, ReadWriteEpochLog
+from ..paxos import MultiPaxos
+from ..quorum import Majority, Flexible, Grid
+from ..sim import new_loop, run, cluster, SimNetwork
+from .atomic_register import percentile
+from .leases import gap
+from .log_engine import Client
+
+# one-way delay in seconds to and from each process, in address order
+DELAYS = [.040, .030, .020, .010, .005, .002, .001]
+
+
+def simulate(args, log, quorums, crash=None):
+    random.seed(args.seed)
+    rand = random.Random(args.seed)
+    loop = new_loop()
+    addrs = sorted(('127.0.0.1', 5000 + i) for i in range(len(DELAYS)))
+    delays = dict(zip(addrs, DELAYS))
+
+    def delay(src, dst):
+        return (delays[src] + delays[dst]) / 2 * rand.uniform(.8, 1.2)
+    net = SimNetwork(delay=delay, seed=args.seed)
+    Client.window = args.window
+    if log == 'MultiPaxos':
+        cls = type('Log', (MultiPaxos,), {'QUORUMS': quorums})
+        nodes = cluster(cls, len(DELAYS), net, name='log', upper=Client)
+    else:
+        epoch = type('EpochLog', (ReadWriteEpochLog,), {'QUORUMS': quorums})
+        nodes = cluster(LeaderDrivenLog, len(DELAYS), net, name='log',
+                        upper=Client, mapping={'LogEpochConsensus': epoch})
+    leader = nodes[-1]
+    for node in nodes:
+        node.loop = loop
+    leader.start()
+    run(loop, args.warmup)
+    if crash is not None:
+        # the next leader takes over the clients
+        run(loop, crash)
+        net.crash(leader.addr)
+        nodes[-2].start()
+        run(loop, args.time - crash)
+        loop.close()
+        done = [t for node in nodes[-2:] for t, _ in node.latency]
+        return gap(done, args.warmup + crash, args.warmup + args.time)
+    run(loop, args.time)
+    loop.close()
+    seconds = [s for t, s in leader.latency if t > args.warmup]
+    return {
+        'p50 ms': 1000 * percentile(seconds, .5),
+        'p99 ms': 1000 * percentile(seconds, .99),
+        'cmds/s': len(seconds) / args.time,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-w', '--window', type=int, default=8)
+    p.add_argument('-t', '--time', type=float, default=10)
+    p.add_argument('--warmup', type=float, default=10)
+    p.add_argument('--crash', type=float, default=3,
+                   help='seconds into the run to crash the leader')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    runs = [
+        ('majority', Majority),
+        ('q2=3', functools.partial(Flexible, q2=3)),
+        ('q2=2', functools.partial(Flexible, q2=2)),
+        ('grid 4 wide', functools.partial(Grid, columns=4)),
+        ]
+    print('delays ms: %s' % ' '.join('%g' % (1000 * d) for d in DELAYS))
+    columns = None
+    for log in ('leader-driven', 'MultiPaxos'):
+        for name, quorums in runs:
+            result = simulate(args, log, quorums)
+            result['crash gap s'] = simulate(args, log, quorums, args.crash)
+            if columns is None:
+                columns = list(result)
+                print('%-14s%-12s' % ('log', 'quorums') +
+                      ''.join('%12s' % c for c in columns))
+            print('%-14s%-12s' % (log, name) +
+                  ''.join('%12.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Changes of members under load, through the log of Mencius: three processes
+take commands from two clients, `window` under way each; a fourth one is
+added, the third removed, then the fourth replaced by a fifth. For each
+change and each ALPHA: seconds until the new members run the log, the
+slowest tenth of a second against the median before the first change, and
+commands run in the `interval` seconds that follow, against as many
+seconds before it.
+"""
+import random
+import argparse
+import logging
+import statistics
+
+from ..basic import trigger
+from ..paxos import Mencius
+from ..sim import new_loop, run, cluster, members, SimNetwork
+from .log_engine import Client
+
+TICK = .1
+
+
+def spare(cls, net, addr, peers):
+    """a process to be added, waiting for a snapshot"""
+    node = Client(addr)
+    node.module = cls('log', node, net.endpoint(addr), addr, set(peers))
+    trigger(node.module, 'Join')
+    return node
+
+
+def simulate(args, alpha):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed)
+    cls = type('Log', (Mencius,), {'ALPHA': alpha})
+    Client.window = args.window
+    nodes = cluster(cls, 3, net, name='log', upper=Client)
+    addrs = members(5)
+    spares = [spare(cls, net, addr, addrs[:3]) for addr in addrs[3:]]
+    for node in nodes + spares:
+        node.loop = loop
+    for node in nodes[:2]:
+        node.start()
+    changes = [
+        ('add', addrs[:4]),
+        ('remove', addrs[:2] + addrs[3:4]),
+        ('replace', addrs[:2] + addrs[4:]),
+        ]
+    ticks = []  # commands run in each tick
+    effect = {}  # change -> seconds until its members run the log
+    done = 0
+    end = args.warmup + len(changes) * args.interval
+    while len(ticks) * TICK < end:
+        now = len(ticks) * TICK
+        i = round((now - args.warmup) / args.interval)
+        if now >= args.warmup and abs(
+                now - args.warmup - i * args.interval) < TICK / 2:
+            trigger(nodes[0].module, 'Reconfigure', changes[i][1])
+        run(loop, TICK)
+        count = sum(len(node.latency) for node in nodes[:2])
+        ticks.append(count - done)
+        done = count
+        log = nodes[0].module
+        for start, ms in log.configs[1:]:
+            name = next(n for n, m in changes if m == ms)
+            if name not in effect and log.next_cmd_pos >= start:
+                effect[name] = len(ticks) * TICK - (
+                    args.warmup + [n for n, _ in changes].index(name) *
+                    args.interval)
+    loop.close()
+    warm = int(args.warmup / TICK)
+    base = statistics.median(ticks[warm // 2:warm])
+    per = int(args.interval / TICK)
+    results = []
+    for k, (name, _) in enumerate(changes):
+        window = ticks[warm + k * per:warm + (k + 1) * per]
+        before = ticks[warm + (k - 1) * per:warm + k * per] if k else \
+            ticks[warm - per:warm]
+        results.append((name, {
+            'effect s': effect.get(name, float('nan')),
+            'min %': 100. * min(window) / base,
+            'cmds': sum(window),
+            'before': sum(before),
+            }))
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-a', '--alpha', type=int, nargs='+',
+                   default=[4, 16, 256])
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per client')
+    p.add_argument('--interval', type=float, default=5,
+                   help='seconds between changes')
+    p.add_argument('--warmup', type=float, default=5)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    columns = None
+    for alpha in args.alpha:
+        for name, result in simulate(args, alpha):
+            if columns is None:
+                columns = list(result)
+                print('%6s %-8s' % ('alpha', 'change') +
+                      ''.join('%10s' % c for c in columns))
+            print('%6d %-8s' % (alpha, name) +
+                  ''.join('%10.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
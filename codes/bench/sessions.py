@@ -0,0 +1,143 @@
+"""
+Client retries against the session table of MultiPaxos, through Mencius:
+every process has one client keeping `window` commands under way, which
+submits a command again to the next process in turn each time `retry`
+seconds go by without an answer. With sessions, a retry keeps the cid of
+the command; without, every try is a command of its own, as a client that
+knows nothing of sessions would send. Commands answered per second,
+latency, submissions and log entries per command, and how many times the
+log ran each command, as retries get more aggressive.
+"""
+import random
+import asyncio
+import argparse
+import logging
+import uuid
+from collections import Counter
+
+from ..client import RSM
+from ..paxos import Mencius
+from ..sim import new_loop, run, cluster, SimNetwork
+
+
+class Log(Mencius):
+    """counts the entries the log ran, and the commands it ran"""
+    def upon_Init(self):
+        super().upon_Init()
+        self.entries = 0
+        self.runs = Counter()
+
+    def _apply(self, pos, cid, cmd):
+        self.entries += cmd is not self.NOOP
+        super()._apply(pos, cid, cmd)
+
+    def run(self, pos, cid, cmd):
+        if cmd is not self.NOOP:
+            self.runs[cmd] += 1
+        super().run(pos, cid, cmd)
+
+
+class Client(RSM):
+    def __init__(self, addr, retry):
+        super().__init__(retry=retry)
+        self.addr = addr
+        self.replicas = []
+        self.submitted = 0
+        self.latency = []  # (finished, seconds)
+
+    def submit(self, seq, args, tries=0):
+        self.submitted += seq in self.futures
+        super().submit(seq, args, tries)
+
+    def replica(self, tries):
+        i = self.replicas.index(self.module)
+        return self.replicas[(i + tries) % len(self.replicas)]
+
+    async def work(self, loop):
+        while True:
+            start = loop.time()
+            await self.execute(('set', self.addr, self.seq))
+            self.latency.append((loop.time(), loop.time() - start))
+
+
+class Plain(Client):
+    """a client without a session: a new cid for every try"""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.seqs = {}  # cid -> seq
+
+    def cid(self, seq):
+        cid = uuid.uuid4().hex
+        self.seqs[cid] = seq
+        return cid
+
+    def sequence(self, cid):
+        return self.seqs.pop(cid, None)
+
+
+def simulate(args, sessions, retry):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(loss=args.loss, seed=args.seed)
+    cls = Client if sessions else Plain
+    nodes = cluster(Log, args.n, net, name='log',
+                    upper=lambda addr: cls(addr, retry))
+    modules = [node.module for node in nodes]
+    tasks = []
+    for node in nodes:
+        node.replicas = modules
+        for _ in range(args.window):
+            tasks.append(loop.create_task(node.work(loop)))
+    run(loop, args.warmup)
+    before = [(len(node.latency), node.submitted) for node in nodes]
+    entries = modules[0].entries
+    run(loop, args.time)
+    done = [s for node in nodes for t, s in node.latency if t > args.warmup]
+    submitted = sum(node.submitted - s for node, (_, s) in
+                    zip(nodes, before))
+    runs = modules[0].runs
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+    cmds = max(len(done), 1)
+    return {
+        'cmds/s': len(done) / args.time,
+        'ms': 1000 * sum(done) / cmds,
+        'tries/cmd': submitted / cmds,
+        'entries/cmd': (modules[0].entries - entries) / cmds,
+        'runs/cmd': sum(runs.values()) / max(len(runs), 1),
+        'max runs': max(runs.values(), default=0),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-r', '--retry', type=float, nargs='+',
+                   default=[0, .05, .02, .01, .005],
+                   help='seconds to wait for an answer, 0 for ever')
+    p.add_argument('-w', '--window', type=int, default=4,
+                   help='commands under way per client')
+    p.add_argument('--loss', type=float, default=0.)
+    p.add_argument('-t', '--time', type=float, default=5)
+    p.add_argument('--warmup', type=float, default=1)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, %d%% loss' % (args.n, 100 * args.loss))
+    columns = None
+    for retry in args.retry:
+        for name, sessions in (('sessions', True), ('no sessions', False)):
+            result = simulate(args, sessions, retry or None)
+            if columns is None:
+                columns = list(result)
+                print('%-12s %8s' % ('client', 'retry ms') +
+                      ''.join('%12s' % c for c in columns))
+            print('%-12s %8g' % (name, 1000 * retry) +
+                  ''.join('%12.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Many shards, each its own replicated log: one log stack per shard against
+MultiGroup, all shards on one shared stack. Every process handles the
+datagrams it receives one at a time, `cost` seconds each, so the datagrams
+sent are what limits throughput. Each shard gets one client, on process
+shard mod N, keeping `window` commands under way; aggregate commands run
+per second, datagrams per command and latency as the number of shards
+grows.
+"""
+import random
+import asyncio
+import argparse
+import logging
+from collections import defaultdict, deque
+
+from ..basic import trigger
+from ..paxos import Mencius
+from ..multigroup import MultiGroup
+from ..sim import new_loop, run, cluster, Node, SimNetwork
+from .log_engine import Client
+
+
+class BusyNetwork(SimNetwork):
+    """a process takes `cost` seconds to handle each datagram it receives"""
+    cost = 0.
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.free = defaultdict(float)  # dst -> when it is done with its queue
+
+    def latency(self, src, dst):
+        now = asyncio.get_event_loop().time()
+        arrival = now + super().latency(src, dst)
+        self.free[dst] = max(arrival, self.free[dst]) + self.cost
+        return self.free[dst] - now
+
+
+class GroupClient(Node):
+    window = 1
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.shards = []
+        self.started = defaultdict(deque)
+        self.latency = []  # (finished, seconds)
+
+    def start(self):
+        for g in self.shards:
+            for _ in range(self.window):
+                self.next(g)
+
+    def next(self, g):
+        now = self.loop.time()
+        self.started[g].append(now)
+        trigger(self.module, 'Execute', g, ('set', g, now))
+
+    def upon_ExecuteReturn(self, g, pos, result, cid):
+        now = self.loop.time()
+        self.latency.append((now, now - self.started[g].popleft()))
+        self.next(g)
+
+
+def simulate(args, shared, n, shards):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = BusyNetwork(seed=args.seed)
+    net.cost = args.cost
+    if shared:
+        GroupClient.window = args.window
+        host = type('Host', (MultiGroup,), {'GROUPS': shards})
+        clients = cluster(host, n, net, name='shards', upper=GroupClient)
+        for g in range(shards):
+            clients[g % n].shards.append(g)
+    else:
+        Client.window = args.window
+        clients = []
+        for g in range(shards):
+            nodes = cluster(Mencius, n, net, name='g%d' % g, upper=Client)
+            clients.append(nodes[g % n])
+    for node in clients:
+        node.loop = loop
+        node.start()
+    run(loop, args.warmup)
+    sent = net.total()
+    run(loop, args.time)
+    loop.close()
+    done = [s for node in clients for t, s in node.latency
+            if t > args.warmup]
+    return {
+        'cmds/s': len(done) / args.time,
+        'dgrams/cmd': (net.total() - sent) / max(len(done), 1),
+        'ms': 1000 * sum(done) / max(len(done), 1),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-s', '--shards', type=int, nargs='+',
+                   default=[1, 4, 16, 64, 256])
+    p.add_argument('-w', '--window', type=int, default=1,
+                   help='commands under way per shard')
+    p.add_argument('--cost', type=float, default=.0001,
+                   help='seconds a process takes per datagram received')
+    p.add_argument('-t', '--time', type=float, default=2)
+    p.add_argument('--warmup', type=float, default=1)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, %gus per datagram received' % (args.n, 1e6 * args.cost))
+    columns = None
+    for shards in args.shards:
+        for name, shared in (('stack per shard', False),
+                             ('MultiGroup', True)):
+            result = simulate(args, shared, args.n, shards)
+            if columns is None:
+                columns = list(result)
+                print('%-16s %6s' % ('runtime', 'shards') +
+                      ''.join('%11s' % c for c in columns))
+            print('%-16s %6d' % (name, shards) +
+                  ''.join('%11.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+One slow member: under LeasedMultiPaxos, one follower takes `slow`
+seconds per datagram it receives, where the others take `cost`, and drops
+what arrives while `rcvbuf` datagrams wait for it, as a full socket buffer
+would. Clients on the leader submit commands at random, `rate` per second
+(open loop, see overload), to a log:
+- whose links send everything at once and keep it until acknowledged;
+- whose links keep WINDOW messages out to a peer and pause past HIGH, the
+  log running on with a quorum (LAG by default);
+- whose links do the same and hold the log back (LAG 0), commands
+  past QUEUE being rejected.
+Commands answered per second, rejected per second, latency, messages the
+links of all processes keep at most and at the end, the bytes of those at
+the end, datagrams the slow follower dropped, and positions it has still
+to run at the end.
+"""
+import math
+import pickle
+import random
+import argparse
+import logging
+
+from ..basic import start_timer
+from ..links import RetransmitWithACK
+from ..paxos import LeasedMultiPaxos
+from ..sim import new_loop, run, cluster
+from .atomic_register import percentile
+from .overload import OpenClient
+from .shards import BusyNetwork
+
+SAMPLE = .1
+
+
+class SlowNetwork(BusyNetwork):
+    """BusyNetwork where `slow` takes its own time per datagram"""
+    slow, rcvbuf = None, math.inf
+    slow_cost = 0.
+
+    def handling(self, dst):
+        return self.slow_cost if dst == self.slow else self.cost
+
+    def latency(self, src, dst):
+        now = self.loop.time()
+        arrival = now + super(BusyNetwork, self).latency(src, dst)
+        self.free[dst] = max(arrival, self.free[dst]) + self.handling(dst)
+        return self.free[dst] - now
+
+    def send(self, name, msg, src, dst):
+        cost = self.handling(dst)
+        if cost and (self.free[dst] - self.loop.time()) / cost > self.rcvbuf:
+            self.dropped['overflow'] += 1
+            return
+        super().send(name, msg, src, dst)
+
+
+class Unbounded(RetransmitWithACK):
+    """the links without flow control"""
+    WINDOW, HIGH, LOW = math.inf, math.inf, -1
+
+
+def links(module):
+    """every RetransmitWithACK in the stack of module"""
+    for _, attr in getattr(module, '_uses', ()):
+        sub = getattr(module, attr)
+        if isinstance(sub, RetransmitWithACK):
+            yield sub
+        yield from links(sub)
+
+
+def buffered(nodes):
+    """messages the links of nodes keep"""
+    for node in nodes:
+        for link in links(node.module):
+            for sent in link.sent.values():
+                yield from sent.values()
+            for waiting in link.waiting.values():
+                yield from (m for _, m in waiting)
+
+
+def watch(nodes, samples):
+    samples.append(sum(1 for _ in buffered(nodes)))
+    start_timer(SAMPLE, watch, nodes, samples)
+
+
+def simulate(args, flow, lag, rate):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SlowNetwork(seed=args.seed)
+    net.loop, net.cost = loop, args.cost
+    net.slow_cost, net.rcvbuf = args.slow, args.rcvbuf
+    mapping = {} if flow else {'StubbornPointToPointLinks': Unbounded}
+    cls = type('Log', (LeasedMultiPaxos,), {'LAG': lag, 'QUEUE': args.queue})
+    nodes = cluster(cls, args.n, net, name='log', mapping=mapping,
+                    upper=OpenClient)
+    run(loop, args.warmup)
+    leader = next(node for node in nodes
+                  if node.module.leader() == node.addr)
+    net.slow = min(node.addr for node in nodes if node is not leader)
+    OpenClient.rate = rate
+    leader.loop = loop
+    leader.next()
+    samples = []
+    watch(nodes, samples)
+    run(loop, args.time)
+    kb = sum(len(pickle.dumps(m)) for m in buffered(nodes)) / 1024
+    slow = next(node for node in nodes if node.addr == net.slow)
+    behind = leader.module.next_cmd_pos - slow.module.next_cmd_pos
+    loop.close()
+    begin = args.warmup
+    done = [s for t, s in leader.latency if t > begin]
+    return {
+        'cmds/s': len(done) / args.time,
+        'rejected/s': len(leader.rejected) / args.time,
+        'ms': 1000 * sum(done) / max(len(done), 1),
+        'p99 ms': 1000 * percentile(done, .99),
+        'max msgs': max(samples),
+        'end msgs': samples[-1],
+        'end KB': kb,
+        'dropped': net.dropped['overflow'],
+        'behind': behind,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, default=3)
+    p.add_argument('-r', '--rate', type=float, nargs='+',
+                   default=[100, 200, 400],
+                   help='commands per second offered')
+    p.add_argument('--slow', type=float, default=.002,
+                   help='seconds the slow follower takes per datagram')
+    p.add_argument('--cost', type=float, default=.00005,
+                   help='seconds the others take per datagram')
+    p.add_argument('--rcvbuf', type=int, default=8192,
+                   help='datagrams waiting at most for the slow follower')
+    p.add_argument('-q', '--queue', type=int, default=0,
+                   help='commands waiting to be let in, with LAG 0')
+    p.add_argument('-t', '--time', type=float, default=30)
+    p.add_argument('--warmup', type=float, default=10,
+                   help='seconds to elect a leader and start its epoch')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('N=%d, %gms per datagram at the slow follower, %gus elsewhere' % (
+        args.n, 1000 * args.slow, 1e6 * args.cost))
+    runs = [
+        ('unbounded', False, None),
+        ('window', True, None),
+        ('backpressure', True, 0),
+        ]
+    columns = None
+    for rate in args.rate:
+        for name, flow, lag in runs:
+            result = simulate(args, flow, lag, rate)
+            if columns is None:
+                columns = list(result)
+                print('%-13s %6s' % ('links', 'rate') +
+                      ''.join('%11s' % c for c in columns))
+            print('%-13s %6g' % (name, rate) +
+                  ''.join('%11.1f' % result[c] for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Consensus-based total-order broadcast, one message per consensus instance
+against batches ordered by pipelined instances: values delivered per second
+and consensus messages per value at N = 3..9, for each consensus module.
+"""
+import random
+import argparse
+import logging
+
+from ..basic import trigger, start_timer
+from ..consensus import (
+    FloodingConsensus, DeltaFloodingConsensus, HierarchicalConsensus)
+from ..ordering import ConsensusTotalOrder
+from ..sim import (
+    new_loop, run, cluster, implementations, Node, SimNetwork)
+
+
+class Sender(Node):
+    period = .01
+
+    def __init__(self, addr):
+        super().__init__(addr)
+        self.sent = {}
+        self.latency = []
+        self.order = []
+
+    def send(self):
+        now = self.loop.time()
+        self.sent[now] = now
+        trigger(self.module, 'Broadcast', now)
+        start_timer(self.period, self.send)
+
+    def upon_Deliver(self, q, m):
+        self.order.append((q, m))
+        if q == self.addr:
+            self.latency.append(self.loop.time() - self.sent.pop(m))
+
+
+def simulate(args, n, consensus, batched):
+    random.seed(args.seed)
+    loop = new_loop()
+    net = SimNetwork(seed=args.seed,
+                     classify=lambda name, msg: name.split('.')[1])
+    Sender.period = n / args.rate
+    params = {} if batched else {'BATCH': 1, 'DEPTH': 1, 'LINGER': 0}
+    tob = type('TOB', (ConsensusTotalOrder,), params)
+    # instances are built as they are needed, all along the run
+    with implementations(Consensus=consensus):
+        nodes = cluster(tob, n, net, name='tob', upper=Sender)
+        for node in nodes:
+            node.loop = loop
+            start_timer(random.random() * Sender.period, node.send)
+        run(loop, args.time)
+    loop.close()
+    orders = [node.order for node in nodes]
+    shortest = min(len(o) for o in orders)
+    agree = all(o[:shortest] == orders[0][:shortest] for o in orders)
+    latency = [t for node in nodes for t in node.latency]
+    delivered = shortest
+    return {
+        'values/s': delivered / args.time,
+        'msgs/value': (net.msgs['pl'] + net.msgs['beb']) / max(delivered, 1),
+        'latency ms': 1000 * sum(latency) / max(len(latency), 1),
+        'agree': agree,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-n', type=int, nargs='+', default=[3, 5, 7, 9])
+    p.add_argument('-r', '--rate', type=float, default=1000,
+                   help='messages broadcast per second, all processes')
+    p.add_argument('-t', '--time', type=float, default=3)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print('offered %d values/s' % args.rate)
+    print('%-24s %2s %8s' % ('consensus', 'N', '') +
+          '%11s %11s %11s' % ('values/s', 'msgs/value', 'latency ms'))
+    for consensus in (FloodingConsensus, DeltaFloodingConsensus,
+                      HierarchicalConsensus):
+        for n in args.n:
+            for batched in (False, True):
+                r = simulate(args, n, consensus, batched)
+                print('%-24s %2d %8s' % (
+                    consensus.__name__, n,
+                    'batched' if batched else 'single') +
+                    '%11.1f %11.1f %11.1f' % (
+                        r['values/s'], r['msgs/value'], r['latency ms']) +
+                    ('' if r['agree'] else '  ORDER DIFFERS'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Messages of 1 KB to 10 MB between two processes on this host, over
+UDPProtocol and over StreamTransport, on a real event loop: a link sends
+`total` bytes in messages of each size, `burst` bytes at a time, letting
+the loop run in between, and the other side counts what it delivers until
+it has them all or nothing comes for `idle` seconds. Messages delivered,
+megabytes per second and messages per second from the first send to the
+last delivery. UDP delivers no message beyond a datagram, and loses what
+the socket buffers cannot hold.
+"""
+import time
+import asyncio
+import argparse
+import logging
+
+from ..basic import UDPProtocol
+from ..stream import StreamTransport
+
+SIZES = [1 << 10, 16 << 10, 60 << 10, 1 << 20, 10 << 20]
+
+
+class Counter:
+    def __init__(self):
+        self.count, self.last = 0, None
+
+    def upon_Deliver(self, q, m):
+        self.count += 1
+        self.last = time.monotonic()
+
+
+async def udp(addr):
+    loop = asyncio.get_event_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        UDPProtocol, local_addr=addr)
+    protocol.addr = addr
+    return protocol, transport.close
+
+
+async def tcp(addr):
+    protocol = StreamTransport(addr)
+    await protocol.listen()
+    return protocol, protocol.close
+
+
+async def measure(args, make, size, port):
+    a, b = (args.host, port), (args.host, port + 1)
+    sender, close_a = await make(a)
+    receiver, close_b = await make(b)
+    sendto = sender.register('bench', Counter())
+    counter = Counter()
+    receiver.register('bench', counter)
+    n = max(1, args.total // size)
+    payload = b'x' * size
+    start = time.monotonic()
+    sent = 0
+    for _ in range(n):
+        sendto(payload, b)
+        sent += size
+        if sent >= args.burst:
+            sent = 0
+            await asyncio.sleep(0)
+    seen = -1
+    while counter.count < n and counter.count != seen:
+        seen = counter.count
+        await asyncio.sleep(args.idle)
+    close_a()
+    close_b()
+    seconds = (counter.last or start) - start
+    return {
+        'msgs': n,
+        'delivered %': 100 * counter.count / n,
+        'MB/s': counter.count * size / (1 << 20) / max(seconds, 1e-9),
+        'msgs/s': counter.count / max(seconds, 1e-9),
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('-s', '--size', type=int, nargs='+', default=SIZES,
+                   help='bytes per message')
+    p.add_argument('--total', type=int, default=64 << 20,
+                   help='bytes sent per run')
+    p.add_argument('-b', '--burst', type=int, default=64 << 10,
+                   help='bytes sent before the loop runs on')
+    p.add_argument('--idle', type=float, default=1)
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=7000)
+    args = p.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    UDPProtocol.DELAY = 0
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    columns = None
+    port = args.port
+    for size in args.size:
+        for name, make in (('udp', udp), ('tcp', tcp)):
+            result = loop.run_until_complete(
+                measure(args, make, size, port))
+            port += 2
+            if columns is None:
+                columns = list(result)
+                print('%-9s %9s' % ('transport', 'bytes') +
+                      ''.join('%12s' % c for c in columns))
+            print('%-9s %9d' % (name, size) +
+                  ''.join('%12.1f' % result[c] for c in columns))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
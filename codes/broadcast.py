@@ -4,7 +4,7 @@ import uuid
 import copy
 import logging
 
-from .basic import implements, uses, trigger, ABC
+from .basic import implements, uses, trigger, notify, ABC
 
 log = logging.getLogger(__name__)
 
@@ -16,6 +16,9 @@ class BasicBroadcast(ABC):
     algo 3.1
     validity: if a correct process broadcasts a message m,
     then every correct process eventually delivers m.
+
+    Pause | p and Resume | p from the links are passed on: a broadcast
+    reaches p too. Shed | limit is passed down to them.
     """
     def upon_Init(self):
         pass
@@ -30,6 +33,15 @@ class BasicBroadcast(ABC):
     def upon_Deliver(self, q, m):
         trigger(self.upper, 'Deliver', q, m['data'])
 
+    def upon_Shed(self, limit):
+        notify(self.pl, 'Shed', limit)
+
+    def upon_Pause(self, p):
+        notify(self.upper, 'Pause', p)
+
+    def upon_Resume(self, p):
+        notify(self.upper, 'Resume', p)
+
 
 @implements('ReliableBroadcast')
 @uses('BestEffortBroadcast', 'beb')
@@ -70,6 +82,12 @@ class LazyReliableBroadcast(ABC):
                 'data': pickle.loads(sdata),
                 })
 
+    def upon_Pause(self, p):
+        notify(self.upper, 'Pause', p)
+
+    def upon_Resume(self, p):
+        notify(self.upper, 'Resume', p)
+
 
 @implements('ReliableBroadcast')
 @uses('BestEffortBroadcast', 'beb')
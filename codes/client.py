@@ -0,0 +1,243 @@
+"""
+An asyncio client API for a replicated log
+
+RSM is the upper layer of a ReplicatedStateMachine, or of a
+MultiGroupStateMachine: `await rsm.execute(*args)` triggers Execute with
+args and a cid of its own, and resolves once ExecuteReturn comes back with
+that cid, to what it carries before the cid: the position of the command
+and its result, for a log. Any number of commands can be under way at
+once, each future found by its cid whatever order the commands run in.
+Every other indication goes on to `upper`, if there is one.
+
+An RSM is a client with a session, see MultiPaxos: its cids are (client,
+seq, low). With `retry` seconds, it submits a command again each time
+that long goes by without an answer, with the same cid but for low, to the
+log `replica` picks for the try.
+
+A command the log turns away, Rejected, fails with Rejected.
+
+ClientProtocol serves an RSM to clients over a stream connection, and
+`connect` is the other side of it, with the same `execute` coroutine. A
+client pipelines as many requests as it likes on one connection; each is
+answered as soon as its command has run, so answers come in the order
+commands run, not in the order they were sent. Once WINDOW requests of a
+connection are under way, no more are read from it until half of them
+are answered: TCP then holds the client back.
+
+A frame is a 4-byte big-endian length then a pickled dict, see stream.py:
+a request {'id', 'args'}, answered by {'id', 'result'} or {'id', 'error'}.
+"""
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+
+from .basic import trigger, start_timer
+from .stream import Framed
+
+log = logging.getLogger(__name__)
+
+
+class Rejected(Exception):
+    """the log turned the command away, being overloaded"""
+
+
+class RSM:
+    def __init__(self, upper=None, retry=None):
+        self.upper = upper
+        self.retry = retry
+        self.module = None  # the log, set once it is built
+        self.client = uuid.uuid4().hex
+        self.seq = 0
+        self.futures = {}  # seq -> future of a command under way
+
+    def execute(self, *args):
+        seq, self.seq = self.seq, self.seq + 1
+        future = asyncio.get_event_loop().create_future()
+        future.add_done_callback(lambda _: self.futures.pop(seq, None))
+        self.futures[seq] = future
+        self.submit(seq, args)
+        return future
+
+    def submit(self, seq, args, tries=0):
+        if seq not in self.futures:
+            return
+        trigger(self.replica(tries), 'Execute', *args, self.cid(seq))
+        if self.retry:
+            start_timer(self.retry, self.submit, seq, args, tries + 1)
+
+    def replica(self, tries):
+        """the log to submit a command to, the `tries`-th time"""
+        return self.module
+
+    def cid(self, seq):
+        return (self.client, seq, min(self.futures))
+
+    def sequence(self, cid):
+        """seq of one of our cids, None for any other cid"""
+        if isinstance(cid, tuple) and cid[0] == self.client:
+            return cid[1]
+
+    def upon_ExecuteReturn(self, *attrs):
+        *result, cid = attrs
+        future = self.futures.get(self.sequence(cid))
+        if future is None:  # submitted by someone else, or answered
+            if self.upper is not None:
+                trigger(self.upper, 'ExecuteReturn', *attrs)
+        elif not future.done():
+            future.set_result(result[0] if len(result) == 1 else
+                              tuple(result))
+
+    def upon_Rejected(self, *attrs):
+        future = self.futures.get(self.sequence(attrs[-1]))
+        if future is None:
+            if self.upper is not None:
+                trigger(self.upper, 'Rejected', *attrs)
+        elif not future.done():
+            future.set_exception(Rejected(*attrs[:-1]))
+
+    def __getattr__(self, attr):
+        upper = self.__dict__.get('upper')
+        if upper is None or not attr.startswith('upon_'):
+            raise AttributeError(attr)
+        return getattr(upper, attr)
+
+
+class ClientProtocol(Framed):
+    WINDOW = 1024
+
+    def __init__(self, rsm):
+        self.rsm = rsm
+        self.inflight = 0
+        self.paused = False
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        log.info('client %s', transport.get_extra_info('peername'))
+
+    def connection_lost(self, exc):
+        log.info('client %s gone: %s',
+                 self.transport.get_extra_info('peername'), exc)
+
+    def received(self, m):
+        self.inflight += 1
+        if self.inflight >= self.WINDOW and not self.paused:
+            self.paused = True
+            self.transport.pause_reading()
+        self.rsm.execute(*m['args']).add_done_callback(
+            lambda future: self.answer(m['id'], future))
+
+    def answer(self, rid, future):
+        self.inflight -= 1
+        if self.transport.is_closing() or future.cancelled():
+            return
+        if self.paused and 2 * self.inflight < self.WINDOW:
+            self.paused = False
+            self.transport.resume_reading()
+        if future.exception() is not None:
+            self.send({'id': rid, 'error': future.exception()})
+        else:
+            self.send({'id': rid, 'result': future.result()})
+
+
+class Connection(Framed):
+    """the client side: `execute` as on an RSM, over the connection"""
+    def __init__(self):
+        self.next_id = 0
+        self.futures = {}  # id -> future of a request not answered
+
+    def execute(self, *args):
+        rid, self.next_id = self.next_id, self.next_id + 1
+        future = asyncio.get_event_loop().create_future()
+        self.futures[rid] = future
+        self.send({'id': rid, 'args': args})
+        return future
+
+    def received(self, m):
+        future = self.futures.pop(m['id'])
+        if future.cancelled():
+            return
+        if 'error' in m:
+            future.set_exception(m['error'])
+        else:
+            future.set_result(m['result'])
+
+    def connection_lost(self, exc):
+        for future in self.futures.values():
+            if not future.done():
+                future.set_exception(ConnectionError(exc or 'closed'))
+        self.futures.clear()
+
+    def close(self):
+        self.transport.close()
+
+
+async def serve(rsm, host, port):
+    loop = asyncio.get_event_loop()
+    server = await loop.create_server(
+        lambda: ClientProtocol(rsm), host, port)
+    log.info('serve clients at %s', (host, port))
+    return server
+
+
+async def connect(host, port):
+    loop = asyncio.get_event_loop()
+    _, conn = await loop.create_connection(Connection, host, port)
+    return conn
+
+
+async def load(args):
+    """`count` commands, `window` of them under way at a time"""
+    conn = await connect(args.host, args.port)
+    latency = []
+    rejected = []
+    sem = asyncio.Semaphore(args.window)
+
+    async def one(i):
+        async with sem:
+            start = time.monotonic()
+            cmd = ('set', 'k%d' % (i % args.keys), i)
+            try:
+                await conn.execute(
+                    *(([i % args.groups] if args.groups else []) + [cmd]))
+            except Rejected:
+                rejected.append(i)
+            else:
+                latency.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(args.count)))
+    elapsed = time.monotonic() - start
+    conn.close()
+    latency.sort()
+    print('%d commands in %.2fs: %.1f cmds/s, %d rejected' % (
+        len(latency), elapsed, len(latency) / elapsed, len(rejected)))
+    if not latency:
+        return
+    for q in (.5, .9, .99):
+        print('p%d %.1fms' % (
+            100 * q, 1000 * latency[min(int(q * len(latency)),
+                                        len(latency) - 1)]))
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description='pipeline commands to a process served by codes.proc')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('-p', '--port', type=int, default=6000)
+    p.add_argument('-c', '--count', type=int, default=1000)
+    p.add_argument('-w', '--window', type=int, default=64,
+                   help='requests under way on the connection')
+    p.add_argument('-k', '--keys', type=int, default=16)
+    p.add_argument('-g', '--groups', type=int, default=0,
+                   help='spread commands over this many groups')
+    args = p.parse_args()
+    logging.basicConfig(level=logging.WARN)
+    asyncio.get_event_loop().run_until_complete(load(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,10 +16,15 @@ Properties:
   C3: Integrity: No process decides twice.
   C4: Agreement: No two correct processes decide differently.
 """
-from collections import defaultdict
+import uuid
+import random
 import logging
+from collections import defaultdict, OrderedDict
 
-from .basic import implements, uses, trigger, ABC
+from .basic import (
+    implements, uses, nests, trigger, start_timer, nested, Tagged, ABC)
+from .quorum import Majority
+from .machine import StateMachine
 
 log = logging.getLogger(__name__)
 
@@ -59,6 +64,7 @@ class FloodingConsensus(ABC):
     def upon_Crash(self, p):
         log.info("%s Crashed", p)
         self.correct.remove(p)
+        self.try_to_decide()
 
     def upon_Propose(self, v):
         self.proposals[1].add(v)
@@ -105,6 +111,113 @@ class FloodingConsensus(ABC):
         trigger(self.upper, 'Decide', self.decision)
 
 
+@implements('Consensus')
+@uses('PerfectPointToPointLinks', 'pl')
+@uses('PerfectFailureDetector', 'p')
+class DeltaFloodingConsensus(ABC):
+    """
+    algo 5.1, flooding only what the receiver may lack
+
+    A proposal travels as {id: value}, its id being the process that
+    proposed it, and a process sends a proposal to q at most once and never
+    one it got from q. The round message to q carries just those, often
+    nothing. Links may reorder, so a round message from q counts once q's
+    messages of all earlier rounds are in: then everything q knew at the
+    end of the previous round is known here, as with the full sets of algo
+    5.1, and the decision rule is unchanged.
+
+    A process decides at the end of the first round in which it hears from
+    everyone it heard from in the previous round. Then it stops and keeps
+    only the decision; it tells the others the id of the decided proposal,
+    and one that does not have that proposal fetches it. Only the current
+    and the previous round are kept while it runs.
+    """
+    def upon_Init(self):
+        self.correct = set(self.members)
+        self.round = 0
+        self.decision = None
+        self.values = {}  # id -> proposal
+        self.sent = defaultdict(set)  # q -> ids sent to q
+        self.got = defaultdict(set)  # q -> ids got from q
+        self.heard = defaultdict(int)  # q -> last round processed from q
+        self.early = {}  # (q, round) -> values that arrived out of order
+        self.receivedfrom = {0: set(self.members)}
+
+    def upon_Crash(self, p):
+        log.info("%s Crashed", p)
+        self.correct.discard(p)
+        self.try_to_decide()
+
+    def upon_Propose(self, v):
+        self.values[self.addr] = v
+        self.next_round()
+        self.try_to_decide()
+
+    def next_round(self):
+        self.round += 1
+        self.receivedfrom.pop(self.round - 2, None)
+        self.receivedfrom.setdefault(self.round, set()).add(self.addr)
+        for q in self.correct - {self.addr}:
+            delta = {i: v for i, v in self.values.items()
+                     if i not in self.sent[q] and i not in self.got[q]}
+            self.sent[q].update(delta)
+            trigger(self.pl, 'Send', q, {
+                'typ': 'proposal',
+                'round': self.round,
+                'values': delta,
+                })
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'fetch':
+            trigger(self.pl, 'Send', q, {
+                'typ': 'value',
+                'id': m['id'],
+                'value': self.decision,
+                })
+        if self.decision is not None:
+            return
+        if m['typ'] == 'proposal':
+            self.early[(q, m['round'])] = m['values']
+            while (q, self.heard[q] + 1) in self.early:
+                self.heard[q] += 1
+                values = self.early.pop((q, self.heard[q]))
+                self.got[q].update(values)
+                self.values.update(values)
+                if self.heard[q] >= self.round - 1:
+                    self.receivedfrom.setdefault(
+                        self.heard[q], set()).add(q)
+            self.try_to_decide()
+        elif m['typ'] == 'decided' and q in self.correct:
+            if m['id'] in self.values:
+                self.decide(m['id'], self.values[m['id']])
+            else:
+                trigger(self.pl, 'Send', q, {'typ': 'fetch', 'id': m['id']})
+        elif m['typ'] == 'value':
+            self.decide(m['id'], m['value'])
+
+    def try_to_decide(self):
+        if self.decision is not None or self.round == 0:
+            return
+        heard = self.receivedfrom.get(self.round, set())
+        if not self.correct.issubset(heard):
+            return
+        if heard == self.receivedfrom[self.round - 1]:
+            i = min(self.values, key=self.values.get)
+            self.decide(i, self.values[i])
+        else:
+            self.next_round()
+            self.try_to_decide()
+
+    def decide(self, i, v):
+        log.info('%s made decision %s', self.addr, v)
+        self.decision = v
+        for q in self.correct - {self.addr}:
+            trigger(self.pl, 'Send', q, {'typ': 'decided', 'id': i})
+        self.values, self.early, self.receivedfrom = {}, {}, {}
+        self.sent, self.got = None, None
+        trigger(self.upper, 'Decide', self.decision)
+
+
 @implements("Consensus")
 @uses('BestEffortBroadcast', 'beb')
 @uses('PerfectFailureDetector', 'p')
@@ -114,31 +227,36 @@ class HierarchicalConsensus(ABC):
 
     Performance: this algorithm requires N communication steps to terminate and
     exchanges O(N) messages in each round.
+
+    Ranks go from 1 to N; in round r the process of rank r decides its
+    proposal, unless it was detected to have crashed.
     """
     def upon_Init(self):
         self.detectedranks = set()
         self.round = 1
         self.proposal = None
         self.proposer = 0
-        self.delivered = False
+        self.delivered = defaultdict(bool)
         self.broadcast = False
 
     def rank(self, p):
-        return sorted(self.members).index(p)
+        return sorted(self.members).index(p) + 1
 
     def upon_Crash(self, p):
         log.info("%s crashed", p)
         self.detectedranks.add(self.rank(p))
-        if self.round in self.detectedranks or self.delivered[self.round]:
-            self.round += 1
+        self.try_to_decide()
 
     def upon_Propose(self, v):
-        if not self.proposal:
+        if self.proposal is None:
             self.proposal = v
+        self.try_to_decide()
 
     def try_to_decide(self):
+        while self.round in self.detectedranks or self.delivered[self.round]:
+            self.round += 1
         if (self.round == self.rank(self.addr) and
-                self.proposal and not self.broadcast):
+                self.proposal is not None and not self.broadcast):
             self.broadcast = True
             trigger(self.beb, 'Broadcast', {
                 'typ': 'decided',
@@ -154,6 +272,7 @@ class HierarchicalConsensus(ABC):
             self.proposal = v
             self.proposer = r
         self.delivered[r] = True
+        self.try_to_decide()
 
 
 @implements('UniformConsensus')
@@ -339,38 +458,88 @@ class LeaderBasedEpochChange(ABC):
 
     When initialized, it's assumed that a default epoch with ts 0 and a leader
     l0 is active at all correct processes.
+
+    A nack carries the highest timestamp its sender has started, so the
+    leader's next attempt jumps past it at once instead of N at a time. Only
+    a nack showing that the attempt was too low makes the leader try again:
+    a process that rejected an epoch because it trusted someone else keeps
+    it, and starts it once it trusts its leader, if nothing newer started
+    meanwhile. Otherwise, on trusting a process, it nacks it with the
+    highest timestamp it started. Nacks arriving within RETRY seconds of
+    each other make one attempt; each further round doubles that wait, up
+    to MAX_RETRY, until the process is trusted again.
     """
+    RETRY = .05
+    MAX_RETRY = 2
+
     def upon_Init(self):
         self.trusted = None
         self.lastts = 0
         self.ts = self.rank(self.addr)
+        self.seen = 0  # highest timestamp heard of
+        self.rejected = {}  # q -> timestamp of the last epoch of q rejected
+        self.backoff = self.RETRY
+        self.retrying = False
 
     def rank(self, p):
         return sorted(self.members).index(p)
 
     def new_epoch(self):
-        self.ts += self.N
+        # our next timestamp above every one heard of
+        self.ts += self.N * (max(self.seen - self.ts, 0) // self.N + 1)
         trigger(self.beb, 'Broadcast', {
             'typ': 'newepoch',
             'ts': self.ts,
             })
 
+    def start_epoch(self, ts, leader):
+        self.lastts = ts
+        trigger(self.upper, 'StartEpoch', ts, leader)
+
+    def nack(self, q, ts):
+        trigger(self.pl, 'Send', q, {
+            'typ': 'nack',
+            'for': ts,
+            'ts': self.lastts,
+            })
+
+    def retry(self):
+        if self.trusted == self.addr and not self.retrying:
+            self.retrying = True
+            start_timer(self.backoff, self.upon_Retry)
+            self.backoff = min(2 * self.backoff, self.MAX_RETRY)
+
     def upon_Trust(self, p):
         self.trusted = p
         if p == self.addr:
+            self.backoff = self.RETRY
+            self.new_epoch()
+        else:
+            ts = self.rejected.pop(p, None)
+            if ts is not None and ts > self.lastts:
+                self.start_epoch(ts, p)
+            else:
+                self.nack(p, ts)
+
+    def upon_Retry(self):
+        self.retrying = False
+        if self.trusted == self.addr:
             self.new_epoch()
 
     def upon_Deliver(self, q, m):
         if m['typ'] == 'newepoch':
             newts = m['ts']
             if q == self.trusted and newts > self.lastts:
-                self.lastts = newts
-                trigger(self.upper, 'StartEpoch', newts, q)
+                self.start_epoch(newts, q)
             else:
-                trigger(self.pl, 'Send', q, {'typ': 'nack'})
+                self.rejected[q] = newts
+                self.nack(q, newts)
         elif m['typ'] == 'nack':
-            if self.trusted == self.addr:
-                self.new_epoch()
+            self.seen = max(self.seen, m['ts'])
+            if m['for'] is None and m['ts'] > self.ts:
+                self.retry()  # newly trusted, behind the nacker
+            elif m['for'] == self.ts and m['ts'] >= self.ts:
+                self.retry()  # too low to start
 
 
 @implements('EpochConsensus')
@@ -387,18 +556,31 @@ class ReadWriteEpochChange(ABC):
     - Indication <ep, Decide | v>: Outputs a decided value v of epoch consensus
     - Indication <ep, Aborted | state>: Singals that epoch consensus has
     completed the abort and outputs internal state.
+
+    Initialized with the state (valts, val) the previous epoch aborted with,
+    and the timestamp ets and leader l of its own epoch. The read phase waits
+    for a phase 1 quorum of QUORUMS, the write phase for a phase 2 one.
     """
-    def upon_Init(self, state):
+    QUORUMS = Majority
+
+    def upon_Init(self, state, ets, leader):
         self.valts, self.val = state
+        self.ets, self.leader = ets, leader
         self.tmpval = None
         self.states = {}
-        self.accepted = 0
+        self.accepted = set()
+        self.halted = False
+        self.quorums = self.QUORUMS(self.members)
 
     def upon_Propose(self, v):  # only leader l
+        if self.halted:
+            return
         self.tmpval = v
         trigger(self.beb, 'Broadcast', {'typ': 'read'})
 
     def upon_Deliver(self, q, m):
+        if self.halted:
+            return
         if m['typ'] == 'read':
             trigger(self.pl, 'Send', q, {
                 'typ': 'state',
@@ -406,15 +588,18 @@ class ReadWriteEpochChange(ABC):
                 'val': self.val,
                 })
         elif m['typ'] == 'state':  # only leader l
-            self.states[q] = (m['ts'], m['val'])
-            self.check_to_write()
+            if self.states is not None:
+                self.states[q] = (m['ts'], m['val'])
+                self.check_to_write()
         elif m['typ'] == 'write':
-            self.valts, self.val = m['ts'], m['val']
+            self.valts, self.val = self.ets, m['val']
             trigger(self.pl, 'Send', q, {'typ': 'accept'})
         elif m['typ'] == 'accept':  # only leader l
-            self.accepted += 1
-            if self.accepted > self.N / 2:
-                self.accepted = 0
+            if self.accepted is None:  # decided sent
+                return
+            self.accepted.add(q)
+            if self.quorums.phase2(self.accepted):
+                self.accepted = None
                 trigger(self.beb, 'Broadcast', {
                     'typ': 'decided',
                     'val': self.tmpval,
@@ -423,28 +608,406 @@ class ReadWriteEpochChange(ABC):
             trigger(self.upper, 'Decide', m['val'])
 
     def check_to_write(self):  # only leader l
-        if len(self.states) > self.N / 2:
-            ts, v = max(self.states.values())
-            if v:
+        if self.quorums.phase1(self.states):
+            ts, v = max(self.states.values(), key=lambda s: s[0])
+            if v is not None:
                 self.tmpval = v
-            self.states = {}
+            self.states = None  # written once
             trigger(self.beb, 'Broadcast', {
                 'typ': 'write',
-                'ts': self.ts,
                 'val': self.tmpval,
                 })
 
     def upon_Abort(self):
-        trigger(self.upper, 'Aborted', self.valts, self.val)
-        # halt  # stop operating when aborted
+        if not self.halted:
+            self.halted = True  # stop operating when aborted
+            trigger(self.upper, 'Aborted', (self.valts, self.val))
 
 
 @implements('UniformConsensus')
 @uses('EpochChange', 'ec')
-@uses('EpochConsensus', 'y')  # multiple instances
+@uses('BestEffortBroadcast', 'beb')
+@uses('PerfectPointToPointLinks', 'pl')
+@nests('EpochConsensus', 'epoch')
 class LeaderDrivenConsensus(ABC):
     """
     Algorithm 5.7
+
+    One epoch consensus instance per epoch, nested in this module: its
+    messages go through the links of this module tagged with the timestamp
+    of the epoch. Messages for an epoch this process has not started yet
+    wait until it does, those for an aborted epoch are dropped. Epoch 0 has
+    no leader: nothing is proposed before the first StartEpoch.
     """
     def upon_Init(self):
-        pass
+        self.val = None
+        self.proposed = False
+        self.decided = False
+        self.ets, self.leader = 0, None
+        self.newts, self.newleader = 0, None
+        self.early = defaultdict(list)  # ets -> [(q, m)] not started yet
+        self.start_epoch((0, None))
+
+    def start_epoch(self, state):
+        self.ep = nested(self.epoch, self, self.ets, Tagged(self, self.ets),
+                         initargs=(state, self.ets, self.leader))
+        for ts in [ts for ts in self.early if ts < self.ets]:
+            del self.early[ts]
+        for q, m in self.early.pop(self.ets, []):
+            trigger(self.ep, 'Deliver', q, m)
+        self.try_to_propose()
+
+    def try_to_propose(self):
+        if (self.leader == self.addr and self.val is not None and
+                not self.proposed):
+            self.proposed = True
+            trigger(self.ep, 'Propose', self.val)
+
+    def upon_Propose(self, v):
+        self.val = v
+        self.try_to_propose()
+
+    def upon_StartEpoch(self, ts, leader):
+        self.newts, self.newleader = ts, leader
+        trigger(self.ep, 'Abort')
+
+    def upon_Aborted(self, ts, state):
+        if ts == self.ets:
+            self.ets, self.leader = self.newts, self.newleader
+            self.proposed = False
+            self.start_epoch(state)
+
+    def upon_Decide(self, ts, v):
+        if ts == self.ets and not self.decided:
+            self.decided = True
+            trigger(self.upper, 'Decide', v)
+
+    def upon_Deliver(self, q, m):
+        ts, m = m['pos'], m['m']
+        if ts == self.ets:
+            trigger(self.ep, 'Deliver', q, m)
+        elif ts > self.ets:
+            self.early[ts].append((q, m))
+
+
+@implements('LogEpochConsensus')
+@uses('PerfectPointToPointLinks', 'pl')
+@uses('BestEffortBroadcast', 'beb')
+class ReadWriteEpochLog(ABC):
+    """
+    Algorithm 5.6 for every position of a log at once
+
+    The state is {pos: (valts, val)} for every position holding a value
+    from `start` on, the first one not run here yet, one dict handed from
+    epoch to epoch; Trim | pos drops it below pos once run. The leader
+    reads once, when the epoch starts, every position from `start` on. A
+    process answers with what it holds from there and the position it
+    trimmed up to: those below were decided, and the leader goes on from
+    the highest such position of the quorum, learning the decisions below
+    it through the log. It writes back at each position the value with the
+    highest timestamp, NOOP where a majority holds nothing below the
+    highest one reported.
+    Positions above that were decided in no earlier epoch: each proposal
+    takes the next one and goes straight to the write phase, without waiting
+    for the positions before it to be decided. Writes and decisions made in
+    the same step share one message, BATCH positions at most. The read waits
+    for a phase 1 quorum of QUORUMS, each write for a phase 2 one.
+
+    Request: Propose | v, Abort, Trim | pos
+    Indication: Decide | {pos: v}, Aborted | state
+    """
+    NOOP = None
+    BATCH = 256
+    QUORUMS = Majority
+
+    def upon_Init(self, state, ets, leader, start):
+        self.state = {pos: s for pos, s in state.items() if pos >= start}
+        self.floor = start  # state below was trimmed
+        self.quorums = self.QUORUMS(self.members)
+        self.ets, self.leader = ets, leader
+        self.start = start
+        self.halted = False
+        # only leader l
+        self.states = {}  # q -> (floor, state reported from start on)
+        self.next = None  # first free position, known once read
+        self.waiting = []  # proposed before the read completed
+        self.writing = {}  # pos -> (v, processes that accepted)
+        self.out = {'write': {}, 'decided': {}}
+        if leader == self.addr:
+            trigger(self.beb, 'Broadcast', {'typ': 'read', 'start': start})
+
+    def upon_Propose(self, v):  # only leader l
+        if self.halted:
+            return
+        if self.next is None:
+            self.waiting.append(v)
+        else:
+            self.write(self.next, v)
+            self.next += 1
+
+    def write(self, pos, v):
+        self.writing[pos] = (v, set())
+        self.send('write', pos, v)
+
+    def send(self, typ, pos, v):
+        if not any(self.out.values()):
+            trigger(self, 'Flush')
+        self.out[typ][pos] = v
+
+    def upon_Flush(self):
+        out, self.out = self.out, {'write': {}, 'decided': {}}
+        if self.halted:
+            return
+        for typ, vals in out.items():
+            vals = sorted(vals.items())
+            for i in range(0, len(vals), self.BATCH):
+                trigger(self.beb, 'Broadcast', {
+                    'typ': typ,
+                    'vals': dict(vals[i:i + self.BATCH]),
+                    })
+
+    def upon_Deliver(self, q, m):
+        if self.halted:
+            return
+        if m['typ'] == 'read':
+            trigger(self.pl, 'Send', q, {
+                'typ': 'state',
+                'floor': self.floor,
+                'state': {pos: s for pos, s in self.state.items()
+                          if pos >= m['start']},
+                })
+        elif m['typ'] == 'state':  # only leader l
+            if self.next is None:
+                self.states[q] = (m['floor'], m['state'])
+                if self.quorums.phase1(self.states):
+                    self.check_to_write()
+        elif m['typ'] == 'write':
+            for pos, v in m['vals'].items():
+                if pos >= self.floor:  # decided already below
+                    self.state[pos] = (self.ets, v)
+            trigger(self.pl, 'Send', q, {
+                'typ': 'accept',
+                'pos': list(m['vals']),
+                })
+        elif m['typ'] == 'accept':  # only leader l
+            for pos in m['pos']:
+                if pos not in self.writing:
+                    continue
+                v, accepted = self.writing[pos]
+                accepted.add(q)
+                if self.quorums.phase2(accepted):
+                    del self.writing[pos]
+                    self.send('decided', pos, v)
+        elif m['typ'] == 'decided':
+            trigger(self.upper, 'Decide', m['vals'])
+
+    def check_to_write(self):  # only leader l
+        base = max([self.start] + [f for f, _ in self.states.values()])
+        highest = {}
+        for _, state in self.states.values():
+            for pos, (ts, v) in state.items():
+                if pos >= base and (pos not in highest or
+                                    ts > highest[pos][0]):
+                    highest[pos] = (ts, v)
+        self.next = max(highest, default=base - 1) + 1
+        log.info('%s leads epoch %s from position %s, %s to write back',
+                 self.addr, self.ets, base, self.next - base)
+        for pos in range(base, self.next):
+            self.write(pos, highest.get(pos, (0, self.NOOP))[1])
+        waiting, self.waiting = self.waiting, []
+        for v in waiting:
+            self.upon_Propose(v)
+
+    def upon_Trim(self, pos):
+        for p in range(self.floor, pos):
+            self.state.pop(p, None)
+        self.floor = max(self.floor, pos)
+
+    def upon_Abort(self):
+        if not self.halted:
+            self.halted = True
+            trigger(self.upper, 'Aborted', self.state)
+
+
+@implements('ReplicatedStateMachine')
+@uses('EpochChange', 'ec')
+@uses('BestEffortBroadcast', 'beb')
+@uses('PerfectPointToPointLinks', 'pl')
+@nests('LogEpochConsensus', 'epoch')
+class LeaderDrivenLog(ABC):
+    """
+    Algorithm 5.7 deciding every position of a log
+
+    Each epoch runs one log epoch consensus, nested as in
+    LeaderDrivenConsensus: its leader pays for the read phase once and then
+    every command costs one write and one accept, however many are under
+    way. An abort hands the state of every position to the next epoch at
+    once. Commands go to the leader of the current epoch and are submitted
+    again when a new epoch starts or they have not run for RETRY seconds;
+    the last WINDOW commands run are remembered so that each runs once.
+
+    Decisions are final whatever the epoch they were made in. A process
+    that lacks some positions below the last decided one for RETRY seconds
+    asks the leader for them, or another process if it leads itself. The
+    last KEEP decisions run are kept for this; one asked for positions run
+    before those sends a snapshot of its machine instead.
+
+    Commands run on a MACHINE, see machine.py, one at a time as they come.
+
+    Request: Execute | cmd[, cid]
+    Indication: ExecuteReturn | pos, result, cid
+    """
+    RETRY = 1
+    WINDOW = 4096
+    KEEP = 4096
+    MACHINE = StateMachine
+
+    def upon_Init(self):
+        self.ets, self.leader = 0, None
+        self.newts, self.newleader = 0, None
+        self.early = defaultdict(list)  # ets -> [(q, m)] not started yet
+        self.decided = {}  # pos -> (cid, cmd), or NOOP
+        self.next_cmd_pos = 0
+        self.last_pos = 0
+        self.submitted = {}  # cid -> cmd of our own commands not run yet
+        self.stuck = set()
+        self.gaps = set()
+        self.ran = OrderedDict()  # cid -> (pos, result) of the last run
+        self.machine = self.MACHINE()
+        self.start_epoch({})
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def start_epoch(self, state):
+        self.ep = nested(self.epoch, self, self.ets, Tagged(self, self.ets),
+                         initargs=(state, self.ets, self.leader,
+                                   self.next_cmd_pos))
+        for ts in [ts for ts in self.early if ts < self.ets]:
+            del self.early[ts]
+        for q, m in self.early.pop(self.ets, []):
+            trigger(self.ep, 'Deliver', q, m)
+        for cid, cmd in self.submitted.items():
+            self.submit(cid, cmd)
+
+    def upon_Execute(self, cmd, cid=None):
+        cid = cid or uuid.uuid4().hex
+        self.submitted[cid] = cmd
+        self.submit(cid, cmd)
+
+    def submit(self, cid, cmd):
+        if self.leader == self.addr:
+            trigger(self.ep, 'Propose', (cid, cmd))
+        elif self.leader is not None:
+            trigger(self.pl, 'Send', self.leader, {
+                'typ': 'forward',
+                'mid': uuid.uuid4(),
+                'cid': cid,
+                'cmd': cmd,
+                })
+
+    def upon_StartEpoch(self, ts, leader):
+        self.newts, self.newleader = ts, leader
+        trigger(self.ep, 'Abort')
+
+    def upon_Aborted(self, ts, state):
+        if ts == self.ets:
+            self.ets, self.leader = self.newts, self.newleader
+            self.start_epoch(state)
+
+    def upon_Decide(self, ts, vals):
+        for pos, v in vals.items():
+            if pos >= self.next_cmd_pos and pos not in self.decided:
+                self.decided[pos] = v
+                self.last_pos = max(self.last_pos, pos + 1)
+        self._run_cmds()
+
+    def upon_Retry(self):
+        for cid in self.stuck & set(self.submitted):
+            self.submit(cid, self.submitted[cid])
+        self.stuck = set(self.submitted)
+        gaps = {pos for pos in range(self.next_cmd_pos, self.last_pos)
+                if pos not in self.decided}
+        missing = sorted(gaps & self.gaps)[:self.epoch.BATCH]
+        to = self.leader
+        if to == self.addr and self.peers:
+            to = random.choice(list(self.peers))
+        if missing and to not in (None, self.addr):
+            trigger(self.pl, 'Send', to, {
+                'typ': 'fetch',
+                'mid': uuid.uuid4(),
+                'pos': missing,
+                })
+        self.gaps = gaps
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'slot':
+            ts, m = m['pos'], m['m']
+            if ts == self.ets:
+                trigger(self.ep, 'Deliver', q, m)
+            elif m['typ'] == 'decided':
+                self.upon_Decide(ts, m['vals'])
+            elif ts > self.ets:
+                self.early[ts].append((q, m))
+        elif m['typ'] == 'forward':
+            self.submit(m['cid'], m['cmd'])
+        elif m['typ'] == 'fetch':
+            if min(m['pos']) < self.next_cmd_pos - self.KEEP:
+                trigger(self.pl, 'Send', q, {
+                    'typ': 'snapshot',
+                    'mid': uuid.uuid4(),
+                    'pos': self.next_cmd_pos,
+                    'ran': list(self.ran.items()),
+                    'state': self.machine.snapshot(),
+                    })
+                return
+            vals = {pos: self.decided[pos] for pos in m['pos']
+                    if pos in self.decided}
+            if vals:
+                trigger(self.pl, 'Send', q, {
+                    'typ': 'learn',
+                    'mid': uuid.uuid4(),
+                    'vals': vals,
+                    })
+        elif m['typ'] == 'learn':
+            self.upon_Decide(None, m['vals'])
+        elif m['typ'] == 'snapshot':
+            self.install(m)
+
+    def install(self, m):
+        if m['pos'] <= self.next_cmd_pos:
+            return
+        log.info('%s catches up to position %s', self.addr, m['pos'])
+        self.machine.restore(m['state'])
+        for pos in range(self.next_cmd_pos, m['pos']):
+            self.decided.pop(pos, None)
+        self.next_cmd_pos = m['pos']
+        self.last_pos = max(self.last_pos, self.next_cmd_pos)
+        self.ran = OrderedDict(m['ran'])
+        for cid in [cid for cid in self.submitted if cid in self.ran]:
+            self.reply(cid)
+        self._run_cmds()
+
+    def _run_cmds(self):
+        ran = self.next_cmd_pos
+        while self.next_cmd_pos in self.decided:
+            v = self.decided[self.next_cmd_pos]
+            if v is not self.epoch.NOOP:
+                self._apply(self.next_cmd_pos, *v)
+            self.next_cmd_pos += 1
+            self.decided.pop(self.next_cmd_pos - self.KEEP, None)
+        if self.next_cmd_pos != ran:
+            trigger(self.ep, 'Trim', self.next_cmd_pos)
+
+    def _apply(self, pos, cid, cmd):
+        if cid not in self.ran:  # else submitted again after an epoch change
+            result, = self.machine.apply([cmd])
+            self.ran[cid] = (pos, result)
+            if len(self.ran) > self.WINDOW:
+                self.ran.popitem(last=False)
+        if cid in self.submitted:
+            self.reply(cid)
+
+    def reply(self, cid):
+        del self.submitted[cid]
+        pos, result = self.ran[cid]
+        trigger(self.upper, 'ExecuteReturn', pos, result, cid)
@@ -0,0 +1,452 @@
+"""
+Egalitarian Paxos (Moraru et al., SOSP 2013)
+
+There is no log and no leader: every process leads the commands submitted
+to it, each in an instance of its own, (process, i). Two commands
+interfere when they touch the same key. An instance carries the
+attributes of its command: deps, the interfering instances it comes
+after, and seq, above that of every one of them. Processes agree on the
+attributes, not on positions, and every process runs the same dependency
+graph in the same order: strongly connected components first to last,
+each in seq order.
+
+The command leader sends PreAccept with the attributes it knows of to
+every other process; each adds the interfering instances it knows of and
+answers with the result. A process adds only its latest interfering
+instance of each process: every earlier one is reachable from it, since a
+leader makes each of its instances depend on its last interfering one.
+- Fast path: a fast quorum, N/2 + (N/2 + 1)/2 processes of N = 2F + 1
+  leader included, answers with the attributes unchanged. The command is
+  committed after one round trip.
+- Slow path: some answer differs, or no fast quorum answers within
+  TIMEOUT seconds. The leader takes the union of what a majority
+  answered and has a majority accept it, one more round trip.
+
+Commands on independent keys thus commit in one round trip at whichever
+process takes them. Only interfering commands pay for a second round.
+
+Recovery: a process that has known of an instance for RECOVER seconds
+(up to twice as long, at random) without it committed, or that waits on it
+to run its own, takes it over with a Synod round on its attributes. The
+leader's PreAccept counts as ballot (0, leader) and its Accept as (1,
+leader); a recovering process prepares (r, itself) with r above any round
+it has seen, and once a majority promised, picks what the instance may
+have been committed with:
+- committed somewhere: that;
+- accepted somewhere: what was accepted in the highest ballot;
+- PreAccepted unchanged ("voted") by F + 1 processes, the leader counted
+  in: the attributes of the leader, which a commit on the fast path would
+  have. With that many, any interfering instance committed since has it
+  in its deps, so the attributes are safe even if it was not committed.
+- voted by too few for a fast quorum, counting everyone not heard from:
+  not committed, so NOOP. A leader still alive submits its command again
+  in an instance of its own.
+Otherwise it waits for more promises: with more than one process down,
+an instance may stay stuck until one of them is back. It then has the
+pick accepted by a majority, and commits it.
+
+A process remembers the instances it ran as the first not run of each
+process and those run above it. It keeps the attributes of those it ran
+for recoveries, and drops them once every process said it ran them: every
+GC seconds, while it ran anything new, it tells the others how far it got.
+
+Module:
+  Name: ReplicatedStateMachine
+
+Events:
+  Request: <Execute | cmd[, cid]>: cmd is (op, key, ...) by default, see
+    `key`; cid names it, made up if not given.
+  Indication: <ExecuteReturn | inst, result, cid>: our command cid ran, in
+    instance inst, on the MACHINE of machine.py.
+"""
+import uuid
+import random
+import logging
+from collections import defaultdict
+
+from .basic import implements, uses, trigger, start_timer, ABC
+from .machine import StateMachine
+
+log = logging.getLogger(__name__)
+
+PREACCEPTED, ACCEPTED, COMMITTED = range(3)
+
+
+@implements('ReplicatedStateMachine')
+@uses('PerfectPointToPointLinks', 'pl')
+class EPaxos(ABC):
+    """
+    insts holds [cmd, seq, deps, status] of every instance not run yet,
+    deps a set of instances, cmd None for NOOP. Once an instance runs, its
+    attributes move to done until every process ran it.
+    """
+    TIMEOUT = .1
+    RECOVER = 1
+    GC = 1
+    MACHINE = StateMachine
+
+    def upon_Init(self):
+        self.machine = self.MACHINE()
+        self.next_i = 0
+        self.insts = {}
+        self.ran = defaultdict(int)  # process -> first of its not run
+        self.executed = set()  # instances run above ran
+        self.done = {}  # inst -> (cmd, seq, deps) of those run
+        self.reported = {}  # process -> its ran, as it last told us
+        self.collecting = False
+        self.latest = defaultdict(dict)  # key -> {process: i} interfering
+        self.maxseq = defaultdict(int)  # key -> highest seq of it
+        self.replies = {}  # inst -> [(seq, deps)], leader only
+        self.accepts = {}  # inst -> processes that accepted, leader only
+        self.waiting = defaultdict(set)  # inst -> committed ones it blocks
+        self.mine = {}  # inst -> (cid, cmd) of our own commands not run yet
+        # recovery
+        self.round = 1
+        self.promised = {}  # inst -> highest ballot promised
+        self.ballots = {}  # inst -> ballot its attributes were accepted in
+        self.voted = {}  # inst -> the leader's attributes, PreAccepted as is
+        self.watched = set()
+        self.recovering = {}  # inst -> [ballot, promises, acks]
+        F = (self.N - 1) // 2
+        self.fast = F + (F + 1) // 2
+        self.slow = F + 1
+
+    def key(self, cmd):
+        return cmd[1]
+
+    def attributes(self, inst, cmd, seq=0, deps=()):
+        """seq and deps of inst merged with the interfering ones known here"""
+        key = self.key(cmd)
+        deps = set(deps) | set(self.latest[key].items())
+        deps.discard(inst)
+        return max(seq, self.maxseq[key] + 1), deps
+
+    def is_executed(self, inst):
+        p, i = inst
+        return i < self.ran[p] or inst in self.executed
+
+    def record(self, inst, cmd, seq, deps, status, force=False):
+        if self.is_executed(inst):
+            return
+        if not force and inst in self.insts and \
+                self.insts[inst][3] >= status:
+            return
+        self.insts[inst] = [cmd, seq, deps, status]
+        if status < COMMITTED and inst[0] != self.addr:
+            self.watch(inst)
+        if cmd is None:
+            return
+        key = self.key(cmd)
+        p, i = inst
+        if self.latest[key].get(p, -1) < i:
+            self.latest[key][p] = i
+        self.maxseq[key] = max(self.maxseq[key], seq)
+
+    def send(self, m):
+        for p in self.peers:
+            trigger(self.pl, 'Send', p, m)
+
+    def upon_Execute(self, cmd, cid=None):
+        inst = (self.addr, self.next_i)
+        self.next_i += 1
+        self.mine[inst] = (cid or uuid.uuid4().hex, cmd)
+        seq, deps = self.attributes(inst, cmd)
+        self.record(inst, cmd, seq, deps, PREACCEPTED)
+        self.replies[inst] = [(seq, deps)]
+        self.send({
+            'typ': 'preaccept',
+            'inst': inst,
+            'cmd': cmd,
+            'seq': seq,
+            'deps': deps,
+            })
+        start_timer(self.TIMEOUT, self.upon_Timeout, inst)
+
+    def upon_Timeout(self, inst):
+        if inst not in self.replies:
+            return
+        if len(self.replies[inst]) >= self.slow:
+            self.accept(inst)
+        else:
+            start_timer(self.TIMEOUT, self.upon_Timeout, inst)
+
+    def accept(self, inst):
+        """slow path: the union of the attributes answered"""
+        replies = self.replies.pop(inst)
+        cmd = self.insts[inst][0]
+        seq = max(s for s, _ in replies)
+        deps = set().union(*(d for _, d in replies))
+        self.record(inst, cmd, seq, deps, ACCEPTED)
+        self.accepts[inst] = {self.addr}
+        self.ballots[inst] = (1, self.addr)
+        self.send({
+            'typ': 'accept',
+            'inst': inst,
+            'ballot': (1, self.addr),
+            'cmd': cmd,
+            'seq': seq,
+            'deps': deps,
+            })
+
+    def commit(self, inst, attrs=None):
+        cmd, seq, deps = attrs or self.insts[inst][:3]
+        self.send({
+            'typ': 'commit',
+            'inst': inst,
+            'cmd': cmd,
+            'seq': seq,
+            'deps': deps,
+            })
+        self.committed(inst, cmd, seq, deps)
+
+    def committed(self, inst, cmd, seq, deps):
+        self.replies.pop(inst, None)
+        self.accepts.pop(inst, None)
+        self.recovering.pop(inst, None)
+        self.record(inst, cmd, seq, deps, COMMITTED, force=True)
+        self.execute(inst)
+        for blocked in self.waiting.pop(inst, ()):
+            self.execute(blocked)
+
+    def upon_Deliver(self, q, m):
+        inst = m.get('inst')
+        if m['typ'] == 'preaccept':
+            if inst in self.insts or inst in self.promised or \
+                    self.is_executed(inst):
+                return
+            seq, deps = self.attributes(inst, m['cmd'], m['seq'], m['deps'])
+            self.record(inst, m['cmd'], seq, deps, PREACCEPTED)
+            if (seq, deps) == (m['seq'], m['deps']):
+                self.voted[inst] = (m['cmd'], seq, deps)
+            trigger(self.pl, 'Send', q, {
+                'typ': 'preacceptok',
+                'inst': inst,
+                'seq': seq,
+                'deps': deps,
+                })
+        elif m['typ'] == 'preacceptok':  # command leader
+            replies = self.replies.get(inst)
+            if replies is None:
+                return
+            replies.append((m['seq'], m['deps']))
+            if any(r != replies[0] for r in replies):
+                if len(replies) >= self.slow:
+                    self.accept(inst)
+            elif len(replies) >= self.fast:
+                del self.replies[inst]
+                self.commit(inst)
+        elif m['typ'] == 'accept':
+            ballot = m['ballot']
+            self.round = max(self.round, ballot[0])
+            if ballot < self.promised.get(inst, ballot) or \
+                    self.is_executed(inst) or (
+                        inst in self.insts and
+                        self.insts[inst][3] == COMMITTED):
+                return
+            self.promised[inst] = self.ballots[inst] = ballot
+            self.record(inst, m['cmd'], m['seq'], m['deps'], ACCEPTED,
+                        force=True)
+            trigger(self.pl, 'Send', q, {
+                'typ': 'acceptok',
+                'inst': inst,
+                'ballot': ballot,
+                })
+        elif m['typ'] == 'acceptok':
+            if inst in self.recovering:
+                self.recovered(q, inst, m['ballot'])
+                return
+            accepts = self.accepts.get(inst)  # command leader
+            if accepts is None:
+                return
+            accepts.add(q)
+            if len(accepts) >= self.slow:
+                del self.accepts[inst]
+                self.commit(inst)
+        elif m['typ'] == 'commit':
+            self.committed(inst, m['cmd'], m['seq'], m['deps'])
+        elif m['typ'] == 'prepare':
+            self.round = max(self.round, m['ballot'][0])
+            state = self.promise(inst, m['ballot'])
+            if state is not None:
+                trigger(self.pl, 'Send', q, dict(
+                    state, typ='promise', inst=inst, ballot=m['ballot']))
+        elif m['typ'] == 'promise':
+            self.promised_by(q, inst, m['ballot'], m)
+        elif m['typ'] == 'ran':
+            self.reported[q] = m['ran']
+            self.collect()
+
+    def promise(self, inst, ballot):
+        """
+        what we know of inst, promising to take no part in lower ballots;
+        None if we promised a higher one already
+        """
+        state = {'status': None, 'attrs': None, 'accepted': None,
+                 'voted': self.voted.get(inst)}
+        if inst in self.done:
+            state.update(status=COMMITTED, attrs=self.done[inst])
+            return state
+        if self.is_executed(inst):
+            return None  # forgotten: everyone ran it
+        if ballot <= self.promised.get(inst, (0, None)):
+            return None
+        self.promised[inst] = ballot
+        self.replies.pop(inst, None)
+        self.accepts.pop(inst, None)
+        if inst in self.insts:
+            cmd, seq, deps, status = self.insts[inst]
+            state.update(status=status, attrs=(cmd, seq, deps),
+                         accepted=self.ballots.get(inst))
+        return state
+
+    def watch(self, inst):
+        """recover inst unless it is committed in a while"""
+        if inst not in self.watched:
+            self.watched.add(inst)
+            start_timer(self.RECOVER * (1 + random.random()),
+                        self.upon_Recover, inst)
+
+    def upon_Recover(self, inst):
+        self.watched.discard(inst)
+        if self.is_executed(inst) or (
+                inst in self.insts and self.insts[inst][3] == COMMITTED):
+            return
+        self.round += 1
+        ballot = (self.round, self.addr)
+        log.info('%s recover %s in ballot %s', self.addr, inst, ballot)
+        self.recovering[inst] = [ballot, {}, set()]
+        self.send({'typ': 'prepare', 'inst': inst, 'ballot': ballot})
+        state = self.promise(inst, ballot)
+        if state is not None:
+            self.promised_by(self.addr, inst, ballot, state)
+        self.watch(inst)
+
+    def promised_by(self, q, inst, ballot, state):
+        r = self.recovering.get(inst)
+        if r is None or r[0] != ballot or r[2]:
+            return
+        promises = r[1]
+        promises[q] = state
+        if len(promises) < self.slow:
+            return
+        states = list(promises.values())
+        for s in states:
+            if s['status'] == COMMITTED:
+                self.commit(inst, s['attrs'])
+                return
+        accepted = [s for s in states if s['accepted'] is not None]
+        if accepted:
+            attrs = max(accepted, key=lambda s: s['accepted'])['attrs']
+        else:
+            leader = inst[0]
+            voters = [s['voted'] for p, s in promises.items()
+                      if s['voted'] is not None and p != leader]
+            unseen = self.N - 1 - len(set(promises) - {leader})
+            if len(voters) + 1 >= self.slow:
+                attrs = voters[0]
+            elif len(voters) + 1 + unseen < self.fast:
+                attrs = (None, 0, set())
+            else:
+                return  # may have been committed or not: wait for more
+        r[2].add(self.addr)
+        self.ballots[inst] = ballot
+        self.record(inst, *attrs, ACCEPTED, force=True)
+        self.send({
+            'typ': 'accept',
+            'inst': inst,
+            'ballot': ballot,
+            'cmd': attrs[0],
+            'seq': attrs[1],
+            'deps': attrs[2],
+            })
+
+    def recovered(self, q, inst, ballot):
+        r = self.recovering[inst]
+        if r[0] != ballot or not r[2]:
+            return
+        r[2].add(q)
+        if len(r[2]) >= self.slow:
+            del self.recovering[inst]
+            self.commit(inst)
+
+    def execute(self, root):
+        """
+        run root and everything it depends on, if all of it is committed:
+        Tarjan's algorithm yields the components deps first
+        """
+        if self.is_executed(root):
+            return
+        index, low = {root: 0}, {root: 0}
+        stack, on = [root], {root}
+        work = [(root, iter(self.insts[root][2]))]
+        components = []
+        while work:
+            v, edges = work[-1]
+            for w in edges:
+                if self.is_executed(w):
+                    continue
+                if w not in index:
+                    if w not in self.insts or self.insts[w][3] < COMMITTED:
+                        self.waiting[w].add(root)
+                        if w[0] != self.addr:
+                            self.watch(w)
+                        return
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on.add(w)
+                    work.append((w, iter(self.insts[w][2])))
+                    break
+                if w in on:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while not component or component[-1] != v:
+                        component.append(stack.pop())
+                        on.discard(component[-1])
+                    components.append(component)
+        for component in components:
+            for inst in sorted(component,
+                               key=lambda inst: (self.insts[inst][1], inst)):
+                self.run(inst)
+
+    def run(self, inst):
+        cmd, seq, deps, _ = self.insts.pop(inst)
+        self.done[inst] = (cmd, seq, deps)
+        for state in self.promised, self.ballots, self.voted:
+            state.pop(inst, None)
+        p, i = inst
+        self.executed.add(inst)
+        while (p, self.ran[p]) in self.executed:
+            self.executed.discard((p, self.ran[p]))
+            self.ran[p] += 1
+        if not self.collecting:
+            self.collecting = True
+            start_timer(self.GC, self.upon_Collect)
+        mine = self.mine.pop(inst, None)
+        if cmd is None:
+            if mine is not None:  # recovered as NOOP: try again
+                log.info('%s submit %s again', self.addr, mine[1])
+                self.upon_Execute(mine[1], mine[0])
+            return
+        result, = self.machine.apply([cmd])
+        if mine is not None:
+            trigger(self.upper, 'ExecuteReturn', inst, result, mine[0])
+
+    def upon_Collect(self):
+        self.collecting = False
+        self.send({'typ': 'ran', 'ran': dict(self.ran)})
+        self.collect()
+
+    def collect(self):
+        """forget the attributes of instances every process ran"""
+        if len(self.reported) < len(self.peers):
+            return
+        low = {p: min([i] + [ran.get(p, 0) for ran in self.reported.values()])
+               for p, i in self.ran.items()}
+        for inst in [inst for inst in self.done if inst[1] < low[inst[0]]]:
+            del self.done[inst]
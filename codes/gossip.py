@@ -1,14 +1,73 @@
 import random
 import pickle
+import asyncio
 import logging
 import itertools
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from .basic import implements, uses, trigger, start_timer, ABC
 
 log = logging.getLogger(__name__)
 
 
+def miss_probability(n, k, r, loss):
+    """
+    probability that the eager phase (algo 3.9) with fanout k and r rounds
+    misses one given process out of n, on links losing `loss` of messages
+
+    Every arrival with rounds left picks k distinct peers out of n-1, so the
+    given process is one of them with probability k/(n-1). Subtrees are
+    taken as independent.
+    """
+    if n < 2:
+        return 0.
+    k = min(k, n - 1)
+    hit = k / (n - 1)
+    miss = 1.
+    for _ in range(r):
+        sub = loss + (1 - loss) * miss
+        miss = hit * loss * sub ** (k - 1) + (1 - hit) * sub ** k
+    return miss
+
+
+def expected_messages(k, r, loss):
+    """messages sent by the eager phase for one broadcast"""
+    return k * sum((k * (1 - loss)) ** i for i in range(r))
+
+
+def gossip_params(n, loss, epsilon, max_rounds=8):
+    """
+    (rounds, fanout) with the fewest expected messages such that every one
+    of the n-1 other processes delivers with probability 1-epsilon, bounding
+    the chance that any of them is missed by (n-1) times the chance for one
+    """
+    if n < 2:
+        return 1, 0
+    best = None
+    for r in range(1, max_rounds + 1):
+        for k in range(1, n):
+            if (n - 1) * miss_probability(n, k, r, loss) <= epsilon:
+                cost = expected_messages(k, r, loss)
+                if best is None or cost < best[0]:
+                    best = (cost, r, k)
+                break
+    if best is None:
+        return max_rounds, n - 1
+    return best[1:]
+
+
+def estimate_loss(n, k, r, miss):
+    """invert miss_probability(): the loss rate explaining a miss ratio"""
+    lo, hi = 0., 1.
+    for _ in range(30):
+        mid = (lo + hi) / 2
+        if miss_probability(n, k, r, mid) < miss:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
 @implements('UnreliableProbabilisticBroadcast')
 @uses('FairLossPointToPointLinks', 'fll')
 class EagerProbabilisticBroadcast(ABC):
@@ -45,11 +104,79 @@ class EagerProbabilisticBroadcast(ABC):
             m['rounds'] -= 1
             self.gossip(m)
 
+    def upon_MissRate(self, missed, total):
+        pass  # R and K are fixed, nothing to adapt
+
     def gossip(self, m):
-        for p in random.sample(self.peers, self.K):
+        peers = list(self.peers)
+        for p in random.sample(peers, min(self.K, len(peers))):
             trigger(self.fll, 'Send', p, m)
 
 
+@implements('UnreliableProbabilisticBroadcast')
+@uses('FairLossPointToPointLinks', 'fll')
+class AdaptiveEagerProbabilisticBroadcast(EagerProbabilisticBroadcast):
+    """
+    Algo 3.9 with R and K derived from the number of processes, the loss rate
+    of the links and the target EPSILON instead of being fixed: the cheapest
+    (R, K) such that every process delivers with probability 1-EPSILON, see
+    gossip_params().
+
+    N is read from the current peers, so the parameters follow membership.
+    The loss rate starts at LOSS and then follows the misses the upper layer
+    reports with MissRate: messages the eager phase did not bring, whether
+    they were recovered or skipped afterwards. With R and K right, a miss is
+    rare, so misses are counted until one is seen or at least one is
+    expected at the current estimate, which is only then updated: a few
+    messages all brought are no sign that links lose less. The estimate
+    moves by WEIGHT of the difference at a time and stays above MIN_LOSS,
+    and R and K change only once it is more than HYSTERESIS away from the
+    loss they were derived for.
+    """
+    EPSILON = 1e-3
+    LOSS = .05
+    MIN_LOSS = .01
+    WEIGHT = .25  # of a new loss estimate against the previous one
+    HYSTERESIS = .5  # relative change of the estimate before new R and K
+
+    def upon_Init(self):
+        super().upon_Init()
+        self.loss = self.planned = self.LOSS
+        self.missed = self.seen = 0
+        self.params = {}
+
+    @property
+    def RK(self):
+        key = (len(self.peers) + 1, round(self.planned, 2))
+        if key not in self.params:
+            self.params[key] = gossip_params(key[0], key[1], self.EPSILON)
+            log.info('%s gossip with N=%s, loss=%s: R=%s, K=%s',
+                     self.addr, key[0], key[1], *self.params[key])
+        return self.params[key]
+
+    @property
+    def R(self):
+        return self.RK[0]
+
+    @property
+    def K(self):
+        return self.RK[1]
+
+    def upon_MissRate(self, missed, total):
+        self.missed += missed
+        self.seen += total
+        r, k = self.RK
+        n = len(self.peers) + 1
+        expected = self.seen * miss_probability(n, k, r, self.planned)
+        if not self.missed and expected < 1:
+            return
+        loss = estimate_loss(n, k, r, self.missed / self.seen)
+        self.missed = self.seen = 0
+        self.loss += self.WEIGHT * (max(loss, self.MIN_LOSS) - self.loss)
+        if abs(self.loss - self.planned) > self.HYSTERESIS * self.planned:
+            self.planned = self.loss
+
+
 @implements('ProbabilisticBroadcast')
 @uses('FairLossPointToPointLinks', 'fll')
 @uses('UnreliableProbabilisticBroadcast', 'upb')
@@ -93,7 +220,8 @@ class LazyProbabilisticBroadcast(ABC):
         self.stored = defaultdict(dict)
 
     def gossip(self, m):
-        for p in random.sample(self.peers, self.K):
+        peers = list(self.peers)
+        for p in random.sample(peers, min(self.K, len(peers))):
             trigger(self.fll, 'Send', p, m)
 
     def upon_Broadcast(self, m):
@@ -156,3 +284,217 @@ class LazyProbabilisticBroadcast(ABC):
             log.info("%s skip %s'ssn to %s",
                      self.addr, origin, self.next[origin])
             self.deliver_pending(origin)
+
+
+@implements('ProbabilisticBroadcast')
+@uses('FairLossPointToPointLinks', 'fll')
+@uses('UnreliableProbabilisticBroadcast', 'upb')
+class BoundedLazyProbabilisticBroadcast(LazyProbabilisticBroadcast):
+    """
+    algo 3.10 with the parts the pseudo code leaves out
+
+    - stored copies live under a memory budget: at most STORE_LIMIT of them,
+      none older than STORE_TTL seconds since it was stored or last served,
+      least recently used are evicted first.
+    - a gap is recovered by one request per origin that names every missing
+      range, instead of one request per missing sequence number. Processes
+      that hold part of the ranges answer with one batch and gossip the
+      request on for the rest only. Ranges already asked for are asked again
+      only once RETRY seconds have passed.
+    - there is one recovery timer per origin instead of one per message,
+      armed while anything of the origin is missing. Every RETRY seconds it
+      asks again for what is still missing; DELTA seconds after it was
+      armed, everything missing up to the highest sequence number known at
+      arm time is skipped.
+    - a gap at the tail has no later message to reveal it: every RETRY
+      seconds, for TAIL times after it last learnt of a new message, a
+      process sends the highest sequence number it knows of each origin
+      to one peer at random, which asks for what it still misses up to
+      those when its recovery timer fires.
+
+    Every OBSERVE messages, the number of them that had to be recovered or
+    skipped is reported to the eager layer (MissRate) to adapt its gossip.
+    """
+    STORE_LIMIT = 1024
+    STORE_TTL = 60
+    RETRY = 1
+    TAIL = 3
+    OBSERVE = 64
+
+    def upon_Init(self):
+        super().upon_Init()
+        self.stored = OrderedDict()  # (origin, sn) -> (last used, m)
+        self.requested = {}  # origin -> (sn requested up to, when)
+        self.known = {}  # origin -> highest sn known to exist
+        self.armed = {}  # origin -> [retries before skipping, skip up to]
+        self.announce = 0  # times left to send known to a peer
+        self.observed = [0, 0]  # messages gossiped, recovered or skipped
+
+    def observe(self, missed):
+        self.observed[missed] += 1
+        total = sum(self.observed)
+        if total >= self.OBSERVE:
+            trigger(self.upb, 'MissRate', self.observed[True], total)
+            self.observed = [0, 0]
+
+    def now(self):
+        return asyncio.get_event_loop().time()
+
+    def store(self, m):
+        now = self.now()
+        self.stored[(m['origin'], m['sn'])] = (now, m)
+        while len(self.stored) > self.STORE_LIMIT:
+            self.stored.popitem(last=False)
+        self.expire(now)
+
+    def expire(self, now):
+        while self.stored:
+            used, _ = next(iter(self.stored.values()))
+            if used > now - self.STORE_TTL:
+                break
+            self.stored.popitem(last=False)
+
+    def upon_AnnounceTimeout(self):
+        self.announce -= 1
+        if self.peers:
+            trigger(self.fll, 'Send', random.choice(list(self.peers)), {
+                'typ': 'digest',
+                'known': dict(self.known),
+                })
+        if self.announce:
+            start_timer(self.RETRY, self.upon_AnnounceTimeout)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'request':
+            self.recovery(q, m)
+        elif m['typ'] == 'digest':
+            for origin, sn in m['known'].items():
+                self.heard(origin, sn, ask=False)
+        elif m['typ'] == 'batch':
+            for each in m['messages']:
+                self.dissemination(q, each, recovered=True)
+        else:
+            self.dissemination(q, m)
+
+    def missing(self, origin, sn):
+        """ranges [start, stop) below sn neither delivered nor pending"""
+        start = self.next[origin]
+        upto, when = self.requested.get(origin, (start, None))
+        now = self.now()
+        if when is None or now - when >= self.RETRY:
+            self.requested[origin] = (sn, now)
+        else:
+            start = max(start, upto)
+            self.requested[origin] = (max(sn, upto), when)
+
+        ranges = []
+        start, first = None, start
+        for i in range(first, sn):
+            if i in self.pending[origin]:
+                if start is not None:
+                    ranges.append((start, i))
+                    start = None
+            elif start is None:
+                start = i
+        if start is not None:
+            ranges.append((start, sn))
+        return ranges
+
+    def dissemination(self, q, m, recovered=False):
+        origin, sn = m['origin'], m['sn']
+        if sn < self.next[origin] or sn in self.pending[origin]:
+            return
+        self.observe(recovered)
+        if random.random() < self.ALPHA:
+            self.store(m)
+
+        if sn == self.next[origin]:
+            self.next[origin] += 1
+            trigger(self.upper, 'Deliver', origin, m['payload'])
+            self.deliver_pending(origin)
+        else:
+            self.pending[origin][sn] = m
+        self.heard(origin, sn)
+
+    def heard(self, origin, sn, ask=True):
+        """
+        sn of origin exists: ask for whatever is missing up to it, now or
+        only once the recovery timer fires
+        """
+        if sn > self.known.get(origin, -1):
+            self.known[origin] = sn
+            if not self.announce:
+                start_timer(self.RETRY, self.upon_AnnounceTimeout)
+            self.announce = self.TAIL
+        if self.known[origin] >= self.next[origin]:
+            if ask:
+                self.request(origin)
+            if origin not in self.armed:
+                self.arm(origin)
+
+    def request(self, origin):
+        ranges = self.missing(origin, self.known[origin] + 1)
+        if ranges:
+            self.gossip({
+                'typ': 'request',
+                'origin': origin,
+                'ranges': ranges,
+                'dest': self.addr,
+                'rounds': self.R,
+                })
+
+    def arm(self, origin):
+        self.armed[origin] = [
+            max(1, round(self.DELTA / self.RETRY)), self.known[origin]]
+        start_timer(self.RETRY, self.upon_RecoveryTimeout, origin)
+
+    def recovery(self, q, m):
+        origin, dest = m['origin'], m['dest']
+        found, rest = [], []
+        for start, stop in m['ranges']:
+            for sn in range(start, stop):
+                k = (origin, sn)
+                if k in self.stored:
+                    self.stored.move_to_end(k)
+                    found.append(self.stored[k][1])
+                elif not rest or rest[-1][1] != sn:
+                    rest.append((sn, sn + 1))
+                else:
+                    rest[-1] = (rest[-1][0], sn + 1)
+        if found:
+            now = self.now()
+            for each in found:
+                self.stored[(origin, each['sn'])] = (now, each)
+            trigger(self.fll, 'Send', dest, {
+                'typ': 'batch',
+                'messages': found,
+                })
+        if rest and m['rounds'] > 1:
+            self.gossip(dict(m, ranges=rest, rounds=m['rounds'] - 1))
+
+    def upon_RecoveryTimeout(self, origin):
+        armed = self.armed[origin]
+        armed[0] -= 1
+        if self.known[origin] < self.next[origin]:
+            del self.armed[origin]
+            return
+        if armed[0]:
+            self.requested.pop(origin, None)
+            self.request(origin)
+            start_timer(self.RETRY, self.upon_RecoveryTimeout, origin)
+            return
+        del self.armed[origin]
+        upto, pending = armed[1], self.pending[origin]
+        if upto >= self.next[origin]:
+            log.info("%s skip %s's sn from %s to %s",
+                     self.addr, origin, self.next[origin], upto)
+            for sn in range(self.next[origin], upto + 1):
+                if sn in pending:
+                    m = pending.pop(sn)
+                    trigger(self.upper, 'Deliver', origin, m['payload'])
+                else:
+                    self.observe(True)
+            self.next[origin] = upto + 1
+            self.deliver_pending(origin)
+        if self.known[origin] >= self.next[origin]:
+            self.arm(origin)
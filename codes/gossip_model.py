@@ -0,0 +1,84 @@
+"""
+Offline model of eager gossip (algo 3.9), vectorized with NumPy
+
+`choose()` evaluates gossip.miss_probability() over a whole grid of fanouts
+and rounds at once and picks the cheapest pair meeting the target;
+`infection_curve()` runs many randomized trials side by side to get the
+infected fraction per round and the chance that every process is reached.
+
+NumPy is only needed here, not by the running processes.
+"""
+import numpy as np
+
+
+def miss_probabilities(n, ks, r, loss):
+    """gossip.miss_probability() for every fanout in `ks`, shape (r, len)"""
+    ks = np.minimum(np.asarray(ks, dtype=float), n - 1)
+    hit = ks / (n - 1)
+    miss = np.ones_like(ks)
+    rows = []
+    for _ in range(r):
+        sub = loss + (1 - loss) * miss
+        miss = hit * loss * sub ** (ks - 1) + (1 - hit) * sub ** ks
+        rows.append(miss)
+    return np.array(rows)
+
+
+def expected_messages(ks, r, loss):
+    """gossip.expected_messages() for every fanout in `ks`, shape (r, len)"""
+    ks = np.asarray(ks, dtype=float)
+    rounds = np.arange(r)[:, None]
+    per_round = ks * (ks * (1 - loss)) ** rounds
+    return np.cumsum(per_round, axis=0)
+
+
+def choose(n, loss, epsilon, max_rounds=8):
+    """
+    (rounds, fanout, expected messages) of the cheapest configuration whose
+    chance of missing any process is below epsilon, or None
+    """
+    ks = np.arange(1, n)
+    ok = (n - 1) * miss_probabilities(n, ks, max_rounds, loss) <= epsilon
+    cost = np.where(ok, expected_messages(ks, max_rounds, loss), np.inf)
+    r, i = np.unravel_index(np.argmin(cost), cost.shape)
+    if not np.isfinite(cost[r, i]):
+        return None
+    return int(r) + 1, int(ks[i]), float(cost[r, i])
+
+
+def infection_curve(n, k, r, loss, trials=1000, seed=None, chunk=2 ** 21):
+    """
+    simulate `trials` broadcasts at once
+
+    Every arrival with rounds left sends to k distinct other processes and
+    each message is lost with probability `loss`, like algo 3.9 does.
+    Returns the mean infected fraction after each round (r+1 values,
+    starting with the origin alone), the fraction of trials that reached
+    every process and the mean messages sent.
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, n - 1)
+    infected = np.zeros((trials, n), dtype=bool)
+    infected[:, 0] = True
+    senders = np.zeros((trials, n), dtype=np.int64)
+    senders[:, 0] = 1
+    sent = np.zeros(trials)
+    curve = [infected.mean()]
+    step = max(1, chunk // n)
+    for _ in range(r):
+        sent += k * senders.sum(axis=1)
+        t, j = np.nonzero(senders)
+        count = senders[t, j]
+        t, j = np.repeat(t, count), np.repeat(j, count)
+        arrivals = np.zeros(trials * n, dtype=np.int64)
+        for i in range(0, len(t), step):
+            ts, js = t[i:i + step], j[i:i + step]
+            keys = rng.random((len(ts), n - 1))
+            offset = np.argpartition(keys, k - 1, axis=1)[:, :k] + 1
+            dest = ts[:, None] * n + (js[:, None] + offset) % n
+            kept = dest[rng.random(dest.shape) >= loss]
+            arrivals += np.bincount(kept, minlength=trials * n)
+        senders = arrivals.reshape(trials, n)
+        infected |= senders > 0
+        curve.append(infected.mean())
+    return np.array(curve), infected.all(axis=1).mean(), sent.mean()
@@ -2,11 +2,16 @@ from .links import BasicLink, RetransmitWithACK, EliminateDuplicates
 from .broadcast import (
     BasicBroadcast, LazyReliableBroadcast,
     MajorityAckUniformReliableBroadcast)
-from .gossip import LazyProbabilisticBroadcast
+from .gossip import (
+    AdaptiveEagerProbabilisticBroadcast, BoundedLazyProbabilisticBroadcast)
 from .failure_detector import ExcludeOnTimeout, IncreasingTimeout
 from .leader_election import (
     MonarchicalLeaderElection, MonarchicalEventualLeaderElection)
-from .consensus import FloodingConsensus
+from .consensus import (
+    DeltaFloodingConsensus, LeaderBasedEpochChange, ReadWriteEpochChange,
+    ReadWriteEpochLog)
+from .lease import EpochLease
+from .ordering import ConsensusTotalOrder
 
 
 mapping = {
@@ -18,7 +23,8 @@ mapping = {
     'ReliableBroadcast': LazyReliableBroadcast,
     'UniformReliableBroadcast': MajorityAckUniformReliableBroadcast,
 
-    'ProbabilisticBroadcast': LazyProbabilisticBroadcast,
+    'UnreliableProbabilisticBroadcast': AdaptiveEagerProbabilisticBroadcast,
+    'ProbabilisticBroadcast': BoundedLazyProbabilisticBroadcast,
 
     'PerfectFailureDetector': ExcludeOnTimeout,
     'EventuallyPerfectFailureDetector': IncreasingTimeout,
@@ -26,7 +32,14 @@ mapping = {
     'LeaderElection': MonarchicalLeaderElection,
     'EventualLeaderDetector': MonarchicalEventualLeaderElection,
 
-    'Consensus': FloodingConsensus,
+    'Consensus': DeltaFloodingConsensus,
+    'EpochChange': LeaderBasedEpochChange,
+    'EpochConsensus': ReadWriteEpochChange,
+    'LogEpochConsensus': ReadWriteEpochLog,
+
+    'ReadLease': EpochLease,
+
+    'TotalOrderBroadcast': ConsensusTotalOrder,
     }
 
 
@@ -1,4 +1,5 @@
 import uuid
+import asyncio
 import hashlib
 import logging
 
@@ -59,6 +60,118 @@ class MonarchicalEventualLeaderElection(ABC):
         self.elect()
 
 
+def now():
+    return asyncio.get_event_loop().time()
+
+
+@implements('EventualLeaderDetector')
+@uses('EventuallyPerfectFailureDetector', 'p')
+@uses('FairLossPointToPointLinks', 'fll')
+class StickyEventualLeaderElection(ABC):
+    """
+    Algo 2.8 with hysteresis: the leader is kept while it is not suspected
+
+    When the leader is suspected, the preferred process among those not
+    suspected for HOLD seconds takes over, or among all those not suspected
+    if there are none. Another process replaces the leader only once the
+    leader has stayed worse than it for HOLD seconds, so every correct
+    process still ends up trusting the same one once suspicions stop
+    changing.
+
+    The preferred process is the highest ranked, as in algo 2.8. With
+    PREFER_RTT, it is the highest ranked among those whose mean round trip
+    time to the others is within MARGIN of the lowest one; the leader only
+    counts as worse once it is no longer within twice that. Each process
+    measures its round trip times with pings every PING seconds and
+    reports their mean in them.
+    """
+    HOLD = 10
+    PREFER_RTT = False
+    MARGIN = .5
+    PING = 1
+    ALPHA = .2  # weight of a new round trip time sample
+
+    def upon_Init(self):
+        self.suspected = set()
+        self.since = {p: now() for p in self.members}  # unsuspected since
+        self.rtt = {}  # q -> round trip time to q
+        self.reported = {}  # q -> mean round trip time q reports
+        self.challenged = None  # since when the leader is worse than best
+        self.leader = None
+        self.elect()
+        start_timer(self.PING, self.upon_Ping)
+
+    def mean_rtt(self):
+        rtts = [t for q, t in self.rtt.items() if q not in self.suspected]
+        return sum(rtts) / len(rtts) if rtts else None
+
+    def eligible(self, candidates, margin):
+        if not self.PREFER_RTT:
+            return candidates
+        rtts = {p: self.mean_rtt() if p == self.addr else self.reported.get(p)
+                for p in candidates}
+        known = [t for t in rtts.values() if t is not None]
+        if not known:
+            return candidates
+        bound = min(known) * (1 + margin)
+        return {p for p, t in rtts.items() if t is not None and t <= bound}
+
+    def elect(self):
+        candidates = self.members - self.suspected
+        held = {p for p in candidates if now() - self.since[p] >= self.HOLD}
+        best = max(self.eligible(held or candidates, self.MARGIN))
+        if self.leader not in candidates:
+            self.trust(best)
+        elif (self.leader >= best and self.leader in
+                self.eligible(candidates, 2 * self.MARGIN)):
+            self.challenged = None
+        elif self.challenged is None:
+            self.challenged = now()
+        elif now() - self.challenged >= self.HOLD:
+            self.trust(best)
+
+    def trust(self, leader):
+        self.challenged = None
+        if leader != self.leader:
+            log.info('%s trusts %s', self.addr, leader)
+            self.leader = leader
+            trigger(self.upper, 'Trust', leader)
+
+    def upon_Suspect(self, peer):
+        self.suspected.add(peer)
+        self.elect()
+
+    def upon_Restore(self, peer):
+        self.suspected.discard(peer)
+        self.since[peer] = now()
+        self.elect()
+
+    def upon_Ping(self):
+        if self.PREFER_RTT:
+            for q in self.peers:
+                trigger(self.fll, 'Send', q, {
+                    'typ': 'ping',
+                    'sent': now(),
+                    'rtt': self.mean_rtt(),
+                    })
+        self.elect()
+        start_timer(self.PING, self.upon_Ping)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'ping':
+            self.reported[q] = m['rtt']
+            trigger(self.fll, 'Send', q, {
+                'typ': 'pong',
+                'sent': m['sent'],
+                'rtt': self.mean_rtt(),
+                })
+        elif m['typ'] == 'pong':
+            self.reported[q] = m['rtt']
+            sample = now() - m['sent']
+            rtt = self.rtt.get(q, sample)
+            self.rtt[q] = (1 - self.ALPHA) * rtt + self.ALPHA * sample
+
+
 @implements('EventualLeaderDetector')
 @uses('FairLossPointToPointLinks', 'fll')
 class ElectLowerEpoch(ABC):
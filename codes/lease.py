@@ -0,0 +1,133 @@
+"""
+Read leases on top of epoch change
+
+The leader of the current epoch (Algorithm 5.5) asks every process for a
+lease each RENEW seconds. A process grants it only to the leader of the
+epoch it has started itself, and, once it has granted, to nobody else until
+its promise expires. A majority of grants makes a lease: while it holds one,
+no other process can hold one and the holder may answer reads from its own
+state.
+
+Clocks need not be synchronized, only their rates bounded: a clock may run
+at most DRIFT faster or slower than real time. The holder counts its lease
+from the moment it asked, shortened by DRIFT; a grantor counts its promise
+from the moment it granted, lengthened by DRIFT. So a promise always
+outlives the lease it backs.
+
+Module:
+  Name: ReadLease, instance lease.
+
+Events:
+  Request: <lease, Info | info>: what this process reports with its grants,
+    e.g. the last value or log position it knows of.
+  Indication: <lease, Lease | infos>: a majority granted a lease round, with
+    the info reported by each of them; raised before the lease counts as
+    valid, each time it is renewed.
+
+lease.valid() tells whether this process holds a lease right now and
+lease.promise() returns (holder, seconds left) of the lease it backs.
+"""
+import uuid
+import asyncio
+import logging
+
+from .basic import implements, uses, trigger, start_timer, ABC
+
+log = logging.getLogger(__name__)
+
+
+def now():
+    return asyncio.get_event_loop().time()
+
+
+@implements('ReadLease')
+@uses('EpochChange', 'ec')
+@uses('BestEffortBroadcast', 'beb')
+@uses('PerfectPointToPointLinks', 'pl')
+class EpochLease(ABC):
+    """
+    leases granted to the leader of the current epoch
+
+    Requests are tagged with the epoch timestamp and a round, grants for an
+    older epoch or round do not extend the lease.
+    """
+    LEASE = 2
+    RENEW = .5
+    DRIFT = .01
+
+    def upon_Init(self):
+        self.epoch = (0, None)  # (ts, l) of the epoch started last
+        self.info = None
+        # as grantor
+        self.promised = (None, 0)  # (holder, local expiry)
+        # as holder
+        self.round = 0
+        self.sent = {}  # round -> local time the request was sent
+        self.grants = {}  # round -> {q: info}
+        self.expires = 0
+
+    def valid(self):
+        return self.epoch[1] == self.addr and now() < self.expires
+
+    def promise(self):
+        holder, expires = self.promised
+        return holder, max(0., expires - now())
+
+    def upon_Info(self, info):
+        self.info = info
+
+    def upon_StartEpoch(self, ts, leader):
+        log.info('%s starts epoch %s led by %s', self.addr, ts, leader)
+        self.epoch = (ts, leader)
+        self.expires = 0
+        self.sent, self.grants = {}, {}
+        if leader == self.addr:
+            self.upon_Renew(ts)
+
+    def upon_Renew(self, ts):
+        if self.epoch != (ts, self.addr):
+            return
+        self.round += 1
+        self.sent[self.round] = now()
+        self.grants[self.round] = {}
+        for r, sent in list(self.sent.items()):
+            if sent < now() - self.LEASE:  # can no longer extend the lease
+                self.sent.pop(r)
+                self.grants.pop(r)
+        trigger(self.beb, 'Broadcast', {
+            'typ': 'lease',
+            'ts': ts,
+            'round': self.round,
+            })
+        start_timer(self.RENEW, self.upon_Renew, ts)
+
+    def upon_Extend(self, ts, expires):
+        if self.epoch == (ts, self.addr):
+            self.expires = max(self.expires, expires)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'lease':
+            holder, expires = self.promised
+            if self.epoch != (m['ts'], q):
+                return
+            if holder not in (None, q) and now() < expires:
+                return
+            self.promised = (q, now() + self.LEASE * (1 + self.DRIFT))
+            trigger(self.pl, 'Send', q, {
+                'typ': 'grant',
+                'mid': uuid.uuid4(),
+                'ts': m['ts'],
+                'round': m['round'],
+                'info': self.info,
+                })
+        elif m['typ'] == 'grant':
+            grants = self.grants.get(m['round'])
+            if m['ts'] != self.epoch[0] or grants is None:
+                return
+            grants[q] = m['info']
+            if len(grants) == self.N // 2 + 1:
+                expires = (self.sent[m['round']] +
+                           self.LEASE * (1 - self.DRIFT))
+                trigger(self.upper, 'Lease', list(grants.values()))
+                # after the upper layer has seen the infos
+                trigger(self, 'Extend', m['ts'], expires)
@@ -3,9 +3,9 @@ import bisect
 import pickle
 import logging
 import itertools
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, OrderedDict, deque
 
-from .basic import implements, uses, trigger, start_timer, Store, ABC
+from .basic import implements, uses, trigger, notify, start_timer, Store, ABC
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +23,12 @@ class BasicLink:
     def upon_Deliver(self, q, m):
         trigger(self.upper, 'Deliver', q, m)
 
+    def upon_Pause(self, p):
+        notify(self.upper, 'Pause', p)
+
+    def upon_Resume(self, p):
+        notify(self.upper, 'Resume', p)
+
 
 @implements('StubbornPointToPointLinks')
 @uses('FairLossPointToPointLinks', 'fll')
@@ -53,29 +59,81 @@ class RetransmitForever(ABC):
 @implements('StubbornPointToPointLinks')
 @uses('FairLossPointToPointLinks', 'fll')
 class RetransmitWithACK(ABC):
+    """
+    retransmits each message every DELTA seconds until it is acknowledged
+
+    No more than WINDOW messages to a peer are out unacknowledged at once,
+    nor any while the fair-loss link holds the peer back: those sent
+    meanwhile wait their turn, in order. Once HIGH messages to a peer are
+    out or waiting, the upper layer is told Pause | p, and Resume | p once
+    LOW are: a slow peer then holds back those that heed it instead of
+    piling up messages for it. Every message gets through.
+
+    An upper layer that can catch up a peer by other means may ask for
+    Shed | limit instead: past limit messages out or waiting for a peer, as
+    when it runs on without the peer, any more to it are dropped.
+    """
     DELTA = 10
+    WINDOW = 1024
+    HIGH = 4096
+    LOW = 1024
 
     def upon_Init(self):
-        self.sent = OrderedDict()
+        self.sent = defaultdict(OrderedDict)  # p -> mid -> m not acked
+        self.waiting = defaultdict(deque)  # p -> (mid, m) not sent yet
+        self.held = set()  # peers the fair-loss link holds back
+        self.paused = set()  # peers the upper layer was told to pause for
+        self.max = None  # see Shed, None keeps every message
         start_timer(self.DELTA, self.upon_Timeout)
 
     def upon_Timeout(self):
-        for (p, mid), m in self.sent.items():
+        for p, sent in self.sent.items():
+            if p in self.held:
+                continue
+            for mid, m in sent.items():
+                trigger(self.fll, 'Send', p, {
+                    'typ': 'data',
+                    'mid': mid,
+                    'data': m,
+                    })
+        start_timer(self.DELTA, self.upon_Timeout)
+
+    def upon_Shed(self, limit):
+        self.max = limit
+
+    def upon_Send(self, p, m):
+        if self.max is not None and \
+                len(self.sent[p]) + len(self.waiting[p]) >= self.max:
+            log.debug('--> %s: %d messages under way, dropped', p, self.max)
+            return
+        self.waiting[p].append((uuid.uuid4(), m))
+        self.push(p)
+
+    def push(self, p):
+        """send what waits for p as far as the window goes"""
+        sent, waiting = self.sent[p], self.waiting[p]
+        while waiting and len(sent) < self.WINDOW and p not in self.held:
+            mid, m = waiting.popleft()
+            sent[mid] = m
             trigger(self.fll, 'Send', p, {
                 'typ': 'data',
                 'mid': mid,
                 'data': m,
                 })
-        start_timer(self.DELTA, self.upon_Timeout)
+        n = len(sent) + len(waiting)
+        if n >= self.HIGH and p not in self.paused:
+            self.paused.add(p)
+            notify(self.upper, 'Pause', p)
+        elif n <= self.LOW and p in self.paused:
+            self.paused.discard(p)
+            notify(self.upper, 'Resume', p)
 
-    def upon_Send(self, p, m):
-        mid = uuid.uuid4()
-        self.sent[(p, mid)] = m
-        trigger(self.fll, 'Send', p, {
-            'typ': 'data',
-            'mid': mid,
-            'data': m,
-            })
+    def upon_Pause(self, p):
+        self.held.add(p)
+
+    def upon_Resume(self, p):
+        self.held.discard(p)
+        self.push(p)
 
     def upon_Deliver(self, q, m):
         if m['typ'] == 'data':
@@ -86,9 +144,8 @@ class RetransmitWithACK(ABC):
                 })
         else:
             assert m['typ'] == 'ack'
-            k = (q, m['mid'])
-            if k in self.sent:
-                self.sent.pop(k)
+            if self.sent[q].pop(m['mid'], None) is not None:
+                self.push(q)
 
 
 @implements('PerfectPointToPointLinks')
@@ -107,12 +164,21 @@ class EliminateDuplicates(ABC):
     def upon_Send(self, p, m):
         trigger(self.sl, 'Send', p, m)
 
+    def upon_Shed(self, limit):
+        notify(self.sl, 'Shed', limit)
+
     def upon_Deliver(self, q, m):
-        h = hash(pickle.dumps(m))
+        h = hash((q, pickle.dumps(m)))
         if h not in self.delivered:
             self.delivered.add(h)
             trigger(self.upper, 'Deliver', q, m)
 
+    def upon_Pause(self, p):
+        notify(self.upper, 'Pause', p)
+
+    def upon_Resume(self, p):
+        notify(self.upper, 'Resume', p)
+
 
 @implements('LoggedPerfectPointToPointLinks')
 @uses('StubbornPointToPointLinks', 'sl')
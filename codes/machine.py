@@ -0,0 +1,171 @@
+"""
+State machines run by a replicated log
+
+A log decides the order of commands; a StateMachine gives them a meaning.
+`apply` takes the commands of consecutive positions in log order, as many
+as have run since it was last called, and returns their results; the
+log hands each result back with ExecuteReturn. A command that raises has
+the exception for its result: every replica raises it alike, and the
+commands after it run all the same. `snapshot` is the state of
+every command applied so far, for a process joining, and `restore` starts
+from one.
+
+Runner makes the calls on a machine one at a time, in the order they are
+made, each answered through a callback, with the result or, should the
+call raise, the exception:
+- on the loop itself, executor None, right away;
+- on a thread of its own, 'thread': the loop handles messages meanwhile,
+  as far as the machine lets go of the GIL;
+- in a process of its own, 'process', for machines that keep the CPU
+  busy: the machine lives there, built from its class, and commands and
+  results are pickled on their way.
+"""
+import hashlib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class StateMachine:
+    """runs nothing: commands are logged, their results None"""
+    def apply(self, cmds):
+        results = []
+        for cmd in cmds:
+            try:
+                results.append(self.execute(cmd))
+            except Exception as e:
+                log.info('command %s failed: %r', cmd, e)
+                results.append(e)
+        return results
+
+    def execute(self, cmd):
+        log.info('run command %s', cmd)
+
+    def snapshot(self):
+        return None
+
+    def restore(self, state):
+        pass
+
+
+class KeyValue(StateMachine):
+    """
+    a dict with ('set', key, value), ('get', key), ('add', key, n) and
+    ('del', key), each returning the value of key from before
+
+    A snapshot is taken copy-on-write: the keys are split into BUCKETS
+    dicts, a snapshot shares them all, and a bucket is copied the first
+    time one of its keys is written after that. Taking a snapshot thus
+    costs no more than the number of buckets, and neither stops nor slows
+    down commands still to come while it is sent: each copies at most the
+    buckets it writes.
+    """
+    BUCKETS = 256
+
+    def __init__(self):
+        self.buckets = [{} for _ in range(self.BUCKETS)]
+        self.shared = set()  # buckets a snapshot holds too
+
+    def bucket(self, key, write=False):
+        i = hash(key) % self.BUCKETS
+        if write and i in self.shared:
+            self.shared.discard(i)
+            self.buckets[i] = dict(self.buckets[i])
+        return self.buckets[i]
+
+    def execute(self, cmd):
+        if not isinstance(cmd, tuple):
+            return super().execute(cmd)
+        op, key, *args = cmd
+        old = self.bucket(key).get(key)
+        if op == 'set':
+            self.bucket(key, True)[key] = args[0]
+        elif op == 'add':
+            self.bucket(key, True)[key] = (old or 0) + args[0]
+        elif op == 'del':
+            self.bucket(key, True).pop(key, None)
+        return old
+
+    def snapshot(self):
+        self.shared = set(range(self.BUCKETS))
+        return tuple(self.buckets)
+
+    def restore(self, state):
+        self.__init__()
+        for bucket in state:
+            for key, value in bucket.items():
+                self.bucket(key)[key] = value
+
+
+class Digest(KeyValue):
+    """
+    a KeyValue busy with the CPU: ('hash', key, rounds) sets key to its
+    value hashed `rounds` times over and returns the result
+    """
+    def execute(self, cmd):
+        if not isinstance(cmd, tuple) or cmd[0] != 'hash':
+            return super().execute(cmd)
+        _, key, rounds = cmd
+        h = str(self.bucket(key).get(key)).encode()
+        for _ in range(rounds):
+            h = hashlib.sha256(h).digest()
+        self.bucket(key, True)[key] = h
+        return h
+
+
+_machine = None  # the machine of a process started by Runner
+
+
+def _start(cls):
+    global _machine
+    _machine = cls()
+
+
+def _call(method, *args):
+    return getattr(_machine, method)(*args)
+
+
+class Runner:
+    def __init__(self, cls, executor=None):
+        self.machine, self.pool = None, None
+        if executor == 'process':
+            self.pool = ProcessPoolExecutor(
+                1, initializer=_start, initargs=(cls,))
+        else:
+            self.machine = cls()
+            if executor == 'thread':
+                self.pool = ThreadPoolExecutor(1)
+
+    def call(self, callback, method, *args):
+        """callback(result) once the machine has run method(*args)"""
+        if self.pool is None:
+            try:
+                result = getattr(self.machine, method)(*args)
+            except Exception as e:
+                log.exception('%s failed', method)
+                result = e
+            callback(result)
+            return
+        loop = asyncio.get_event_loop()
+        if self.machine is None:
+            future = loop.run_in_executor(self.pool, _call, method, *args)
+        else:
+            future = loop.run_in_executor(
+                self.pool, getattr(self.machine, method), *args)
+        future.add_done_callback(lambda future: callback(self.outcome(
+            future, method)))
+
+    @staticmethod
+    def outcome(future, method):
+        """the result of a call, or the exception it raised"""
+        e = future.exception()
+        if e is not None:
+            log.error('%s failed: %r', method, e)
+            return e
+        return future.result()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,111 @@
+"""
+Many independent replicated logs in one process
+
+Data split into shards needs one log per shard, and a process running one
+log stack per shard pays for each of them separately: its own links,
+retransmissions, acknowledgements and failure detector, and a datagram
+for every message. MultiGroup hosts GROUPS logs, numbered from 0, on one
+stack instead. They share:
+- one transport: every message of a group goes out tagged with its group
+  id and is routed back to the group on the other side;
+- a coalesced message path: messages to the same process within LINGER
+  seconds leave as one datagram, BATCH messages at most, whatever their
+  group;
+- one failure detector: a single heartbeat per process and period for all
+  groups, whose suspicions reach every group;
+- flow control: Pause | p and Resume | p from the shared links reach every
+  group, and the links shed messages past the SHED of GROUP, as each group
+  catches up.
+
+Each group is a nested instance of GROUP, Mencius by default, so it
+builds no modules of its own.
+
+Module:
+  Name: MultiGroupStateMachine
+
+Events:
+  Request: <Execute | g, cmd[, cid]>: run cmd in the log of group g.
+  Indication: <ExecuteReturn | g, pos, result, cid>: our command cid ran in
+    group g at pos.
+  Indication: <Rejected | g, cid>, <Reconfigured | g, start, members>: see
+    MultiPaxos.
+"""
+import uuid
+import logging
+from collections import defaultdict
+
+from .basic import (
+    implements, uses, trigger, notify, start_timer, nested, Tagged, ABC)
+from .paxos import Mencius
+
+log = logging.getLogger(__name__)
+
+
+@implements('MultiGroupStateMachine')
+@uses('PerfectPointToPointLinks', 'link')
+@uses('EventuallyPerfectFailureDetector', 'fd')
+class MultiGroup(ABC):
+    GROUP = Mencius  # the ReplicatedStateMachine of each group
+    GROUPS = 16
+    BATCH = 64
+    LINGER = .001
+
+    def upon_Init(self):
+        self.beb = self.pl = self  # the links of every group, see Slot
+        self.out = defaultdict(list)  # p -> messages not sent yet
+        self.groups = [nested(self.GROUP, self, g, Tagged(self, g))
+                       for g in range(self.GROUPS)]
+        if self.GROUP.SHED:
+            notify(self.link, 'Shed', self.GROUP.SHED)
+
+    def upon_Execute(self, g, cmd, cid=None):
+        trigger(self.groups[g], 'Execute', cmd, cid)
+
+    def upon_ExecuteReturn(self, g, pos, result, cid):
+        trigger(self.upper, 'ExecuteReturn', g, pos, result, cid)
+
+    def upon_Rejected(self, g, cid):
+        trigger(self.upper, 'Rejected', g, cid)
+
+    def upon_Reconfigured(self, g, start, members):
+        trigger(self.upper, 'Reconfigured', g, start, members)
+
+    def upon_Broadcast(self, m):
+        for p in self.members:
+            self.upon_Send(p, m)
+
+    def upon_Send(self, p, m):
+        if not self.out:
+            start_timer(self.LINGER, self.upon_Flush)
+        self.out[p].append(m)
+
+    def upon_Flush(self):
+        out, self.out = self.out, defaultdict(list)
+        for p, ms in out.items():
+            for i in range(0, len(ms), self.BATCH):
+                trigger(self.link, 'Send', p, {
+                    'typ': 'batch',
+                    'mid': uuid.uuid4(),
+                    'ms': ms[i:i + self.BATCH],
+                    })
+
+    def upon_Deliver(self, q, m):
+        for m in m['ms']:
+            trigger(self.groups[m['pos']], 'Deliver', q, m['m'])
+
+    def upon_Suspect(self, p):
+        log.info('%s suspects %s in every group', self.addr, p)
+        for group in self.groups:
+            notify(group, 'Suspect', p)
+
+    def upon_Restore(self, p):
+        for group in self.groups:
+            notify(group, 'Restore', p)
+
+    def upon_Pause(self, p):
+        for group in self.groups:
+            notify(group, 'Pause', p)
+
+    def upon_Resume(self, p):
+        for group in self.groups:
+            notify(group, 'Resume', p)
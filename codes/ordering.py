@@ -4,7 +4,9 @@ from collections import defaultdict, OrderedDict
 
 log = logging.getLogger(__name__)
 
-from .basic import implements, uses, trigger, mhash, ABC
+from .basic import (
+    implements, uses, nests, trigger, start_timer, mhash, nested, Tagged,
+    ABC)
 
 
 @implements('FIFOReliableBroadcast')
@@ -114,3 +116,136 @@ class WaitingCausalBroadcast(ABC):
                     self.v[self.rank(q)] += 1
                     trigger(self.upper, 'Deliver', q, data)
                     goon = True
+
+
+@implements('TotalOrderBroadcast')
+@uses('ReliableBroadcast', 'rb')
+@uses('BestEffortBroadcast', 'beb')
+@uses('PerfectPointToPointLinks', 'pl')
+@uses('PerfectFailureDetector', 'p')
+@nests('Consensus', 'consensus')
+class ConsensusTotalOrder(ABC):
+    """
+    Algorithm 6.1: consensus-based total-order broadcast, in batches
+
+    Total order: if correct processes p and q both deliver m and m', then p
+    delivers m before m' if and only if q delivers m before m'.
+
+    Messages go out through rb; each consensus instance then orders a whole
+    batch of them, every id rb delivered and not yet ordered, at most BATCH.
+    Up to DEPTH instances run at once, each proposing what the ones still
+    open left out, and decisions are delivered in instance order, each
+    message once. A process joins an instance as soon as it hears of it,
+    proposing what it has, possibly nothing.
+
+    A batch is proposed as (-size, ids): consensus modules that decide the
+    smallest proposal they know of then pick the largest batch.
+
+    Instances are nested in this module: they share its links and its
+    failure detector.
+    """
+    BATCH = 1000
+    DEPTH = 2
+    LINGER = .005  # to let a batch fill before opening an instance
+
+    def upon_Init(self):
+        self.lsn = itertools.count(0)
+        self.unordered = OrderedDict()  # (origin, sn) -> data
+        self.delivered = set()
+        self.proposed = {}  # id -> instance it was proposed in
+        self.instances = {}
+        self.finished = OrderedDict()  # instances kept to answer laggards
+        self.decided = {}  # instance -> batch
+        self.next = 0  # first instance not delivered yet
+        self.opened = 0  # first instance not proposed in yet
+        self.crashed = set()
+        self.lingering = self.lingered = False
+
+    def upon_Broadcast(self, m):
+        trigger(self.rb, 'Broadcast', {
+            'typ': 'data',
+            'sn': next(self.lsn),
+            'origin': self.addr,
+            'data': m,
+            })
+
+    def upon_Crash(self, p):
+        self.crashed.add(p)
+        for c in self.instances.values():
+            trigger(c, 'Crash', p)
+
+    def batch(self, k):
+        ids = [i for i in self.unordered if i not in self.proposed]
+        ids = tuple(ids[:self.BATCH])
+        for i in ids:
+            self.proposed[i] = k
+        return (-len(ids), ids)
+
+    def propose(self):
+        """open instances while there are messages and room in the pipe"""
+        while (self.opened < self.next + self.DEPTH and
+               len(self.proposed) < len(self.unordered)):
+            if (len(self.unordered) - len(self.proposed) < self.BATCH and
+                    self.LINGER and not self.lingered):
+                if not self.lingering:
+                    self.lingering = True
+                    start_timer(self.LINGER, self.upon_Linger)
+                return
+            self.lingered = False
+            self.open(self.opened)
+
+    def upon_Linger(self):
+        self.lingering = False
+        self.lingered = True
+        self.propose()
+
+    def open(self, k):
+        while self.opened <= k:
+            c = nested(self.consensus, self, self.opened,
+                       Tagged(self, self.opened))
+            self.instances[self.opened] = c
+            for p in self.crashed:
+                trigger(c, 'Crash', p)
+            trigger(c, 'Propose', self.batch(self.opened))
+            self.opened += 1
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'slot':
+            k = m['pos']
+            if k >= self.opened:
+                self.open(k)
+            c = self.instances.get(k) or self.finished.get(k)
+            if c is not None:
+                trigger(c, 'Deliver', q, m['m'])
+        elif m['typ'] == 'data':
+            i = (m['origin'], m['sn'])
+            if i not in self.delivered:
+                self.unordered[i] = m['data']
+                self.deliver()
+                self.propose()
+
+    def upon_Decide(self, k, v):
+        self.decided[k] = v[1]
+        self.deliver()
+        self.propose()
+
+    def deliver(self):
+        while self.next in self.decided:
+            batch = self.decided[self.next]
+            if any(i not in self.unordered and i not in self.delivered
+                   for i in batch):
+                return  # rb has not delivered it here yet
+            for i in batch:
+                if i not in self.delivered:
+                    self.delivered.add(i)
+                    self.proposed.pop(i, None)
+                    trigger(self.upper, 'Deliver', i[0],
+                            self.unordered.pop(i))
+            del self.decided[self.next]
+            self.finished[self.next] = self.instances.pop(self.next)
+            if len(self.finished) > 4 * self.DEPTH:
+                self.finished.popitem(last=False)
+            for i, k in list(self.proposed.items()):
+                if k == self.next:
+                    del self.proposed[i]
+            self.next += 1
@@ -33,11 +33,21 @@ acceptor's accept(n, v) handler:
    else
         reply accept_reject
 """
+import math
 import uuid
+import bisect
+import asyncio
+import random
 import logging
-from collections import defaultdict
+import functools
+import itertools
+from collections import defaultdict, deque, OrderedDict, Counter
 
-from .basic import implements, uses, trigger, ABC
+from .basic import (
+    implements, uses, trigger, notify, start_timer, nested, Slot, ABC)
+from .quorum import Majority
+from .machine import StateMachine, Runner
+from .admission import Limit
 
 log = logging.getLogger(__name__)
 
@@ -49,7 +59,36 @@ class Synod(ABC):
     """
     Only proposer knows which value has been chosen
     If other servers want to know, must execute Paxos with their own proposal
+
+    An acceptor answers a prepare or an accept below the highest n it has
+    promised with a nack carrying that n. A proposer that gets one, or no
+    decision within TIMEOUT * 2^k seconds on its k-th retry, MAX_TIMEOUT at
+    most, starts a round above it after a random wait of up to BACKOFF * 2^k
+    seconds, MAX_BACKOFF at most, so that dueling proposers soon stop
+    overtaking each other, and a round soon lasts as long as the links take
+    to carry it: UDPProtocol delays each datagram up to DELAY seconds. With
+    DESIGNATED, only the highest ranked process proposes: the others hand it
+    their value and run rounds themselves only if nothing is decided within
+    FALLBACK seconds.
+
+    With FANOUT, acceptors broadcast accepted to every process instead of
+    answering the proposer, and each process decides once a majority has
+    accepted the same round: a message delay earlier, for N^2 messages
+    instead of 2N. A learner keeps one bitmask of acceptors per round and
+    drops them once it decides.
+
+    Promises and accepts are counted against QUORUMS (see quorum.py), by
+    default majorities.
     """
+    BACKOFF = .05
+    MAX_BACKOFF = 1
+    TIMEOUT = 1
+    MAX_TIMEOUT = 16
+    DESIGNATED = False
+    FALLBACK = 2
+    FANOUT = False
+    QUORUMS = Majority
+
     def upon_Init(self):
         # for proposer
         self.max_round = 0
@@ -57,10 +96,17 @@ class Synod(ABC):
         self.promises = defaultdict(set)
         self.accepted = defaultdict(set)
         self.chosen = False
+        self.value = None
+        self.current = None  # n of the round under way
+        self.retries = 0
         # for acceptor
         self.min_proposal = None
         self.accepted_proposal = None
         self.accepted_value = None
+        # for learner, with FANOUT
+        self.votes = {}  # n -> (bitmask of acceptors by rank, v)
+        self.ranks = {p: i for i, p in enumerate(sorted(self.members))}
+        self.quorums = self.QUORUMS(self.members)
 
     def nextn(self):
         self.max_round += 1
@@ -69,69 +115,168 @@ class Synod(ABC):
     def highest(self, promises):
         n, v = None, None
         for peer, (accn, accv) in promises:
-            if n is None or accn > n:
+            if accn is not None and (n is None or accn > n):
                 n = accn
                 v = accv
         return v
 
+    def designated(self):
+        return max(self.members)
+
     def upon_Propose(self, v):
         if self.chosen:
             return
-        n = self.nextn()
-        self.proposals[n] = v
-        log.info('%s propose n:%s, v:%s', self.addr, n, v)
+        self.value = v
+        if self.DESIGNATED and self.addr != self.designated():
+            trigger(self.fll, 'Send', self.designated(), {
+                'typ': 'propose',
+                'v': v,
+                })
+            start_timer(self.FALLBACK, self.upon_Retry)
+        else:
+            self.prepare()
+
+    def prepare(self):
+        n = self.current = self.nextn()
+        self.proposals[n] = self.value
+        log.info('%s propose n:%s, v:%s', self.addr, n, self.value)
         trigger(self.beb, 'Broadcast', {
             'typ': 'prepare',
             'n': n,
             })
+        start_timer(self.timeout(), self.backoff, n)
+
+    def timeout(self):
+        return min(self.TIMEOUT * 2 ** self.retries, self.MAX_TIMEOUT)
+
+    def backoff(self, n):
+        """give up round n, if still under way, and retry after a while"""
+        if self.chosen or n != self.current:
+            return
+        self.current = None
+        limit = min(self.BACKOFF * 2 ** self.retries, self.MAX_BACKOFF)
+        self.retries += 1
+        start_timer(random.uniform(0, limit), self.upon_Retry)
+
+    def upon_Retry(self):
+        if not self.chosen and self.current is None:
+            self.prepare()
 
     def upon_Deliver(self, q, m):
         n = m.get('n')
         if m['typ'] == 'promise':  # proposer
-            if n[0] > self.max_round:
-                self.max_round = n[0]
+            if n != self.current:
+                return
             p = self.promises[n]
+            if p is None:  # accept sent
+                return
             p.add((q, m['accepted']))
-            if len(p) > self.N / 2:
+            if self.quorums.phase1({peer for peer, _ in p}):
+                self.promises[n] = None
                 v = self.highest(p)
                 if v:
                     self.proposals[n] = v
                 else:
-                    # FIXME: KeyError raised here, I didn't find the bug
                     v = self.proposals[n]
                 trigger(self.beb, 'Broadcast', {
                     'typ': 'accept',
                     'n': n,
                     'v': v,
                     })
+        elif m['typ'] == 'accepted' and self.FANOUT:  # learner
+            self.learn(q, n, m['v'])
         elif m['typ'] == 'accepted':  # proposer
             p = self.accepted[n]
+            if p is None:  # decided sent
+                return
             p.add(q)
-            if len(p) > self.N / 2:
+            if self.quorums.phase2(p):
+                self.accepted[n] = None
                 trigger(self.beb, 'Broadcast', {
                     'typ': 'decided',
                     'v': self.proposals[n],
                     })
-        elif m['typ'] == 'prepare':  # acceptor
-            if self.min_proposal is None or n > self.min_proposal:
-                self.min_proposal = n
-            trigger(self.fll, 'Send', q, {
-                'typ': 'promise',
-                'n': self.min_proposal,
-                'accepted': (self.accepted_proposal, self.accepted_value),
-                })
-        elif m['typ'] == 'accept':  # acceptor
-            if self.min_proposal is None or n >= self.min_proposal:
+        elif m['typ'] == 'nack':  # proposer
+            self.max_round = max(self.max_round, m['max'][0])
+            self.backoff(n)
+        elif m['typ'] == 'propose':  # designated proposer
+            if not self.chosen and self.current is None:
+                self.value = m['v']
+                self.prepare()
+        elif m['typ'] in ('prepare', 'accept'):  # acceptor
+            if self.min_proposal is not None and n < self.min_proposal:
+                trigger(self.fll, 'Send', q, {
+                    'typ': 'nack',
+                    'n': n,
+                    'max': self.min_proposal,
+                    })
+            elif m['typ'] == 'prepare':
                 self.min_proposal = n
-                self.accepted_proposal = n
-                self.accepted_value = m['v']
                 trigger(self.fll, 'Send', q, {
-                    'typ': 'accepted',
+                    'typ': 'promise',
                     'n': n,
+                    'accepted': (self.accepted_proposal, self.accepted_value),
                     })
-        elif m['typ'] == 'decided' and not self.chosen:
+            else:
+                self.min_proposal = n
+                self.accepted_proposal = n
+                self.accepted_value = m['v']
+                if self.FANOUT:
+                    trigger(self.beb, 'Broadcast', {
+                        'typ': 'accepted',
+                        'n': n,
+                        'v': m['v'],
+                        })
+                else:
+                    trigger(self.fll, 'Send', q, {
+                        'typ': 'accepted',
+                        'n': n,
+                        })
+        elif m['typ'] == 'decided':
+            self.decide(m['v'])
+
+    def learn(self, q, n, v):
+        if self.chosen:
+            return
+        mask, v = self.votes.get(n, (0, v))
+        mask |= 1 << self.ranks[q]
+        self.votes[n] = (mask, v)
+        if self.quorums.phase2({p for p, i in self.ranks.items()
+                                if mask >> i & 1}):
+            self.decide(v)
+
+    def decide(self, v):
+        if not self.chosen:
             self.chosen = True
-            trigger(self.upper, 'Decide', m['v'])
+            self.votes = {}
+            trigger(self.upper, 'Decide', v)
+
+
+class OwnedSynod(Synod):
+    """
+    Synod for an instance owned by one process: round (0, owner) comes
+    before any other, so the owner proposes in it straight away, one accept
+    round, without phase 1. Anyone else starts with phase 1 as usual.
+    """
+    def upon_Init(self, owner):
+        super().upon_Init()
+        self.owner = owner
+
+    def upon_Propose(self, v):
+        if self.chosen:
+            return
+        if self.addr != self.owner or self.max_round or self.current:
+            super().upon_Propose(v)
+            return
+        n = self.current = (0, self.addr)
+        self.value = self.proposals[n] = v
+        self.promises[n] = None
+        trigger(self.beb, 'Broadcast', {
+            'typ': 'accept',
+            'n': n,
+            'v': v,
+            })
+        start_timer(self.timeout(), self.backoff, n)
 
 
 @implements('ReplicatedStateMachine')
@@ -148,38 +293,780 @@ class MultiPaxos(ABC):
     - ensuring full replication
     - client protocol
     - configuration changes
+
+    One Synod instance decides each position; once decided only the
+    decision is kept. Members change through the log, ALPHA positions
+    after the change is decided, and a process added gets a snapshot.
+
+    Request: Execute | cmd[, cid], Reconfigure | members, Join
+    Indication: ExecuteReturn | pos, result, cid, Rejected | cid,
+                Reconfigured | start, members
     """
+    NOOP = None  # fills a position without a command
+    RECONFIG = 'reconfig'  # commands (RECONFIG, members) change members
+    ALPHA = 256  # positions from a change being decided to it taking effect
+    # retries with cids (client, seq, low) are answered from the results
+    # kept for this many clients heard from last
+    SESSIONS = 4096
+    MACHINE = StateMachine
+    EXECUTOR = None  # see Runner
+    LIMIT = None  # a Limit class, None lets every command in
+    QUEUE = 0  # commands waiting past LIMIT, any more are Rejected
+    # members the links Pause for that we run on without, None: as many as
+    # leave a phase 2 quorum; past it commands wait as past LIMIT
+    LAG = None
+    CATCHUP = 1  # positions undecided for two periods of it get a NOOP
+    # messages under way to a member past which the links drop them, as a
+    # member that falls behind catches up, see Shed in RetransmitWithACK
+    SHED = 16384
+    QUORUMS = Majority  # of the Synod instances, see quorum.py
+    _synods = {}  # (Synod class, QUORUMS) -> subclass counting against it
+
     def upon_Init(self):
+        self.mine = {}  # request -> cid of our own commands not run yet
+        # client -> [low, {seq: [pos, result]}]
+        self.sessions = OrderedDict()
+        self.runner = Runner(self.MACHINE, self.EXECUTOR)
+        self.applying = deque()  # (pos, cid, cmd) run, result not known
+        self.busy = False  # the machine has something of ours
+        self.answers = defaultdict(list)  # pos -> cids to answer with it
+        self.snapshots = deque()  # snapshots to send, see _run_cmds
+        self.limit = self.LIMIT() if self.LIMIT else Limit(math.inf)
+        self.admitted = {}  # request -> when our command under way got in
+        self.backlog = deque()  # (cid, cmd) waiting to be let in
+        self.paused = Counter()  # p -> links that hold back for p
         self.pending = {}
         self.logs = {}
         self.last_pos = 0
         self.next_cmd_pos = 0
+        self.instances = {}
+        self.decided = {}
+        # [(first position, members in address order)], [] until joined
+        self.configs = [(0, sorted(self.members))]
+        self.joining = {}  # first position -> processes to send it to
+        self.queued = []  # (cid, cmd) waiting for a position
+        self.early = defaultdict(list)  # pos -> [(q, m)] past the horizon
+        self.holes = set()  # positions found undecided at the last CatchUp
+        if self.CATCHUP:
+            start_timer(self.CATCHUP, self.upon_CatchUp)
+        if self.SHED:
+            notify(self.pl, 'Shed', self.SHED)
+            notify(self.beb, 'Shed', self.SHED)
+
+    def config(self, pos):
+        """(first position, members) of the configuration running pos"""
+        i = bisect.bisect_right([start for start, _ in self.configs], pos)
+        return self.configs[i - 1]
+
+    def horizon(self):
+        """the first position whose members may still change"""
+        if not self.configs:
+            return -1
+        return self.next_cmd_pos + self.ALPHA
+
+    def synod(self, cls):
+        """cls counting against our QUORUMS"""
+        if cls.QUORUMS is self.QUORUMS:
+            return cls
+        key = (cls, self.QUORUMS)
+        if key not in self._synods:
+            self._synods[key] = type(
+                cls.__name__, (cls,), {'QUORUMS': self.QUORUMS})
+        return self._synods[key]
+
+    def instance(self, pos):
+        c = self.instances.get(pos)
+        if c is None:
+            members = self.config(pos)[1]
+            c = self.instances[pos] = nested(
+                self.synod(Synod), self, pos,
+                peers=set(members) - {self.addr})
+        return c
+
+    def upon_Execute(self, cmd, cid=None):
+        cid = cid or uuid.uuid4().hex
+        request = self.request(cid)
+        ran = self.answered(cid)
+        if ran is not None:
+            self.answers[ran[0]].append(cid)
+            if ran[0] < self.settled():
+                self.reply(ran[0], ran[1])
+        elif request in self.mine:
+            self.mine[request] = cid
+        elif self.retired():
+            trigger(self.upper, 'Rejected', cid)
+        elif self.room() and not self.backlog:
+            self.mine[request] = cid
+            self.admit(cid, cmd)
+        elif len(self.backlog) < self.QUEUE:
+            self.mine[request] = cid
+            self.backlog.append((cid, cmd))
+        else:
+            trigger(self.upper, 'Rejected', cid)
+
+    def retired(self):
+        """whether we were removed from the members"""
+        return bool(self.configs) and self.addr not in self.configs[-1][1]
+
+    def reject(self, cid):
+        self.mine.pop(self.request(cid), None)
+        self.admitted.pop(self.request(cid), None)
+        trigger(self.upper, 'Rejected', cid)
 
-    def upon_Execute(self, cmd):
-        cid = uuid.uuid4().hex
+    def room(self):
+        """whether a command of ours may get in now"""
+        if len(self.admitted) >= self.limit.limit:
+            return False
+        members = self.configs[-1][1] if self.configs else ()
+        if self.LAG is None:
+            return not members or self.QUORUMS(members).phase2(
+                [p for p in members if self.paused[p] <= 0])
+        return sum(self.paused[p] > 0 for p in members) <= self.LAG
+
+    def admit(self, cid, cmd):
+        self.admitted[self.request(cid)] = asyncio.get_event_loop().time()
         self._propose(cid, cmd)
 
-    def _propose(self, cid, cmd):
-        pos = self.last_pos
-        self.last_pos += 1
-        # FIXME: bug here, there isn't corresponding link name inside each peer
-        c = Synod('consensus.%s' % pos, self, self._udp,
-                  self.addr, self.peers)
-        self.pending[pos] = (cid, cmd, c)
-        trigger(c, 'Propose', (pos, cid, cmd))
+    def drain(self):
+        """let in what waits, as far as there is room"""
+        while self.backlog and self.room():
+            self.admit(*self.backlog.popleft())
+
+    def upon_Pause(self, p):
+        self.paused[p] += 1
+
+    def upon_Resume(self, p):
+        self.paused[p] -= 1
+        self.drain()
+
+    @staticmethod
+    def request(cid):
+        """what a command goes by: (client, seq) in a session"""
+        return cid[:2] if isinstance(cid, tuple) else cid
+
+    def answered(self, cid):
+        """[pos, result] of the command of a session cid, if it ran"""
+        if isinstance(cid, tuple):
+            client, seq, _ = cid
+            return self.sessions.get(client, (0, {}))[1].get(seq)
+
+    def session(self, pos, cid):
+        """
+        the position the command of a session cid ran at first: pos unless
+        it came up before, None if its client waits for it no more
+        """
+        client, seq, low = cid
+        session = self.sessions.pop(client, None) or [0, {}]
+        self.sessions[client] = session  # heard from last
+        if len(self.sessions) > self.SESSIONS:
+            self.sessions.popitem(last=False)
+        if low > session[0]:
+            session[0] = low
+            session[1] = {s: e for s, e in session[1].items() if s >= low}
+        if seq < session[0]:
+            return None
+        return session[1].setdefault(seq, [pos, None])[0]
+
+    def upon_Reconfigure(self, members):
+        self._propose(uuid.uuid4().hex, (self.RECONFIG, sorted(members)))
+
+    def upon_Join(self):
+        self.configs = []
+
+    def _propose(self, cid, cmd, pos=None):
+        if pos is None:
+            if self.last_pos >= self.horizon():
+                self.queued.append((cid, cmd))
+                return
+            pos = self.last_pos
+            self.last_pos += 1
+        self.pending[pos] = (cid, cmd)
+        trigger(self.instance(pos), 'Propose', (pos, cid, cmd))
+
+    def position(self, m):
+        """the position a message is about"""
+        return m['pos']
+
+    def upon_CatchUp(self):
+        horizon = self.horizon()
+        # messages waiting past the horizon tell those below were decided
+        upto = horizon if self.early else min(self.last_pos, horizon)
+        holes = {pos for pos in range(self.next_cmd_pos, upto)
+                 if pos not in self.decided and pos not in self.pending and
+                 self.addr in self.config(pos)[1]}
+        for pos in sorted(holes if self.early else holes & self.holes):
+            self._propose(uuid.uuid4().hex, self.NOOP, pos)
+        self.holes = holes
+        start_timer(self.CATCHUP, self.upon_CatchUp)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'snapshot':
+            if not self.configs:
+                self.install(m)
+        elif self.position(m) >= self.horizon():
+            self.early[self.position(m)].append((q, m))
+        else:
+            self.deliver(q, m)
+
+    def deliver(self, q, m):
+        pos, m = m['pos'], m['m']
+        members = self.config(pos)[1]
+        if self.addr not in members or q not in members:
+            return
+        if pos not in self.decided:
+            trigger(self.instance(pos), 'Deliver', q, m)
+        elif m['typ'] in ('prepare', 'accept'):
+            trigger(self.pl, 'Send', q, Slot(self, pos).wrap({
+                'typ': 'decided',
+                'v': self.decided[pos],
+                }))
 
     def upon_Decide(self, v):
         pos, cid1, cmd1 = v
-        cid2, cmd2, consensus = self.pending[pos]
+        self.decided[pos] = v
+        self.instances.pop(pos, None)
+        self.last_pos = max(self.last_pos, pos + 1)
         self.logs[pos] = (cid1, cmd1)
-        del consensus
-        if cid1 != cid2:
-            # propose another place for cmd2, since it failed to put it in pos
-            self._propose(cid2, cmd2)
+        if pos in self.pending:
+            cid2, cmd2 = self.pending.pop(pos)
+            if cid1 != cid2 and cmd2 is not self.NOOP:
+                # propose another place for cmd2, since it failed to put it
+                # in pos
+                if self.retired():
+                    self.reject(cid2)
+                else:
+                    self._propose(cid2, cmd2)
         self._run_cmds()
 
     def _run_cmds(self):
+        ran = self.next_cmd_pos
         while self.next_cmd_pos in self.logs:
             cid, cmd = self.logs.pop(self.next_cmd_pos)
-            log.info('run command cid:%s, cmd:%s', cid, cmd)
+            self._apply(self.next_cmd_pos, cid, cmd)
             self.next_cmd_pos += 1
+            joining = self.joining.pop(self.next_cmd_pos, None)
+            if joining:
+                # sessions as of now, their results filled in once known
+                self.snapshots.append((
+                    self.next_cmd_pos, joining, list(self.configs),
+                    [(c, low, dict(ran))
+                     for c, (low, ran) in self.sessions.items()]))
+        if self.next_cmd_pos != ran:
+            self.feed()
+            self.release()
+
+    def release(self):
+        """go on with what waited for the horizon to move"""
+        horizon = self.horizon()
+        for pos in sorted(pos for pos in self.early if pos < horizon):
+            for q, m in self.early.pop(pos, ()):
+                self.deliver(q, m)
+        queued, self.queued = self.queued, []
+        for cid, cmd in queued:
+            self._propose(cid, cmd)
+
+    def _apply(self, pos, cid, cmd):
+        first = self.session(pos, cid) if isinstance(cid, tuple) else pos
+        mine = self.mine.pop(self.request(cid), None)
+        if first is None:
+            self.admitted.pop(self.request(cid), None)
+        elif mine is not None:
+            self.answers[first].append(mine)
+            if first < self.settled():
+                self.reply(first, self.answered(cid)[1])
+        if first == pos:
+            self.run(pos, cid, cmd)
+
+    def run(self, pos, cid, cmd):
+        if self.reconfig(cmd):
+            self.reconfigure(pos, cmd[1])
+        self.applying.append((pos, cid, cmd))
+
+    def reconfig(self, cmd):
+        return isinstance(cmd, tuple) and cmd[:1] == (self.RECONFIG,)
+
+    def settled(self):
+        """the first position whose result is not known yet"""
+        return self.applying[0][0] if self.applying else self.next_cmd_pos
+
+    def feed(self):
+        """give the machine what it is to do next, unless it is busy"""
+        if self.busy:
+            return
+        if self.snapshots and self.settled() >= self.snapshots[0][0]:
+            self.busy = True
+            self.runner.call(self.send_snapshot, 'snapshot')
+            return
+        upto = self.snapshots[0][0] if self.snapshots else self.next_cmd_pos
+        batch = list(itertools.takewhile(
+            lambda e: e[0] < upto, self.applying))
+        if not batch:
+            return
+        cmds = [cmd for _, _, cmd in batch
+                if cmd is not self.NOOP and not self.reconfig(cmd)]
+        self.busy = True
+        if cmds:
+            self.runner.call(
+                functools.partial(self.applied, batch), 'apply', cmds)
+        else:
+            self.applied(batch, [])
+
+    def applied(self, batch, results):
+        if isinstance(results, Exception):  # the machine failed as a whole
+            results = [results] * len(batch)
+        results = iter(results)
+        for pos, cid, cmd in batch:
+            self.applying.popleft()
+            result = None
+            if cmd is not self.NOOP and not self.reconfig(cmd):
+                result = next(results)
+            ran = self.answered(cid)
+            if ran is not None and ran[0] == pos:
+                ran[1] = result
+            self.reply(pos, result)
+        self.done()
+
+    def reply(self, pos, result):
+        now = asyncio.get_event_loop().time()
+        for cid in self.answers.pop(pos, ()):
+            trigger(self.upper, 'ExecuteReturn', pos, result, cid)
+            admitted = self.admitted.pop(self.request(cid), None)
+            if admitted is not None:
+                self.limit.sample(now - admitted, len(self.admitted))
+        self.drain()
+
+    def done(self):
+        self.busy = False
+        self.feed()
+
+    def send_snapshot(self, state):
+        start, processes, configs, sessions = self.snapshots.popleft()
+        if isinstance(state, Exception):
+            log.error('%s: no snapshot for %s', self.addr, processes)
+            self.done()
+            return
+        sessions = [(c, [low, {s: list(e) for s, e in ran.items()}])
+                    for c, low, ran in sessions]
+        for p in processes:
+            trigger(self.pl, 'Send', p, {
+                'typ': 'snapshot',
+                'pos': start,
+                'configs': configs,
+                'sessions': sessions,
+                'state': state,
+                })
+        self.done()
+
+    def reconfigure(self, pos, members):
+        start, old = pos + self.ALPHA, self.configs[-1][1]
+        log.info('%s: %s from position %s', self.addr, members, start)
+        self.configs.append((start, members))
+        if self.addr in old:
+            self.joining[start] = set(members) - set(old)
+        if self.retired():
+            # no position is left for what waits for one
+            for cid, _ in self.queued + list(self.backlog):
+                self.reject(cid)
+            self.queued, self.backlog = [], deque()
+        trigger(self.upper, 'Reconfigured', start, members)
+
+    def install(self, m):
+        log.info('%s joins at position %s', self.addr, m['pos'])
+        self.configs = m['configs']
+        self.sessions = OrderedDict(m['sessions'])
+        self.next_cmd_pos = self.last_pos = m['pos']
+        self.busy = True
+        self.runner.call(lambda _: self.done(), 'restore', m['state'])
+        self.release()
+
+
+@implements('ReplicatedStateMachine')
+class Mencius(MultiPaxos):
+    """
+    MultiPaxos with positions owned in turn (Mao et al., OSDI 2008):
+    position i belongs to the (i mod N)-th process in address order, the
+    only one to propose a command there. Proposers never collide, and an
+    owner commits its command with a single accept round (see OwnedSynod).
+    After a change of members, positions are owned in turn among the new
+    members from the first position of the new configuration on.
+
+    A process that sees a proposal at position i gives up its own unused
+    positions below i. They become NOOP right away: the owner proposes
+    nothing else there, and nobody else may propose anything but NOOP. Such
+    skips are sent together once per step, as ranges, without any round of
+    consensus. Everyone gives up its positions before the first one of a
+    new configuration as soon as it runs the change.
+
+    A position still undecided below the last decided one for RETRY
+    seconds is revoked: the process after its owner runs Synod for NOOP
+    there, the next one a RETRY later, and so on. Whoever revokes a
+    position suspects its owner and revokes its positions below every
+    later proposal at once, until the owner is heard from again. A command
+    of ours that lost its position to a revocation goes to our next one.
+
+    Suspect | p and Restore | p from a failure detector, if some upper
+    layer passes them on, make p a suspect right away or clear it.
+    """
+    RETRY = 1
+    CATCHUP = None  # revoking takes its place
+
+    def upon_Init(self):
+        super().upon_Init()
+        self.next_own = 0  # none of our positions below is unused
+        self.skips = []  # (lo, hi) ranges of ours skipped, not sent yet
+        self.waited = {}  # pos -> retries it has been stuck for
+        self.suspects = set()
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def owner(self, pos):
+        start, members = self.config(pos)
+        return members[(pos - start) % len(members)]
+
+    def owned(self, p, lo, hi):
+        """the positions of p from lo to hi"""
+        for k, (start, members) in enumerate(self.configs):
+            end = self.configs[k + 1][0] if k + 1 < len(self.configs) else hi
+            a, b = max(lo, start), min(hi, end)
+            if a < b and p in members:
+                n = len(members)
+                yield from range(
+                    a + (members.index(p) - (a - start)) % n, b, n)
+
+    def instance(self, pos):
+        c = self.instances.get(pos)
+        if c is None:
+            members = self.config(pos)[1]
+            c = self.instances[pos] = nested(
+                self.synod(OwnedSynod), self, pos,
+                initargs=(self.owner(pos),),
+                peers=set(members) - {self.addr})
+        return c
+
+    def _propose(self, cid, cmd, pos=None):
+        if pos is None:
+            pos = next(self.owned(self.addr, self.next_own, self.horizon()),
+                       None)
+            if pos is None:
+                self.queued.append((cid, cmd))
+                return
+            self.next_own = pos + 1
+        super()._propose(cid, cmd, pos)
+
+    def skip(self, upto):
+        """give up our unused positions below upto"""
+        lo, upto = self.next_own, min(upto, self.horizon())
+        if upto <= lo:
+            return
+        self.next_own = upto
+        if next(self.owned(self.addr, lo, upto), None) is None:
+            return
+        if not self.skips:
+            trigger(self, 'Flush')
+        if self.skips and self.skips[-1][1] == lo:
+            lo = self.skips.pop()[0]
+        self.skips.append((lo, upto))
+        self.fill(self.addr, lo, upto)
+
+    def fill(self, p, lo, hi):
+        for pos in self.owned(p, lo, hi):
+            if pos not in self.decided:
+                self.upon_Decide((pos, None, self.NOOP))
+
+    def upon_Flush(self):
+        skips, self.skips = self.skips, []
+        members = set()
+        for start, ms in reversed(self.configs):
+            members.update(ms)
+            if start <= self.next_cmd_pos:
+                break
+        for p in members:
+            trigger(self.pl, 'Send', p, {'typ': 'skip', 'ranges': skips})
+
+    def revoke(self, pos):
+        if pos not in self.decided and pos not in self.pending:
+            self.suspects.add(self.owner(pos))
+            self._propose(uuid.uuid4().hex, self.NOOP, pos)
+
+    def upon_Retry(self):
+        for pos in range(self.next_cmd_pos,
+                         min(self.last_pos, self.horizon())):
+            members, owner = self.config(pos)[1], self.owner(pos)
+            if pos in self.decided or owner == self.addr:
+                continue
+            if self.addr not in members:
+                continue
+            waited = self.waited[pos] = self.waited.get(pos, -1) + 1
+            turn = members.index(self.addr) - members.index(owner) - 1
+            if waited > turn % len(members):
+                self.revoke(pos)
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def revoke_all(self, p, upto):
+        """revoke the positions of p below upto"""
+        for pos in self.owned(p, self.next_cmd_pos,
+                              min(upto, self.horizon())):
+            self.revoke(pos)
+
+    def upon_Suspect(self, p):
+        if p != self.addr:
+            self.suspects.add(p)
+            self.revoke_all(p, self.last_pos)
+
+    def upon_Restore(self, p):
+        self.suspects.discard(p)
+
+    def position(self, m):
+        if m['typ'] == 'skip':
+            return max(hi for _, hi in m['ranges']) - 1
+        return super().position(m)
+
+    def deliver(self, q, m):
+        if m['typ'] == 'skip':
+            self.suspects.discard(q)
+            for lo, hi in m['ranges']:
+                self.fill(q, lo, hi)
+            return
+        pos, typ = m['pos'], m['m']['typ']
+        if q not in self.config(pos)[1]:
+            return
+        if typ == 'accept' and m['m']['n'] == (0, q):
+            self.suspects.discard(q)
+        if typ in ('accept', 'decided'):
+            self.skip(pos)
+            for p in sorted(self.suspects):
+                self.revoke_all(p, pos)
+        super().deliver(q, m)
+
+    def upon_Decide(self, v):
+        pos, cid, _ = v
+        if pos in self.decided:
+            return
+        self.waited.pop(pos, None)
+        if cid is not None:
+            self.skip(pos)
+        super().upon_Decide(v)
+
+    def reconfigure(self, pos, members):
+        super().reconfigure(pos, members)
+        self.skip(pos + self.ALPHA)
+
+    def install(self, m):
+        self.next_own = m['pos']
+        super().install(m)
+
+
+@implements('ReplicatedStateMachine')
+@uses('ReadLease', 'lease')
+class LeasedMultiPaxos(MultiPaxos):
+    """
+    MultiPaxos with one proposer, the lease holder, and reads off the log
+
+    Commands go to the leader of the current epoch, which proposes them
+    while it holds a lease. Acceptors backing a lease ignore prepare and
+    accept from anyone but the holder, so nothing enters the log behind its
+    back. They report the highest position they accepted with their grants;
+    a new holder fills every position up to there before it serves reads.
+
+    Request: Execute | cmd[, cid], Read
+    Indication: ExecuteReturn | pos, result, cid, ReadReturn | pos
+
+    ReadReturn(pos) comes once every position below pos has been applied
+    here and no command completed before the read started is above it. The
+    holder answers from its own log once it has applied every position it
+    proposed before the read; anyone else asks the holder for that
+    position, one round trip. With LOCAL_READS off a read goes through the
+    log.
+
+    Leases are granted by majorities, so QUORUMS other than Majority are
+    refused: a phase 2 quorum could leave out every process backing the
+    lease. For the same reason members are fixed: the lease does not follow
+    Reconfigure.
+    """
+    LOCAL_READS = True
+    RETRY = 1
+    WINDOW = 4096  # commands remembered after they ran, to run each once
+
+    def __init__(self, *args, **kwargs):
+        if self.QUORUMS is not Majority:
+            raise ValueError('leases need majority quorums, not %s' % (
+                self.QUORUMS,))
+        super().__init__(*args, **kwargs)
+
+    def upon_Init(self):
+        super().upon_Init()
+        self.led = None  # ts of the epoch this process took over the log in
+        self.waiting = []  # (cid, cmd) to propose once there is a lease
+        self.forwarded = {}  # cid -> (cmd, leader it went to)
+        self.held = []  # (q, mid, pos) reads at the holder
+        self.asked = {}  # mid -> leader asked for a read position
+        self.reads = {}  # mid -> position to run up to, None until known
+        self.stuck = set()
+        self.accepted_upto = -1
+        self.ran = OrderedDict()
+        trigger(self.lease, 'Info', self.accepted_upto)
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def leader(self):
+        return self.lease.epoch[1]
+
+    def leading(self):
+        return self.led == self.lease.epoch[0] and self.lease.valid()
+
+    def submit(self, cid, cmd):
+        leader = self.leader()
+        if self.leading():
+            super()._propose(cid, cmd)
+        elif leader in (None, self.addr):
+            self.waiting.append((cid, cmd))
+        else:
+            self.forwarded[cid] = (cmd, leader)
+            trigger(self.pl, 'Send', leader, {
+                'typ': 'forward',
+                'cid': cid,
+                'cmd': cmd,
+                })
+
+    def _propose(self, cid, cmd, pos=None):
+        if pos is None and not self.leading():
+            self.submit(cid, cmd)
+        else:
+            super()._propose(cid, cmd, pos)
+
+    def upon_Read(self):
+        mid = uuid.uuid4().hex
+        self.reads[mid] = None
+        if self.LOCAL_READS:
+            self.ask(mid)
+        else:
+            self.submit(mid, self.NOOP)
+
+    def ask(self, mid):
+        leader = self.asked[mid] = self.leader()
+        if leader == self.addr:
+            self.held.append((self.addr, mid, self.last_pos))
+            self.serve()
+        elif leader is not None:
+            trigger(self.pl, 'Send', leader, {'typ': 'read', 'mid': mid})
+
+    def serve(self):
+        if self.held and self.leading():
+            held, self.held = self.held, []
+            for q, mid, pos in held:
+                if self.settled() < pos:
+                    self.held.append((q, mid, pos))
+                elif q == self.addr:
+                    self.answer(mid, pos)
+                else:
+                    trigger(self.pl, 'Send', q, {
+                        'typ': 'readpos',
+                        'mid': mid,
+                        'pos': pos,
+                        })
+        for mid, pos in list(self.reads.items()):
+            if pos is not None and pos <= self.settled():
+                self.reads.pop(mid)
+                trigger(self.upper, 'ReadReturn', pos)
+
+    def answer(self, mid, pos):
+        if self.asked.pop(mid, None) is not None:
+            self.reads[mid] = pos
+
+    def upon_Lease(self, infos):
+        if self.led != self.lease.epoch[0]:
+            self.take_over(max(infos) + 1)
+        # once the lease counts as valid
+        trigger(self, 'Serve')
+
+    def upon_Serve(self):
+        self.serve()
+
+    def take_over(self, upto):
+        log.info('%s takes over the log up to %s', self.addr, upto)
+        self.led = self.lease.epoch[0]
+        self.last_pos = max(self.last_pos, upto)
+        for pos in range(self.next_cmd_pos, self.last_pos):
+            if pos in self.pending:
+                self.repropose(pos)
+            elif pos not in self.decided:
+                super()._propose(uuid.uuid4().hex, self.NOOP, pos)
+        waiting, self.waiting = self.waiting, []
+        for cid, cmd in waiting:
+            super()._propose(cid, cmd)
+
+    def repropose(self, pos):
+        cid, cmd = self.pending[pos]
+        trigger(self.instance(pos), 'Propose', (pos, cid, cmd))
+
+    def upon_Retry(self):
+        leader = self.leader()
+        waiting, self.waiting = self.waiting, []
+        for cid, cmd in waiting:
+            self.submit(cid, cmd)
+        for cid, (cmd, to) in list(self.forwarded.items()):
+            if to != leader:
+                self.submit(cid, cmd)
+        for mid, to in list(self.asked.items()):
+            if to != leader:
+                self.ask(mid)
+        if self.leading():
+            for pos in self.stuck & set(self.pending):
+                self.repropose(pos)
+            self.stuck = set(self.pending)
+        elif leader not in (None, self.addr):
+            # proposed while holding an earlier lease
+            for pos in self.pending:
+                trigger(self.pl, 'Send', leader, {
+                    'typ': 'fill',
+                    'mid': uuid.uuid4(),
+                    'pos': pos,
+                    })
+        start_timer(self.RETRY, self.upon_Retry)
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'slot':
+            pos, typ = m['pos'], m['m']['typ']
+            if typ in ('prepare', 'accept') and pos not in self.decided:
+                holder, left = self.lease.promise()
+                if holder not in (None, q) and left > 0:
+                    return
+                if typ == 'accept' and pos > self.accepted_upto:
+                    self.accepted_upto = pos
+                    trigger(self.lease, 'Info', pos)
+            super().upon_Deliver(q, m)
+        elif m['typ'] == 'forward':
+            self.submit(m['cid'], m['cmd'])
+        elif m['typ'] == 'fill':
+            pos = m['pos']
+            if (self.leading() and pos not in self.decided and
+                    pos not in self.pending):
+                self.last_pos = max(self.last_pos, pos + 1)
+                super()._propose(uuid.uuid4().hex, self.NOOP, pos)
+        elif m['typ'] == 'read':
+            if self.leader() == self.addr:
+                self.held.append((q, m['mid'], self.last_pos))
+                self.serve()
+        elif m['typ'] == 'readpos':
+            self.answer(m['mid'], m['pos'])
+            self.serve()
+
+    def upon_Decide(self, v):
+        pos, cid, _ = v
+        mine = self.pending.get(pos)
+        super().upon_Decide(v)
+        if mine and mine[0] != cid and mine[0] in self.reads:
+            self.submit(*mine)
+
+    def applied(self, batch, results):
+        super().applied(batch, results)
+        self.serve()
+
+    def _apply(self, pos, cid, cmd):
+        self.forwarded.pop(cid, None)
+        if cid in self.ran:  # resubmitted after a change of leader
+            return
+        self.ran[cid] = pos
+        if len(self.ran) > self.WINDOW:
+            self.ran.popitem(last=False)
+        if cid in self.reads:
+            self.reads[cid] = pos + 1
+        super()._apply(pos, cid, cmd)
@@ -4,18 +4,25 @@ import argparse
 import random
 
 from .basic import UDPProtocol, trigger
+from .stream import StreamTransport
 from .consensus import LeaderBasedEpochChange
 from .failure_detector import IncreasingTimeout
 from .paxos import Synod, MultiPaxos
+from .multigroup import MultiGroup
+from .client import RSM, serve
+from .machine import KeyValue
 
 log = logging.getLogger(__name__)
 
 
 class Proc:
-    def __init__(self, addr, peers):
+    def __init__(self, addr, peers, transport='udp'):
         self.pid = str(addr[1])
         self.set_members(addr, peers)
-        self.create_transport(UDPProtocol, addr)
+        if transport == 'tcp':
+            self.create_stream_transport(addr)
+        else:
+            self.create_transport(UDPProtocol, addr)
 
     def set_members(self, addr, peers):
         self.addr = addr
@@ -29,6 +36,12 @@ class Proc:
         self.protocol.addr = addr
         log.info('listen at %s', addr)
 
+    def create_stream_transport(self, addr):
+        loop = asyncio.get_event_loop()
+        self.transport = self.protocol = StreamTransport(addr)
+        loop.run_until_complete(self.protocol.listen())
+        log.info('listen at %s over tcp', addr)
+
 
 class Admin:
     def connection_made(self, transport):
@@ -39,26 +52,47 @@ class Admin:
 
     def datagram_received(self, data, peer):
         # select serveral procs to propose random values
-        for pid in random.sample(range(7), int(data)):
+        for pid in random.sample(sorted(self.procs), int(data)):
             proc = self.procs[pid]
             v = chr(65+random.randint(0, 25))
-            trigger(proc.con, 'Execute', v)
+            if proc.groups:
+                g = random.randrange(proc.groups)
+                trigger(proc.con, 'Execute', g, v)
+            else:
+                trigger(proc.con, 'Execute', v)
 
 
 class Test(Proc):
-    def __init__(self, *args, **kw):
+    def __init__(self, *args, groups=0, executor=None, **kw):
         super().__init__(*args, **kw)
+        self.groups = groups
         cls = IncreasingTimeout
         cls = LeaderBasedEpochChange
         cls = Synod
         cls = MultiPaxos
-        self.con = cls(
-            'con', self, self.protocol,
+        cls = type('MultiPaxos', (MultiPaxos,), {
+            'MACHINE': KeyValue,
+            'EXECUTOR': executor,
+            })
+        if groups:
+            cls = type('MultiGroup', (MultiGroup,), {'GROUPS': groups})
+        self.rsm = RSM(upper=self)
+        self.con = self.rsm.module = cls(
+            'con', self.rsm, self.protocol,
             self.addr, self.peers)
 
     def upon_StartEpoch(self, ts, leader):
         log.info('%s start epoch at ts %s', leader, ts)
 
+    def upon_ExecuteReturn(self, *attrs):
+        log.info('Executed: %s, %s', attrs, self.addr)
+
+    def upon_Rejected(self, *attrs):
+        log.info('Rejected: %s, %s', attrs, self.addr)
+
+    def upon_Reconfigured(self, *attrs):
+        log.info('Reconfigured: %s, %s', attrs, self.addr)
+
     def upon_Decide(self, v):
         log.info('Decision: %s, %s', v, self.addr)
 
@@ -94,6 +128,15 @@ def parse_args():
     p.add_argument('-a', '--all-in-one', action='store_true')
     p.add_argument('-A', '--admin', action='store_true')
     p.add_argument('--admin-port', type=int, default=4000)
+    p.add_argument('-g', '--groups', type=int, default=0,
+                   help='host this many replicated logs in each process')
+    p.add_argument('-e', '--executor', choices=['thread', 'process'],
+                   help='where the log applies commands, without -g')
+    p.add_argument('--client-port', type=int, default=0,
+                   help='serve clients at this port plus the host id')
+    p.add_argument('-t', '--transport', choices=['udp', 'tcp'],
+                   default='udp',
+                   help='tcp carries messages of any size, see stream.py')
     args = p.parse_args()
     args.members = [(args.host, args.port_start + i)
                     for i in range(args.member_count)]
@@ -119,7 +162,11 @@ def main():
 
     for i, addr in enumerate(args.members):
         if i == args.host_id or args.all_in_one:
-            proc = Test(addr, args.members)
+            proc = Test(addr, args.members, groups=args.groups,
+                        executor=args.executor, transport=args.transport)
+            if args.client_port:
+                loop.run_until_complete(serve(
+                    proc.rsm, args.host, args.client_port + i))
             if args.admin:
                 admin.procs[i] = proc
 
@@ -0,0 +1,57 @@
+"""
+Quorum systems for the two phases of Paxos-like protocols
+
+Phase 1 (prepare, read) and phase 2 (accept, write) need not use the same
+quorums: it is enough that every phase 1 quorum intersects every phase 2
+quorum (Flexible Paxos, Howard et al. 2016). Two phase 2 quorums may be
+disjoint. A module takes the quorum system as a class attribute, a
+callable building it from the members:
+
+    class FastCommit(Synod):
+        QUORUMS = functools.partial(Flexible, q2=2)
+
+phase1(acks) and phase2(acks) tell whether the processes in `acks` make a
+quorum of that phase.
+"""
+
+
+class Majority:
+    def __init__(self, members):
+        self.N = len(members)
+
+    def phase1(self, acks):
+        return len(acks) > self.N / 2
+
+    phase2 = phase1
+
+
+class Flexible:
+    """any q2 processes for phase 2, any N - q2 + 1 for phase 1"""
+    def __init__(self, members, q2):
+        self.N = len(members)
+        if not 1 <= q2 <= self.N:
+            raise ValueError('phase 2 quorum of %d out of %d' % (q2, self.N))
+        self.q1, self.q2 = self.N - q2 + 1, q2
+
+    def phase1(self, acks):
+        return len(acks) >= self.q1
+
+    def phase2(self, acks):
+        return len(acks) >= self.q2
+
+
+class Grid:
+    """
+    members in rows of `columns`, in address order: a whole row for phase 2,
+    one process of every row for phase 1
+    """
+    def __init__(self, members, columns):
+        members = sorted(members)
+        self.rows = [set(members[i:i + columns])
+                     for i in range(0, len(members), columns)]
+
+    def phase1(self, acks):
+        return all(row & set(acks) for row in self.rows)
+
+    def phase2(self, acks):
+        return any(row <= set(acks) for row in self.rows)
@@ -19,7 +19,14 @@ multi-reader register.
 - An atomic register is even stronger and provides a strict form of consistency
   even in the face of concurrency and failures.
 """
-from .basic import implements, uses, trigger, ABC
+import zlib
+import uuid
+import asyncio
+import itertools
+from array import array
+from collections import defaultdict
+
+from .basic import implements, uses, trigger, start_timer, ABC
 
 
 @implements('OneNRegularRegister')
@@ -99,7 +106,7 @@ class MajorityVotingRegularRegister(ABC):
         trigger(self.beb, 'Broadcast', {
             'typ': 'write',
             'ts': self.wts,
-            'val': self.val,
+            'val': v,
             })
 
     def upon_Read(self):
@@ -137,11 +144,252 @@ class MajorityVotingRegularRegister(ABC):
             if len(self.readlist) > (self.N / 2):
                 # choosing the largest timestamp ensures that the value written
                 # last is returned
-                _, v = max(self.readlist)
+                _, v = max(self.readlist.values(), key=lambda t: t[0])
                 self.readlist = {}
                 trigger(self.upper, 'ReadReturn', v)
 
 
+@implements('OneNRegularRegister')
+@uses('ReadLease', 'lease')
+class LeasedRegularRegister(MajorityVotingRegularRegister):
+    """
+    Algorithm 4.2 with reads served locally by the lease holder
+
+    Replicas report their (ts, val) with every lease grant and the holder
+    keeps the highest, so while its lease is valid it has every write that
+    completed and reads without sending anything. Everyone else reads from a
+    majority as before.
+
+    A write is acknowledged with the lease the replica backs, and completes
+    once a majority has acked and, besides, the holder has acked or the
+    promises reported have run out: any later lease needs a grant from one
+    of the acking replicas, which carries the new value.
+    """
+    def upon_Init(self):
+        super().upon_Init()
+        self.waiting = {}
+        self.acked = set()
+        self.cleared = set()
+        self.done = True
+        trigger(self.lease, 'Info', (self.ts, self.val))
+
+    def upon_Read(self):
+        if self.lease.valid():
+            trigger(self.upper, 'ReadReturn', self.val)
+        else:
+            super().upon_Read()
+
+    def upon_Write(self, v):
+        super().upon_Write(v)
+        self.waiting = {}  # holder -> seconds its promise had left
+        self.acked = set()
+        self.cleared = set()  # holders whose promise ran out
+        self.done = False
+
+    def upon_Lease(self, infos):
+        for ts, val in infos:
+            if ts > self.ts:
+                self.ts, self.val = ts, val
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'write':
+            if m['ts'] > self.ts:
+                self.ts = m['ts']
+                self.val = m['val']
+                trigger(self.lease, 'Info', (self.ts, self.val))
+            trigger(self.pl, 'Send', q, {
+                'typ': 'ack',
+                'ts': m['ts'],
+                'promise': self.lease.promise(),
+                })
+        elif m['typ'] == 'ack':
+            if m['ts'] != self.wts or self.done:
+                return
+            holder, left = m['promise']
+            if holder is not None and left > 0:
+                left *= 1 + self.lease.DRIFT
+                if left > self.waiting.get(holder, 0):
+                    self.waiting[holder] = left
+                    start_timer(left, self.expire, self.wts, holder, left)
+            self.acked.add(q)
+            self.check()
+        else:
+            super().upon_Deliver(q, m)
+
+    def expire(self, wts, holder, left):
+        if wts == self.wts and self.waiting[holder] == left:
+            self.cleared.add(holder)
+            self.check()
+
+    def check(self):
+        if self.done or len(self.acked) <= self.N / 2:
+            return
+        if set(self.waiting) <= self.acked | self.cleared:
+            self.done = True
+            trigger(self.upper, 'WriteReturn')
+
+
+class RegisterTable:
+    """
+    (ts, val) of many registers
+
+    Timestamps live in one array and values in one list, both indexed by the
+    slot of the key, so a register costs a dict entry and no tuple.
+    """
+    def __init__(self):
+        self.slots = {}
+        self.ts = array('Q')
+        self.vals = []
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, key):
+        i = self.slots.get(key)
+        if i is None:
+            return 0, None
+        return self.ts[i], self.vals[i]
+
+    def put(self, key, ts, val):
+        i = self.slots.get(key)
+        if i is None:
+            self.slots[key] = len(self.vals)
+            self.ts.append(ts)
+            self.vals.append(val)
+        elif ts > self.ts[i]:
+            self.ts[i] = ts
+            self.vals[i] = val
+
+
+@implements('MultiKeyRegularRegister')
+@uses('PerfectPointToPointLinks', 'pl')
+class ShardedRegisterStore(ABC):
+    """
+    Algorithm 4.2 for many keys at once
+
+    Every key is an (N, N) regular register with the majority-voting
+    semantics of MajorityVotingRegularRegister, replicated on REPLICAS
+    members picked from the key hash (all members by default); reads and
+    writes wait for a majority of those replicas. Any member may write a
+    key: a write first reads the highest timestamp from a majority, then
+    writes one above it, with the rank of the writer in its low RANK_BITS
+    bits so that writes of different members never tie.
+
+    Operations issued in the same turn of the event loop are not sent one by
+    one: each replica gets a single message carrying all of them, up to
+    BATCH, and answers with a single message. Every operation has an id, so
+    replies complete the right operation whatever order they come in.
+
+    Request: Read | key, Write | key, v
+    Indication: ReadReturn | key, v, WriteReturn | key
+
+    read(key) and write(key, v) do the same and return futures.
+    """
+    REPLICAS = None
+    BATCH = 1000
+    RANK_BITS = 16
+
+    def upon_Init(self):
+        self.table = RegisterTable()
+        self.ranked = sorted(self.members)
+        self.rank = self.ranked.index(self.addr)
+        self.opid = itertools.count()
+        # opid -> [future, quorum, replies, (ts, val), then]
+        self.ops = {}
+        self.outbox = defaultdict(list)
+        self.flushing = False
+
+    def replicas(self, key):
+        n = len(self.ranked)
+        k = self.REPLICAS or n
+        first = zlib.crc32(repr(key).encode()) % n
+        return [self.ranked[(first + i) % n] for i in range(k)]
+
+    def submit(self, key, op, future=None, then=None):
+        """
+        send op to the replicas of key; once a majority replied, call then
+        with the highest (ts, val) or, by default, set it on the future
+        """
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+        opid = next(self.opid)
+        group = self.replicas(key)
+        self.ops[opid] = [future, len(group) // 2 + 1, 0, (0, None), then]
+        if not self.flushing:
+            self.flushing = True
+            trigger(self, 'Flush')
+        for p in group:
+            self.outbox[p].append((opid, key) + op)
+            if len(self.outbox[p]) >= self.BATCH:
+                self.send(p)
+        return future
+
+    def read(self, key):
+        return self.submit(key, ())
+
+    def write(self, key, v):
+        future = asyncio.get_event_loop().create_future()
+
+        def consulted(highest):
+            ts = (highest[0] >> self.RANK_BITS) + 1
+            self.submit(key, (ts << self.RANK_BITS | self.rank, v), future)
+        self.submit(key, (), future, consulted)
+        return future
+
+    def upon_Read(self, key):
+        self.read(key).add_done_callback(
+            lambda f: trigger(self.upper, 'ReadReturn', key, f.result()))
+
+    def upon_Write(self, key, v):
+        self.write(key, v).add_done_callback(
+            lambda f: trigger(self.upper, 'WriteReturn', key))
+
+    def upon_Flush(self):
+        self.flushing = False
+        for p in list(self.outbox):
+            self.send(p)
+
+    def send(self, p):
+        ops = self.outbox.pop(p, None)
+        if ops:
+            trigger(self.pl, 'Send', p, {
+                'mid': uuid.uuid4(),
+                'typ': 'batch',
+                'ops': ops,
+                })
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'batch':
+            replies = []
+            for op in m['ops']:
+                if len(op) == 4:
+                    opid, key, ts, val = op
+                    self.table.put(key, ts, val)
+                    replies.append((opid, ts, None))
+                else:
+                    opid, key = op
+                    replies.append((opid,) + self.table.get(key))
+            trigger(self.pl, 'Send', q, {
+                'mid': uuid.uuid4(),
+                'typ': 'replies',
+                'ops': replies,
+                })
+        elif m['typ'] == 'replies':
+            for opid, ts, val in m['ops']:
+                op = self.ops.get(opid)
+                if op is None:
+                    continue  # already returned
+                op[2] += 1
+                if ts > op[3][0]:
+                    op[3] = (ts, val)
+                if op[2] >= op[1]:
+                    del self.ops[opid]
+                    if op[4] is not None:
+                        op[4](op[3])
+                    else:
+                        op[0].set_result(op[3][1])
+
+
 @implements('OneOneAtomicRegister')
 @uses('OneNRegularRegister', 'onrr')
 class ONRRtoOOAR(ABC):
@@ -195,3 +443,128 @@ class OOARtoONAR(ABC):
     def upon_Read(self):
         for r in self.members:
             trigger(self.ooar.self.r, 'Read')
+
+
+@implements('NNAtomicRegister')
+@uses('BestEffortBroadcast', 'beb')
+@uses('PerfectPointToPointLinks', 'pl')
+class ReadImposeWriteConsultMajority(ABC):
+    """
+    Algorithm 4.10-4.11: Read-Impose Write-Consult-Majority, an (N, N) atomic
+    register in the fail-silent model, with shortcuts for reads and for a
+    single writer
+
+    Timestamps are (ts, rank of the writer), so writes of different processes
+    never tie. A read consults a majority and imposes the highest value on a
+    majority before returning it, so no later read can return an older one.
+    A write consults a majority for the highest timestamp, then writes with
+    a higher one.
+
+    Fast reads: when all replies of the read majority carry the same
+    timestamp, that value is on a majority already and there is nothing to
+    impose; the read returns after one round trip. FAST_READS turns it off.
+
+    Writes consult first: one imposed straight away, above the writer's own
+    timestamp, could be seen by a read and then be overtaken by a write
+    that completed meanwhile. With a WRITER, the one process that writes,
+    no write can: its timestamps go up with every write it makes, and it
+    imposes each straight away, in one round trip.
+
+    Request: Read, Write | v
+    Indication: ReadReturn | v, WriteReturn
+    """
+    FAST_READS = True
+    WRITER = None  # the only process to write, if there is one
+
+    def upon_Init(self):
+        self.ts, self.wr, self.val = 0, 0, None
+        self.rank = sorted(self.members).index(self.addr)
+        self.rid = 0
+        self.readlist = None
+        self.acks = None
+        self.reading = False
+        self.readval = None
+        self.writeval = None
+        self.wts = 0  # timestamp of our last write, as the WRITER
+        self.stats = dict(reads=0, fastreads=0, writes=0, fastwrites=0)
+
+    def upon_Read(self):
+        self.stats['reads'] += 1
+        self.reading = True
+        self.consult()
+
+    def consult(self):
+        self.rid += 1
+        self.readlist = {}
+        trigger(self.beb, 'Broadcast', {
+            'typ': 'read',
+            'rid': self.rid,
+            })
+
+    def upon_Write(self, v):
+        assert self.WRITER in (None, self.addr), 'only %s writes' % (
+            self.WRITER,)
+        self.stats['writes'] += 1
+        self.writeval = v
+        if self.WRITER is None:
+            self.consult()
+        else:
+            self.stats['fastwrites'] += 1
+            self.wts = max(self.wts, self.ts) + 1
+            self.impose(self.wts, self.rank, v)
+
+    def impose(self, ts, wr, v):
+        self.rid += 1
+        self.acks = set()
+        trigger(self.beb, 'Broadcast', {
+            'typ': 'write',
+            'rid': self.rid,
+            'ts': ts,
+            'wr': wr,
+            'val': v,
+            })
+
+    def upon_Deliver(self, q, m):
+        if m['typ'] == 'read':
+            trigger(self.pl, 'Send', q, {
+                'mid': uuid.uuid4(),
+                'typ': 'value',
+                'rid': m['rid'],
+                'ts': self.ts,
+                'wr': self.wr,
+                'val': self.val,
+                })
+        elif m['typ'] == 'write':
+            if (m['ts'], m['wr']) > (self.ts, self.wr):
+                self.ts, self.wr, self.val = m['ts'], m['wr'], m['val']
+            trigger(self.pl, 'Send', q, {
+                'mid': uuid.uuid4(),
+                'typ': 'ack',
+                'rid': m['rid'],
+                })
+        elif m['rid'] != self.rid:
+            return
+        elif m['typ'] == 'value' and self.readlist is not None:
+            self.readlist[q] = (m['ts'], m['wr'], m['val'])
+            if len(self.readlist) > self.N / 2:
+                ts, wr, v = max(self.readlist.values(), key=lambda t: t[:2])
+                seen = {t[:2] for t in self.readlist.values()}
+                self.readlist = None
+                if not self.reading:  # consulted for a write
+                    self.impose(ts + 1, self.rank, self.writeval)
+                elif len(seen) == 1 and self.FAST_READS:
+                    self.stats['fastreads'] += 1
+                    self.reading = False
+                    trigger(self.upper, 'ReadReturn', v)
+                else:
+                    self.readval = v
+                    self.impose(ts, wr, v)
+        elif m['typ'] == 'ack' and self.acks is not None:
+            self.acks.add(q)
+            if len(self.acks) > self.N / 2:
+                self.acks = None
+                if self.reading:
+                    self.reading = False
+                    trigger(self.upper, 'ReadReturn', self.readval)
+                else:
+                    trigger(self.upper, 'WriteReturn')
@@ -0,0 +1,206 @@
+"""
+In-process simulation of a cluster
+
+Every process of a simulated cluster lives in one event loop whose clock is
+virtual: instead of sleeping until the next timer is due, the loop jumps
+straight to it. SimNetwork stands in for UDPProtocol (same
+`register(name, handler)` interface), so the modules run unchanged while
+benchmarks inject loss, delay and crashes and count every message sent.
+
+    loop = new_loop()
+    net = SimNetwork(loss=.1, seed=1)
+    nodes = cluster(LazyProbabilisticBroadcast, 10, net)
+    trigger(nodes[0].module, 'Broadcast', 'hello')
+    run(loop, 30)
+"""
+import pickle
+import random
+import asyncio
+import logging
+import contextlib
+from collections import defaultdict, Counter
+
+from . import ifconf
+from .basic import trigger
+
+log = logging.getLogger(__name__)
+
+
+class _Clock:
+    """
+    selector stand-in: there is no IO to wait for, so waiting `timeout`
+    seconds means moving the virtual clock forward
+    """
+    def __init__(self, loop):
+        self.loop = loop
+
+    def select(self, timeout):
+        if timeout is None:
+            raise RuntimeError('simulation stalled: nothing is scheduled')
+        self.loop._now += timeout
+        return []
+
+    def close(self):
+        pass
+
+
+class SimLoop(asyncio.BaseEventLoop):
+    def __init__(self):
+        super().__init__()
+        self._now = 0.
+        self._selector = _Clock(self)
+
+    def time(self):
+        return self._now
+
+    def _process_events(self, event_list):
+        pass
+
+    def _write_to_self(self):
+        pass
+
+
+def new_loop():
+    loop = SimLoop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def run(loop, seconds):
+    """run the simulation for `seconds` of virtual time"""
+    loop.run_until_complete(asyncio.sleep(seconds))
+
+
+class SimNetwork:
+    """
+    lossy network shared by all simulated processes
+
+    `delay` is either a (min, max) range of one-way latency in seconds or a
+    callable(src, dst) returning it. `classify(name, msg)` picks the counter
+    a message is accounted to, by default the link name.
+    """
+    MAX_DATAGRAM = 65507
+
+    def __init__(self, delay=(.001, .01), loss=0., seed=None, classify=None):
+        self.rand = random.Random(seed)
+        self.delay = delay
+        self.loss = loss
+        self.classify = classify or (lambda name, msg: name)
+        self.handlers = {}
+        self.crashed = set()
+        self.msgs = Counter()
+        self.bytes = Counter()
+        self.dropped = Counter()
+
+    def endpoint(self, addr):
+        return SimEndpoint(self, addr)
+
+    def latency(self, src, dst):
+        if callable(self.delay):
+            return self.delay(src, dst)
+        lo, hi = self.delay
+        return lo + self.rand.random() * (hi - lo)
+
+    def crash(self, addr):
+        self.crashed.add(addr)
+
+    def recover(self, addr):
+        self.crashed.discard(addr)
+
+    def send(self, name, msg, src, dst):
+        if src in self.crashed:
+            return
+        data = pickle.dumps((name, msg))
+        key = self.classify(name, msg)
+        self.msgs[key] += 1
+        self.bytes[key] += len(data)
+        if len(data) > self.MAX_DATAGRAM:
+            self.dropped['oversized'] += 1
+            log.warning('%s --> %s: %d bytes exceeds a datagram',
+                        src, dst, len(data))
+        elif self.rand.random() < self.loss:
+            self.dropped['loss'] += 1
+        else:
+            loop = asyncio.get_event_loop()
+            loop.call_later(self.latency(src, dst),
+                            self.deliver, data, src, dst)
+
+    def deliver(self, data, src, dst):
+        if dst in self.crashed:
+            self.dropped['crashed'] += 1
+            return
+        name, msg = pickle.loads(data)
+        handler = self.handlers.get((dst, name))
+        if handler is None:
+            self.dropped['unknown'] += 1
+            log.debug('unknown link name %s at %s', name, dst)
+            return
+        trigger(handler, 'Deliver', src, msg)
+
+    def total(self, prefix=''):
+        return sum(v for k, v in self.msgs.items()
+                   if str(k).startswith(prefix))
+
+
+class SimEndpoint:
+    """what `UDPProtocol` is to a real process"""
+    def __init__(self, net, addr):
+        self.net = net
+        self.addr = addr
+
+    def register(self, name, handler):
+        self.net.handlers[(self.addr, name)] = handler
+
+        def sendto(msg, peer):
+            self.net.send(name, msg, self.addr, peer)
+        return sendto
+
+
+class Node:
+    """
+    upper layer of a simulated process; records every indication it gets
+    as (virtual time, args) under `events[name]`
+    """
+    def __init__(self, addr):
+        self.addr = addr
+        self.events = defaultdict(list)
+        self.module = None
+
+    def __getattr__(self, attr):
+        if not attr.startswith('upon_'):
+            raise AttributeError(attr)
+        event = attr[len('upon_'):]
+
+        def record(*args):
+            now = asyncio.get_event_loop().time()
+            self.events[event].append((now, args))
+        return record
+
+
+@contextlib.contextmanager
+def implementations(**mapping):
+    """temporarily bind interface names to other implementations"""
+    saved = dict(ifconf.mapping)
+    ifconf.mapping.update(mapping)
+    try:
+        yield
+    finally:
+        ifconf.mapping.clear()
+        ifconf.mapping.update(saved)
+
+
+def members(n, host='127.0.0.1', port_start=5000):
+    return [(host, port_start + i) for i in range(n)]
+
+
+def cluster(cls, n, net, name='m', mapping=None, upper=Node, **kw):
+    """build `n` processes running `cls` on top of `net`"""
+    addrs = members(n, **kw)
+    nodes = []
+    with implementations(**(mapping or {})):
+        for addr in addrs:
+            node = upper(addr)
+            node.module = cls(name, node, net.endpoint(addr),
+                              addr, set(addrs) - {addr})
+            nodes.append(node)
+    return nodes
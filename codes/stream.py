@@ -0,0 +1,234 @@
+"""
+Links over stream connections
+
+UDP carries a message in one datagram, 64 KB at most: a snapshot, a big
+proposal set or causal past does not fit, and is dropped. StreamTransport
+stands in for UDPProtocol, with the same `register(name, handler)`, over
+TCP instead: each message goes as a frame of any size, a 4-byte big-endian
+length then the pickled (link name, message).
+
+A process keeps one connection to each peer it sends to, made the first
+time it does, and its peers one to it each: a connection carries frames
+one way, the first of them the address of the sender. Frames wait in a
+queue of their peer until the loop is done with what it is running, while
+the peer is not connected, or while the connection has more than it can
+take (pause_writing); they go out together, in one write, as soon as it
+can. A connection lost or refused is made again, as
+long as frames wait, BACKOFF seconds later, twice as long after each
+failure in a row, MAX_BACKOFF at most. Whatever a connection had taken
+when it was lost is gone, as fair-loss links allow: the links above send
+it again.
+
+Once HIGH bytes wait for a peer, in its queue or in the buffer of its
+connection, every link is told Pause | peer, and Resume | peer once no
+more than LOW do; past MAX, frames to it are dropped, as with UDPProtocol.
+"""
+import struct
+import pickle
+import asyncio
+import logging
+from collections import deque
+
+from .basic import trigger, notify, start_timer
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>I')
+
+
+class Framed(asyncio.Protocol):
+    """a stream of pickled dicts, each handed to `received`"""
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buf = bytearray()
+
+    def data_received(self, data):
+        self.buf += data
+        start = 0
+        while len(self.buf) - start >= HEADER.size:
+            size, = HEADER.unpack_from(self.buf, start)
+            end = start + HEADER.size + size
+            if len(self.buf) < end:
+                break
+            with memoryview(self.buf) as view:
+                m = pickle.loads(view[start + HEADER.size:end])
+            start = end
+            self.received(m)
+        del self.buf[:start]
+
+    def send(self, m):
+        data = pickle.dumps(m)
+        self.transport.writelines([HEADER.pack(len(data)), data])
+
+
+class Incoming(Framed):
+    """a connection a peer made to us"""
+    def __init__(self, owner):
+        self.owner = owner
+        self.peer = None  # its address, from the first frame
+
+    def received(self, m):
+        if self.peer is None:
+            self.peer = tuple(m)
+            return
+        self.owner.deliver(self.peer, *m)
+
+    def connection_lost(self, exc):
+        log.debug('%s: connection from %s lost: %s',
+                  self.owner.addr, self.peer, exc)
+
+
+class Peer(asyncio.Protocol):
+    """our connection to one peer, with the frames waiting for it"""
+    def __init__(self, owner, addr):
+        self.owner, self.addr = owner, addr
+        self.transport = None
+        self.connecting = False
+        self.writable = True
+        self.frames = deque()  # header and data, in turn
+        self.queued = 0  # bytes waiting
+        self.held = False  # the links were told to pause
+        self.flushing = False  # a flush is due
+        self.failures = 0
+
+    def send(self, data):
+        owner = self.owner
+        if self.queued + len(data) > owner.MAX:
+            log.debug('%s --> %s: queue full, dropped', owner.addr, self.addr)
+            return
+        self.frames.extend((HEADER.pack(len(data)), data))
+        self.queued += len(data)
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_event_loop().call_soon(self.flush)
+        self.check()
+
+    def flush(self):
+        self.flushing = False
+        if self.transport is None:
+            self.connect()
+        elif self.writable and self.frames:
+            frames, self.frames, self.queued = self.frames, deque(), 0
+            self.transport.writelines(frames)
+        self.check()
+
+    def check(self):
+        """
+        tell the links to pause while the connection holds back or HIGH
+        bytes wait, and to resume once neither is so
+        """
+        owner = self.owner
+        if not self.held and (not self.writable or
+                              self.queued >= owner.HIGH):
+            self.held = True
+            owner.notify('Pause', self.addr)
+        elif self.held and self.writable and self.queued <= owner.LOW:
+            self.held = False
+            owner.notify('Resume', self.addr)
+
+    def connect(self):
+        if self.connecting or self.owner.closed:
+            return
+        self.connecting = True
+        loop = asyncio.get_event_loop()
+        loop.create_task(self._connect(loop))
+
+    async def _connect(self, loop):
+        try:
+            await loop.create_connection(lambda: self, *self.addr)
+        except OSError as e:
+            log.debug('%s --> %s: %s', self.owner.addr, self.addr, e)
+            self.retry()
+
+    def retry(self):
+        """connect again later, if anything is to be sent"""
+        delay = min(self.owner.BACKOFF * 2 ** self.failures,
+                    self.owner.MAX_BACKOFF)
+        self.failures += 1
+        start_timer(delay, self.reconnect)
+
+    def reconnect(self):
+        self.connecting = False
+        if self.frames and self.transport is None:
+            self.connect()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connecting = False
+        self.failures = 0
+        transport.set_write_buffer_limits(self.owner.HIGH, self.owner.LOW)
+        data = pickle.dumps(self.owner.addr)
+        transport.writelines([HEADER.pack(len(data)), data])
+        self.flush()
+
+    def connection_lost(self, exc):
+        log.info('%s --> %s: connection lost: %s',
+                 self.owner.addr, self.addr, exc)
+        self.transport = None
+        self.writable = True
+        self.check()
+        if not self.owner.closed:
+            self.connecting = True
+            self.retry()
+
+    def pause_writing(self):
+        self.writable = False
+        self.check()
+
+    def resume_writing(self):
+        self.writable = True
+        self.flush()
+
+    def data_received(self, data):
+        pass
+
+
+class StreamTransport:
+    """what UDPProtocol is, over stream connections"""
+    BACKOFF = .05
+    MAX_BACKOFF = 2
+    HIGH = 4 * 1024 * 1024
+    LOW = 1024 * 1024
+    MAX = 256 * 1024 * 1024
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.handlers = {}
+        self.peers = {}  # addr -> Peer
+        self.server = None
+        self.closed = False
+
+    async def listen(self):
+        loop = asyncio.get_event_loop()
+        self.server = await loop.create_server(
+            lambda: Incoming(self), *self.addr)
+
+    def close(self):
+        self.closed = True
+        if self.server is not None:
+            self.server.close()
+        for peer in self.peers.values():
+            if peer.transport is not None:
+                peer.transport.close()
+
+    def register(self, name, handler):
+        self.handlers[name] = handler
+
+        def sendto(msg, peer):
+            log.debug('%s --> %s: %s', self.addr, peer, msg)
+            p = self.peers.get(peer)
+            if p is None:
+                p = self.peers[peer] = Peer(self, peer)
+            p.send(pickle.dumps((name, msg)))
+        return sendto
+
+    def deliver(self, peer, name, msg):
+        handler = self.handlers.get(name)
+        if handler is None:
+            log.warn('unknown link name: %s', name)
+            return
+        trigger(handler, 'Deliver', peer, msg)
+
+    def notify(self, event, peer):
+        for handler in self.handlers.values():
+            notify(handler, event, peer)
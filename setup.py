@@ -3,5 +3,5 @@ from setuptools import setup
 setup(
     name='ExampleOfReliableSecureDistributedProgramming',
     version='0.1',
-    packages=['codes'],
+    packages=['codes', 'codes.bench'],
 )